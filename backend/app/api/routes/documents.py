@@ -1,21 +1,37 @@
+from collections import Counter
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.schemas import DocumentResponse
 from app.schemas.document import DocumentWithText
-from app.models import Document, Case
+from app.models import Document, Case, UploadBatch
 from app.utils.document_processor import DocumentProcessor
 from app.services.usage_service import usage_service
+from app.services.storage_service import StorageService
+from app.services.dedup_service import dedup_service
+from app.services.rag_service import rag_service
+from app.services.job_queue import job_queue, PROCESS_DOCUMENT, PROCESS_BATCH
+from app.services.progress_bus import progress_bus, TERMINAL_STATUSES
+from app.services.stage_checkpoints import stage_checkpoints, STAGES
 from app.middleware.rate_limiter import rate_limiter
+from app.utils.zip_upload import save_zip_members, BatchTooLarge
 from app.config import settings
 import os
-import uuid
+import json
+from datetime import datetime
+from typing import Optional
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-def process_document_background(document_id: str):
+storage_service = StorageService(settings.upload_dir)
+
+ALLOWED_EXTENSIONS = ['.pdf', '.jpg', '.jpeg', '.png']
+
+def process_document_background(document_id: str, stages: Optional[list[str]] = None):
     """Background task to process document"""
     from app.database import SessionLocal
     db = SessionLocal()
@@ -23,12 +39,27 @@ def process_document_background(document_id: str):
         document = db.query(Document).filter(Document.id == document_id).first()
         if document:
             processor = DocumentProcessor()
-            processor.process_document(document, db)
+            processor.process_document(document, db, stages)
     except Exception as e:
         logger.error(f"Background processing failed for {document_id}: {str(e)}")
     finally:
         db.close()
 
+def process_batch_background(batch_id: str):
+    """Background task to process an upload batch"""
+    try:
+        DocumentProcessor().process_batch(batch_id)
+    except Exception as e:
+        logger.error(f"Background batch processing failed for {batch_id}: {str(e)}")
+
+def schedule_processing(document_id: str, background_tasks: BackgroundTasks, db: Session,
+                        stages: Optional[list[str]] = None):
+    """Enqueue a document on the durable job queue, or fall back to an in-process background task"""
+    if settings.job_queue_enabled:
+        job_queue.enqueue(db, PROCESS_DOCUMENT, document_id, payload={"stages": stages} if stages else None)
+    else:
+        background_tasks.add_task(process_document_background, document_id, stages)
+
 @router.post("/upload/{case_id}", response_model=DocumentResponse)
 async def upload_document(
     case_id: str,
@@ -46,54 +77,207 @@ async def upload_document(
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     
-    # Read file content to check size
-    file_content = await file.read()
-    file_size = len(file_content)
+    # Validate file type before reading anything
+    file_extension = os.path.splitext(file.filename)[1].lower()
+    if file_extension not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"File type not supported. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
     
-    # Usage protection checks
+    # Usage protection checks (request body size is enforced by UploadSizeLimitMiddleware)
+    max_bytes = settings.max_file_size_mb * 1024 * 1024
     try:
-        usage_service.check_file_size(file_size)
         usage_service.check_total_storage(db)
         usage_service.check_document_count(db, case_id)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    # Validate file type
-    allowed_extensions = ['.pdf', '.jpg', '.jpeg', '.png']
-    file_extension = os.path.splitext(file.filename)[1].lower()
-    if file_extension not in allowed_extensions:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"File type not supported. Allowed: {', '.join(allowed_extensions)}"
-        )
-    
-    # Save file
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    file_id = str(uuid.uuid4())
-    file_path = os.path.join(upload_dir, f"{file_id}{file_extension}")
-    
-    with open(file_path, "wb") as f:
-        f.write(file_content)  # Use already read content
+    # Stream to disk, hashing and enforcing the size limit as bytes arrive
+    try:
+        file_path, file_size, content_hash = await storage_service.save_upload(file, file_extension, max_bytes)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     
     # Create document record
     document = Document(
         case_id=case_id,
         filename=file.filename,
         file_path=file_path,
-        file_type=file.content_type
+        file_type=file.content_type,
+        file_size=file_size,
+        content_hash=content_hash
     )
     
     db.add(document)
     db.commit()
     db.refresh(document)
     
+    # Identical file already processed: copy its results; only stages it never completed still run
+    if settings.dedup_enabled:
+        source = dedup_service.find_source(db, content_hash, exclude_id=document.id)
+        if source:
+            try:
+                dedup = dedup_service.clone_results(db, source, document)
+                db.refresh(document)
+                if not dedup["rerun_stages"]:
+                    return document
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Dedup from {source.id} failed, processing {document.id} normally: {e}")
+    
     # Process document in background
-    background_tasks.add_task(process_document_background, str(document.id))
+    schedule_processing(str(document.id), background_tasks, db)
     
     return document
 
+@router.post("/upload-batch/{case_id}")
+async def upload_batch(
+    case_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: list[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload many files, or ZIP archives of them, in one request.
+    Files are streamed to storage, all Document rows are registered in one
+    transaction and the batch is queued as a single job. Unsupported or
+    oversized files are skipped and listed in rejected_files.
+    """
+    if settings.demo_mode:
+        rate_limiter.check_rate_limit(request, "upload", 10, 20)
+    
+    case = db.query(Case).filter(Case.id == case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    try:
+        usage_service.check_total_storage(db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    max_file_bytes = settings.max_file_size_mb * 1024 * 1024
+    budget_bytes = settings.batch_max_total_mb * 1024 * 1024
+    saved, rejected = [], []
+    try:
+        for upload in files:
+            extension = os.path.splitext(upload.filename or "")[1].lower()
+            if extension == ".zip":
+                members, skipped = await asyncio.to_thread(
+                    save_zip_members, storage_service, upload.file, ALLOWED_EXTENSIONS,
+                    max_file_bytes, budget_bytes, settings.batch_max_files - len(saved)
+                )
+                saved.extend({**member, "content_type": None} for member in members)
+                rejected.extend(skipped)
+                budget_bytes -= sum(member["file_size"] for member in members)
+                continue
+            if extension not in ALLOWED_EXTENSIONS:
+                rejected.append({"filename": upload.filename, "reason": "File type not supported"})
+                continue
+            if len(saved) >= settings.batch_max_files:
+                raise BatchTooLarge(f"Batch exceeds maximum of {settings.batch_max_files} files")
+            try:
+                file_path, file_size, content_hash = await storage_service.save_upload(
+                    upload, extension, min(max_file_bytes, budget_bytes)
+                )
+            except ValueError:
+                if budget_bytes < max_file_bytes:
+                    raise BatchTooLarge(f"Batch exceeds maximum of {settings.batch_max_total_mb}MB")
+                rejected.append({"filename": upload.filename, "reason": f"Exceeds {settings.max_file_size_mb}MB"})
+                continue
+            budget_bytes -= file_size
+            saved.append({"filename": upload.filename, "file_path": file_path, "file_size": file_size,
+                          "content_hash": content_hash, "content_type": upload.content_type})
+        
+        if not saved:
+            raise HTTPException(status_code=400, detail={"message": "No supported files in upload", "rejected_files": rejected})
+        usage_service.check_document_count(db, case_id, adding=len(saved))
+    except BatchTooLarge as e:
+        _remove_saved(saved + getattr(e, "saved", []))
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        _remove_saved(saved + getattr(e, "saved", []))
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException as e:
+        _remove_saved(saved + getattr(e, "saved", []))
+        raise
+    
+    # Register the whole batch in one transaction
+    batch = UploadBatch(case_id=case_id, document_count=len(saved), rejected_files=rejected)
+    db.add(batch)
+    db.flush()
+    documents = [
+        Document(
+            case_id=case_id,
+            batch_id=batch.id,
+            filename=entry["filename"],
+            file_path=entry["file_path"],
+            file_type=entry["content_type"],
+            file_size=entry["file_size"],
+            content_hash=entry["content_hash"]
+        )
+        for entry in saved
+    ]
+    db.add_all(documents)
+    db.commit()
+    
+    pending = len(documents)
+    if settings.dedup_enabled:
+        for document in documents:
+            source = dedup_service.find_source(db, document.content_hash, exclude_id=document.id)
+            if not source:
+                continue
+            try:
+                # Clones with stages left to rerun stay unprocessed and go through the batch
+                if not dedup_service.clone_results(db, source, document)["rerun_stages"]:
+                    pending -= 1
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Dedup from {source.id} failed, processing {document.id} normally: {e}")
+    
+    if pending:
+        if settings.job_queue_enabled:
+            job_queue.enqueue(db, PROCESS_BATCH, payload={"batch_id": str(batch.id)})
+        else:
+            background_tasks.add_task(process_batch_background, str(batch.id))
+    else:
+        batch.status = "completed"
+        batch.completed_at = datetime.utcnow()
+        db.commit()
+    
+    logger.info(f"Batch {batch.id}: {len(documents)} documents registered ({pending} to process), {len(rejected)} rejected")
+    return _batch_status(batch, db)
+
+@router.get("/batches/{batch_id}")
+def get_batch_status(batch_id: str, db: Session = Depends(get_db)):
+    """Aggregate progress of an upload batch, with per-document status"""
+    batch = db.query(UploadBatch).filter(UploadBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return _batch_status(batch, db)
+
+def _batch_status(batch: UploadBatch, db: Session) -> dict:
+    documents = [_status_snapshot(document) for document in
+                 db.query(Document).filter(Document.batch_id == batch.id).all()]
+    counts = Counter(document["processing_status"] for document in documents)
+    progress = sum(document["processing_progress"] or 0 for document in documents) / len(documents) if documents else 0
+    return {
+        "id": str(batch.id),
+        "case_id": str(batch.case_id),
+        "status": batch.status,
+        "document_count": batch.document_count,
+        "progress": round(progress, 1),
+        "counts": {status: counts.get(status, 0) for status in ("pending", "processing", "completed", "failed")},
+        "rejected_files": batch.rejected_files or [],
+        "created_at": batch.created_at,
+        "completed_at": batch.completed_at,
+        "documents": documents
+    }
+
+def _remove_saved(entries: list[dict]):
+    for entry in entries:
+        storage_service.delete_file(entry["file_path"])
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 def get_document(document_id: str, db: Session = Depends(get_db)):
     document = db.query(Document).filter(Document.id == document_id).first()
@@ -101,23 +285,67 @@ def get_document(document_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Document not found")
     return document
 
+@router.get("/case/{case_id}/events")
+async def stream_case_progress(case_id: str, request: Request):
+    """Server-sent events with progress updates for every document in a case"""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        initial = [_status_snapshot(document) for document in
+                   db.query(Document).filter(Document.case_id == case_id).all()]
+    finally:
+        db.close()
+    return _event_stream(request, initial, case_id=case_id)
+
 @router.get("/case/{case_id}", response_model=list[DocumentResponse])
 def get_case_documents(case_id: str, db: Session = Depends(get_db)):
     documents = db.query(Document).filter(Document.case_id == case_id).all()
     return documents
 
 @router.post("/{document_id}/reprocess")
-def reprocess_document(document_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Manually trigger document reprocessing"""
+def reprocess_document(
+    document_id: str,
+    background_tasks: BackgroundTasks,
+    stages: Optional[str] = None,
+    force: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Manually trigger document reprocessing.
+    By default only stages whose inputs or config changed since they last ran
+    are rerun. ?stages=summary,entities reruns exactly those stages;
+    ?force=true discards all checkpoints and reruns everything.
+    """
     document = db.query(Document).filter(Document.id == document_id).first()
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    requested = None
+    if stages:
+        requested = [stage.strip() for stage in stages.split(",") if stage.strip()]
+        unknown = [stage for stage in requested if stage not in STAGES]
+        if unknown or not requested:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown stages: {', '.join(unknown) or stages}. Valid stages: {', '.join(STAGES)}"
+            )
+    
+    if force:
+        stage_checkpoints.invalidate(db, document.id)
     document.processed = False
+    document.processing_status = "pending"
     db.commit()
     
-    background_tasks.add_task(process_document_background, document_id)
-    return {"message": "Document reprocessing started"}
+    schedule_processing(document_id, background_tasks, db, requested)
+    return {"message": "Document reprocessing started", "stages": requested or "changed"}
+
+@router.get("/{document_id}/checkpoints")
+def get_document_checkpoints(document_id: str, db: Session = Depends(get_db)):
+    """Per-stage checkpoint status: current, stale (config changed) or missing"""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"document_id": document_id, "stages": stage_checkpoints.summarize(db, document.id)}
 
 @router.get("/{document_id}/text", response_model=DocumentWithText)
 def get_document_with_text(document_id: str, db: Session = Depends(get_db)):
@@ -127,22 +355,81 @@ def get_document_with_text(document_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Document not found")
     return document
 
-@router.get("/{document_id}/status")
-def get_document_status(document_id: str, db: Session = Depends(get_db)):
-    """Get document processing status and progress"""
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    return {
+def _status_snapshot(document: Document) -> dict:
+    """Document status from the database, overlaid with live progress from the bus if newer"""
+    status = {
         "id": str(document.id),
+        "document_id": str(document.id),
+        "case_id": str(document.case_id) if document.case_id else None,
         "filename": document.filename,
         "processed": document.processed,
         "processing_status": document.processing_status,
         "processing_progress": document.processing_progress,
         "processing_step": document.processing_step,
-        "uploaded_at": document.uploaded_at
+        "uploaded_at": document.uploaded_at.isoformat() if document.uploaded_at else None
     }
+    live = progress_bus.latest(document.id)
+    if live and document.processing_status not in TERMINAL_STATUSES:
+        for key in ("processing_status", "processing_progress", "processing_step"):
+            if live.get(key) is not None:
+                status[key] = live[key]
+        status["processed"] = live["processing_status"] == "completed" or document.processed
+    return status
+
+def _event_stream(request: Request, initial: list[dict], document_id: str = None, case_id: str = None) -> StreamingResponse:
+    """
+    SSE response: the current state first, then every published update.
+    A single-document stream ends once the document completes or fails.
+    """
+    async def events():
+        subscriber = progress_bus.subscribe(document_id=document_id, case_id=case_id)
+        try:
+            for event in initial:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                if document_id and event["processing_status"] in TERMINAL_STATUSES:
+                    return
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=settings.progress_sse_heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: progress\ndata: {json.dumps({'id': event['document_id'], **event})}\n\n"
+                if document_id and event["processing_status"] in TERMINAL_STATUSES:
+                    return
+        finally:
+            progress_bus.unsubscribe(subscriber)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # don't let a proxy buffer the stream
+    })
+
+@router.get("/{document_id}/status")
+def get_document_status(document_id: str, db: Session = Depends(get_db)):
+    """Get document processing status and progress"""
+    live = progress_bus.latest(document_id)
+    if live and live["processing_status"] not in TERMINAL_STATUSES and "filename" in live:
+        return live
+    
+    document = db.query(Document).filter(Document.id == document_id).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return _status_snapshot(document)
+
+@router.get("/{document_id}/events")
+async def stream_document_progress(document_id: str, request: Request):
+    """Server-sent events with progress updates for one document, until it completes or fails"""
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        initial = [_status_snapshot(document)]
+    finally:
+        db.close()
+    return _event_stream(request, initial, document_id=document_id)
 
 @router.delete("/{document_id}")
 def delete_document(document_id: str, db: Session = Depends(get_db)):
@@ -155,6 +442,8 @@ def delete_document(document_id: str, db: Session = Depends(get_db)):
         # Delete associated entities first (foreign key constraint)
         from app.models import ExtractedEntity
         db.query(ExtractedEntity).filter(ExtractedEntity.document_id == document_id).delete()
+        # Chunks have no cascade either, and their vectors would keep matching searches
+        rag_service.delete_document_embeddings(document.id, db)
         
         # Delete the file from storage
         if os.path.exists(document.file_path):
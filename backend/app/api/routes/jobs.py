@@ -0,0 +1,54 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import ProcessingJob
+from app.services.job_queue import job_queue
+
+router = APIRouter()
+
+def _job_to_dict(job: ProcessingJob) -> dict:
+    return {
+        "id": str(job.id),
+        "job_type": job.job_type,
+        "document_id": str(job.document_id) if job.document_id else None,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_after": job.run_after,
+        "lease_expires_at": job.lease_expires_at,
+        "leased_by": job.leased_by,
+        "last_error": job.last_error,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+    }
+
+@router.get("/stats")
+def get_job_queue_stats(db: Session = Depends(get_db)):
+    """Get job counts by status and the age of the oldest ready job"""
+    return job_queue.get_stats(db)
+
+@router.get("/")
+def list_jobs(status: Optional[str] = None, document_id: Optional[str] = None, limit: int = 50,
+              db: Session = Depends(get_db)):
+    """List recent jobs, optionally filtered by status (e.g. dead) or document"""
+    query = db.query(ProcessingJob)
+    if status:
+        query = query.filter(ProcessingJob.status == status)
+    if document_id:
+        query = query.filter(ProcessingJob.document_id == document_id)
+    jobs = query.order_by(ProcessingJob.created_at.desc()).limit(min(limit, 500)).all()
+    return [_job_to_dict(job) for job in jobs]
+
+@router.post("/{job_id}/retry")
+def retry_dead_job(job_id: str, db: Session = Depends(get_db)):
+    """Requeue a dead-lettered job"""
+    job = job_queue.retry_dead(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Dead job not found")
+    return _job_to_dict(job)
+
+@router.post("/recover")
+def recover_stuck_jobs(db: Session = Depends(get_db)):
+    """Dead-letter expired final attempts and re-enqueue orphaned documents"""
+    return job_queue.recover_stuck(db)
@@ -0,0 +1,33 @@
+from typing import Optional
+from fastapi import APIRouter
+from app.services.ocr_registry import ocr_registry
+from app.services.ocr_batcher import ocr_batcher
+from app.services.extraction_cache import extraction_cache
+
+router = APIRouter()
+
+@router.get("/engines")
+def get_ocr_engine_stats():
+    """Get load time, memory and latency statistics for the warm OCR engines"""
+    return {**ocr_registry.get_stats(), "batcher": ocr_batcher.get_stats()}
+
+@router.post("/engines/preload")
+def preload_ocr_engine():
+    """Load the default OCR engine if it isn't loaded yet"""
+    loaded = ocr_registry.preload()
+    return {"loaded": loaded, **ocr_registry.get_stats()}
+
+@router.get("/cache")
+def get_extraction_cache_stats():
+    """Get extraction cache size, hit/miss counters and current config fingerprint"""
+    return extraction_cache.get_stats()
+
+@router.delete("/cache")
+def invalidate_extraction_cache(stale_only: bool = False, file_hash: Optional[str] = None):
+    """
+    Invalidate extraction cache entries.
+    stale_only removes only entries built under a different OCR configuration;
+    file_hash limits invalidation to one file's entries.
+    """
+    removed = extraction_cache.invalidate(file_hash=file_hash, stale_only=stale_only)
+    return {"message": f"Removed {removed} cache entries", "removed": removed}
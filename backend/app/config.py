@@ -9,6 +9,12 @@ class Settings(BaseSettings):
     
     # Cost Protection Settings
     max_file_size_mb: int = 10  # Maximum file size in MB
+    upload_chunk_size_kb: int = 1024  # Uploads are streamed to disk in chunks of this size
+    dedup_enabled: bool = True  # Reuse results of an identical, already processed file
+    batch_max_files: int = 200  # Files per batch upload (ZIP members included)
+    batch_max_total_mb: int = 500  # Total bytes per batch upload request / extracted ZIP contents
+    batch_zip_max_ratio: int = 100  # Reject ZIP members that claim to expand more than this (zip bombs)
+    batch_concurrency: int = 4  # Documents of a batch processed at once (lets OCR/LLM calls overlap and batch)
     max_files_per_case: int = 5  # Maximum files per case
     max_total_files: int = 20  # Maximum total files in system
     max_chat_requests_per_hour: int = 30  # Chat requests per hour per IP
@@ -24,6 +30,102 @@ class Settings(BaseSettings):
     demo_mode: bool = True  # Enable demo protections
     max_embeddings_per_document: int = 100  # Limit vector embeddings
     
+    # OCR Engine Settings
+    ocr_languages: list[str] = ["en"]  # EasyOCR language codes
+    ocr_gpu: bool = False  # Run EasyOCR on GPU
+    ocr_engine_pool_size: int = 1  # Warm EasyOCR readers per process
+    ocr_preload: bool = True  # Load EasyOCR at startup instead of on first use
+    ocr_dpi: int = 200  # Rasterization DPI for scanned PDFs
+    ocr_pages_in_flight: int = 4  # Rasterized pages held in memory at once (process mode: one per worker)
+    ocr_parallel_mode: str = "serial"  # serial | process (per-page process pool)
+    ocr_process_workers: int = 0  # OCR worker processes (0 = one per CPU)
+    ocr_page_timeout_seconds: int = 120  # Give up on a single page after this long
+    ocr_recognizer_batch_size: int = 16  # Text-region crops per recognizer batch
+    ocr_batching_enabled: bool = False  # Group pages (across documents) into batched OCR calls
+    ocr_batch_size: int = 8  # Pages per batched OCR call (keep <= ocr_pages_in_flight * concurrent docs)
+    ocr_batch_max_wait_ms: int = 50  # Max time a page waits for its batch to fill
+    ocr_preprocessing_enabled: bool = True  # Grayscale, deskew, rescale and blank-page skip before OCR
+    ocr_target_text_height_px: int = 40  # Shrink pages so a text line is about this tall
+    ocr_max_upscale: float = 1.0  # Max enlargement of small text (1.0 = downscale only; upscaling slows OCR)
+    ocr_max_megapixels: float = 6.0  # Hard cap on pixels sent to OCR per page
+    ocr_deskew_max_degrees: float = 5.0  # Search range for deskew (0 disables)
+    ocr_blank_ink_ratio: float = 0.001  # Pages with less ink than this are skipped as blank
+    pdf_text_backend: str = "pypdf2"  # pypdf2 | pypdfium2 | pdfminer | auto (fastest installed)
+    text_layer_min_chars: int = 25  # Fewer non-space chars than this = image-only page
+    text_layer_min_word_ratio: float = 0.5  # Below this share of word-like tokens = garbage layer
+    
+    # Extraction Cache Settings
+    extraction_cache_enabled: bool = True  # Reuse OCR/text results for identical files
+    extraction_cache_dir: str = "cache/extraction"
+    extraction_cache_max_mb: int = 256  # LRU eviction above this size
+    extraction_cache_version: str = "1"  # Bump to invalidate every cached result
+    
+    # Streaming Ingestion Settings
+    streaming_ingest_enabled: bool = True  # Stream pages through extraction, chunking and embedding
+    streaming_min_pages: int = 20  # Documents with fewer pages use the in-memory pipeline
+    stream_pages_in_flight: int = 8  # Extracted pages buffered ahead of chunking/embedding
+    stream_head_chars: int = 20000  # Leading text kept in memory for combined analysis of short documents
+    embedding_batch_size: int = 32  # Chunks embedded and committed per batch
+    
+    # Job Queue Settings
+    job_queue_enabled: bool = True  # Process documents via the Postgres job queue (False = API BackgroundTasks)
+    job_queue_embedded_worker: bool = True  # Also run a worker thread inside the API process (off when separate workers run)
+    job_lease_seconds: int = 300  # Visibility timeout: a job not heartbeated for this long is re-leased
+    job_heartbeat_seconds: int = 60  # How often a worker extends its lease
+    job_max_attempts: int = 3  # Attempts before a job is dead-lettered
+    job_retry_base_seconds: int = 30  # Retry backoff: base * 2^(attempt-1), with jitter
+    job_retry_max_seconds: int = 900  # Cap on retry backoff
+    job_poll_interval_seconds: float = 2.0  # Worker sleep when the queue is empty
+    
+    # Progress Streaming Settings
+    progress_notify_enabled: bool = True  # Relay worker progress to the API over Postgres LISTEN/NOTIFY
+    progress_notify_interval_ms: int = 250  # At most one NOTIFY per document per interval (final events are immediate)
+    progress_max_tracked_documents: int = 1000  # Latest-progress snapshots kept in memory
+    progress_retention_seconds: int = 600  # Keep finished documents' snapshots at least this long
+    progress_sse_heartbeat_seconds: int = 15  # Keep-alive comment interval on idle SSE streams
+    
+    # OpenAI Client Settings (one pooled client per process, see llm_client)
+    openai_timeout_seconds: float = 60.0  # Per-request timeout
+    openai_max_retries: int = 2  # SDK retries on connection errors, 429 and 5xx
+    llm_http2: bool = True  # Multiplex requests over HTTP/2 when the h2 package is installed
+    llm_max_connections: int = 20  # Connection pool size shared by all services
+    llm_max_keepalive_connections: int = 10  # Idle connections kept open for reuse
+    llm_keepalive_expiry_seconds: float = 60.0  # Close idle connections after this long
+    
+    # LLM Response Cache Settings
+    llm_cache_enabled: bool = True  # Reuse identical chat completions and embeddings
+    llm_cache_dir: str = "cache/llm"
+    llm_cache_max_mb: int = 512  # LRU eviction above this size (split between chat and embeddings)
+    llm_cache_ttl_hours: int = 720  # Entries expire after this long (0 = never)
+    llm_cache_version: str = "1"  # Bump to invalidate every cached response
+    
+    # Summary Settings (map-reduce over the whole document, see SectionSummarizer)
+    summary_section_tokens: int = 3000  # Text per section; shorter documents are summarized in one call
+    summary_section_max_tokens: int = 300  # Length of each section's notes
+    summary_reduce_tokens: int = 12000  # Section notes per reduce call; more are merged in rounds first
+    summary_max_concurrency: int = 16  # Section summaries in flight per document (all calls are capped at llm_max_connections)
+    
+    # Entity Extraction Settings (whole document in windows, see WindowedExtractor)
+    extraction_window_tokens: int = 3000  # Text per extraction call
+    extraction_max_concurrency: int = 16  # Extraction calls in flight per document (all calls are capped at llm_max_connections)
+    
+    # Combined Analysis Settings
+    combined_analysis_enabled: bool = False  # One LLM call returns both summary and entities (see analysis_service)
+    
+    # Metrics Settings
+    metrics_enabled: bool = True  # Expose Prometheus metrics at /metrics
+    worker_metrics_port: int = 9101  # Port for a standalone worker's /metrics (0 disables)
+    
+    # Tracing Settings
+    tracing_enabled: bool = True  # Record spans for requests, pipeline stages and RAG queries
+    tracing_exporter: str = "jsonl"  # jsonl (local file) | otlp (OTLP/HTTP JSON collector)
+    tracing_file: str = "traces/spans.jsonl"  # JSONL exporter output
+    tracing_max_file_mb: int = 100  # Rotate the JSONL file (one backup kept) above this size
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"  # OTLP exporter target
+    tracing_sample_rate: float = 1.0  # Share of new traces recorded (children follow their root)
+    tracing_flush_seconds: float = 2.0  # Max delay before finished spans are exported
+    tracing_service_name: str = "doc-parser"  # service.name on exported spans (workers add "-worker")
+    
     class Config:
         env_file = ".env"
 
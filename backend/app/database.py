@@ -1,12 +1,46 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 engine = create_engine(settings.database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# create_all() creates missing tables but never alters existing ones, so columns
+# and indexes added to existing tables since the first release are added here.
+# Every statement is idempotent and safe to run on each start.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_size INTEGER",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS batch_id UUID REFERENCES upload_batches(id) ON DELETE SET NULL",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS dedup_source_id UUID REFERENCES documents(id) ON DELETE SET NULL",
+    "ALTER TABLE documents ADD COLUMN IF NOT EXISTS processing_metrics JSON",
+    "CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents (content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_documents_batch_id ON documents (batch_id)",
+    # Duplicate active jobs from before the unique index: keep a running one, else the oldest
+    """UPDATE processing_jobs SET status = 'dead', last_error = 'Duplicate of another active job'
+       WHERE id IN (SELECT id FROM (
+           SELECT id, row_number() OVER (PARTITION BY document_id, job_type
+                                         ORDER BY status = 'running' DESC, created_at) AS n
+           FROM processing_jobs WHERE document_id IS NOT NULL AND status IN ('queued', 'running')
+       ) ranked WHERE n > 1)""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS uq_processing_jobs_active_document
+       ON processing_jobs (document_id, job_type) WHERE status IN ('queued', 'running')""",
+]
+
+def init_db():
+    """Create missing tables, then bring tables from older deployments up to date."""
+    import app.models  # noqa: F401 - registers the tables on Base
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+    logger.info("Database schema up to date")
+
 def get_db():
     db = SessionLocal()
     try:
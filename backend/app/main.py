@@ -1,7 +1,21 @@
+import logging
+import threading
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.api.routes import documents, cases, chat, summary, entities
+from app.config import settings
+from app.database import init_db
+from app.api.routes import documents, cases, chat, summary, entities, ocr, jobs
+from app.services.ocr_registry import ocr_registry
+from app.services.progress_bus import progress_bus
+from app.services.llm_client import llm_client
+from app.middleware.upload_limits import UploadSizeLimitMiddleware
+from app.middleware.metrics import HTTPMetricsMiddleware
+from app.middleware.tracing import TracingMiddleware
+from app.services.metrics import metrics, collect_queue_metrics
+from app.services.pdf_text_backends import get_text_backend
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Demo API",
@@ -18,8 +32,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Reject oversized uploads before the multipart body is parsed
+def upload_body_limit(path: str):
+    if path.startswith("/api/documents/upload-batch"):
+        return settings.batch_max_total_mb * 1024 * 1024 + 1024 * 1024
+    if path.startswith("/api/documents/upload"):
+        # Multipart boundaries and part headers on top of the file bytes
+        return settings.max_file_size_mb * 1024 * 1024 + 64 * 1024
+    return None
+
+app.add_middleware(UploadSizeLimitMiddleware, limit_for_path=upload_body_limit)
+
+# Request spans; the trace context is handed on to queued jobs
+if settings.tracing_enabled:
+    app.add_middleware(TracingMiddleware)
+
+# Per-route latency histograms (outermost, so rejected uploads are counted too)
+if settings.metrics_enabled:
+    app.add_middleware(HTTPMetricsMiddleware)
+    metrics.add_collector(collect_queue_metrics)
+
+# Create tables and add columns missing from older deployments
+init_db()
+
+# Fail fast if the configured PDF text backend isn't installed
+get_text_backend()
 
 # Include routers
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
@@ -27,6 +64,34 @@ app.include_router(cases.router, prefix="/api/cases", tags=["cases"])
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(summary.router, prefix="/api/summary", tags=["summary"])
 app.include_router(entities.router, prefix="/api/entities", tags=["entities"])
+app.include_router(ocr.router, prefix="/api/ocr", tags=["ocr"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+
+@app.on_event("startup")
+def preload_ocr_engines():
+    # Warm the OCR model in the background so startup isn't blocked on it
+    if settings.ocr_preload:
+        threading.Thread(target=ocr_registry.preload, name="ocr-preload", daemon=True).start()
+
+@app.on_event("startup")
+def start_progress_listener():
+    # Receive progress events published by worker processes
+    progress_bus.start_listener()
+
+@app.on_event("startup")
+def start_embedded_worker():
+    # Single-process deployments: run queued jobs in the API process too
+    if settings.job_queue_enabled and settings.job_queue_embedded_worker:
+        from app.worker import start_embedded_worker as start_worker
+        start_worker()
+    elif settings.job_queue_enabled:
+        logger.warning("Job queue enabled without an embedded worker: uploads are only processed "
+                       "while a separate worker (python -m app.worker) is running")
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    # Close pooled OpenAI connections cleanly
+    await llm_client.aclose()
 
 @app.get("/")
 def read_root():
@@ -35,3 +100,10 @@ def read_root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    # Plain def: collectors query the database, so keep them off the event loop
+    if not settings.metrics_enabled:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,41 @@
+import time
+import logging
+
+from app.services.metrics import HTTP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPMetricsMiddleware:
+    """
+    Records request latency per route into the HTTP latency histogram.
+
+    Requests are labelled with the matched route's path template
+    (/api/documents/{document_id}) rather than the raw path, so ids don't
+    create a time series each; requests that match no route share
+    "unmatched". Streaming responses (SSE) are timed until the stream ends.
+    """
+
+    def __init__(self, app, exclude_paths: tuple = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = 500
+
+        async def tracking_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracking_send)
+        finally:
+            # The router records the matched route on the (shared) scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route, status=status)
@@ -0,0 +1,44 @@
+import logging
+
+from app.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class TracingMiddleware:
+    """
+    Opens a root span per HTTP request, continuing the caller's trace when a
+    W3C traceparent header is sent, and returns the request's traceparent in
+    the response headers so a slow response can be looked up in the traces.
+    The span is named after the matched route template once routing is done.
+    """
+
+    def __init__(self, app, exclude_paths: tuple = ("/metrics", "/health")):
+        self.app = app
+        self.exclude_paths = exclude_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        parent = headers.get(b"traceparent", b"").decode("latin-1") or None
+
+        with tracer.span(f"HTTP {scope['method']}", parent=parent, **{
+            "http.method": scope["method"],
+            "http.target": scope["path"],
+        }) as span:
+            async def tracing_send(message):
+                if span is not None and message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"traceparent", span.traceparent.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, tracing_send)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if span is not None and route:
+                    span.name = f"HTTP {scope['method']} {route}"
+                    span.set_attribute("http.route", route)
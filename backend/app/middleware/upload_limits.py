@@ -0,0 +1,75 @@
+import json
+from typing import Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects oversized request bodies with 413 before they are parsed.
+
+    FastAPI parses a multipart form (spooling it to a temp file) before the
+    route handler runs, so a size check in the handler only fires after the
+    whole upload has been received. This ASGI middleware rejects on the
+    Content-Length header up front, and for bodies without one (chunked
+    transfer) counts bytes as they arrive and aborts once over the limit.
+
+    limit_for_path(path) returns the byte limit for a request path, or None
+    for no limit.
+    """
+
+    def __init__(self, app, limit_for_path: Callable[[str], Optional[int]]):
+        self.app = app
+        self.limit_for_path = limit_for_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            return await self.app(scope, receive, send)
+        limit = self.limit_for_path(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit:
+            return await self._reject(send, limit)
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _BodyTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        body = json.dumps({"detail": f"Request body exceeds maximum allowed size ({limit / 1024 / 1024:.0f}MB)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
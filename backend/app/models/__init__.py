@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Text, Boolean, Integer, Float, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, String, Text, Boolean, Integer, Float, DateTime, ForeignKey, JSON, UniqueConstraint, Index, text
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 from app.database import Base
@@ -24,20 +24,36 @@ class Document(Base):
     filename = Column(String(255), nullable=False)
     file_path = Column(String(512), nullable=False)
     file_type = Column(String(50))
+    file_size = Column(Integer)  # bytes
+    content_hash = Column(String(64), index=True)  # SHA-256 of the file bytes
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("upload_batches.id", ondelete="SET NULL"), index=True)
+    dedup_source_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="SET NULL"))  # results copied from this document
     document_type = Column(String(100))
     uploaded_at = Column(DateTime, default=datetime.utcnow)
     processed = Column(Boolean, default=False)
     processing_status = Column(String(50), default="pending")  # pending, processing, completed, failed
     processing_progress = Column(Integer, default=0)  # 0-100 percentage
     processing_step = Column(String(100))  # current processing step description
-    ocr_text = Column(Text)
+    ocr_text = deferred(Column(Text))  # loaded on first access - can be the size of the whole document
     summary = Column(Text)
     page_count = Column(Integer)
+    processing_metrics = Column(JSON)  # per-page extraction report, stage timings
     
     case = relationship("Case", back_populates="documents")
     entities = relationship("ExtractedEntity", back_populates="document")
     chunks = relationship("DocumentChunk", back_populates="document")
 
+class UploadBatch(Base):
+    __tablename__ = "upload_batches"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    case_id = Column(UUID(as_uuid=True), ForeignKey("cases.id"))
+    status = Column(String(50), default="queued")  # queued, processing, completed, partial, failed
+    document_count = Column(Integer, default=0)
+    rejected_files = Column(JSON)  # [{"filename", "reason"}] skipped at upload
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime)
+
 class ExtractedEntity(Base):
     __tablename__ = "extracted_entities"
     
@@ -82,3 +98,38 @@ class DocumentChunk(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     document = relationship("Document", back_populates="chunks")
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+    __table_args__ = (
+        # At most one queued/running job per document and job type (see JobQueue.enqueue)
+        Index("uq_processing_jobs_active_document", "document_id", "job_type", unique=True,
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_type = Column(String(50), nullable=False, index=True)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    payload = Column(JSON)
+    status = Column(String(20), default="queued", index=True)  # queued, running, completed, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow, index=True)  # not leased before this
+    lease_expires_at = Column(DateTime)  # running jobs past this are considered stuck
+    leased_by = Column(String(255))  # worker id holding the lease
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime)
+
+class StageCheckpoint(Base):
+    __tablename__ = "stage_checkpoints"
+    __table_args__ = (UniqueConstraint("document_id", "stage"),)
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), index=True)
+    stage = Column(String(50), nullable=False)  # text, classification, summary, entities, embeddings
+    input_fingerprint = Column(String(64), nullable=False)  # hash of everything the stage read
+    config_version = Column(String(64), nullable=False)  # engine/prompt/model version the output came from
+    details = Column(JSON)
+    completed_at = Column(DateTime, default=datetime.utcnow)
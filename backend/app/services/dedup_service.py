@@ -0,0 +1,211 @@
+import math
+from typing import Optional
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Document
+from app.services.rag_service import EMBEDDING_TABLE
+from app.services.stage_checkpoints import stage_checkpoints
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token for cost estimates
+CHARS_PER_TOKEN = 4
+
+# Instructions, schema and answer around each summary/extraction call's text
+PROMPT_OVERHEAD_TOKENS = 300
+
+# Stages a clone reuses only if the source completed them under the current config
+AI_STAGES = ("summary", "entities", "embeddings")
+
+
+class DedupService:
+    """
+    Upload-time deduplication by content hash.
+    When a file identical to an already processed document is uploaded (to
+    any case), the new document is created by copying the earlier copy's
+    results - text, summary, entities, chunks and their embeddings - in SQL,
+    instead of paying for OCR, LLM and embedding calls again.
+
+    A completed document can still carry a failed AI stage (those don't fail
+    the document), so only stages whose checkpoint is current are copied -
+    checkpoints are recorded on success only. The others are left for the
+    pipeline to rerun on the clone, which then skips the copied stages.
+    """
+
+    def find_source(self, db: Session, content_hash: str, exclude_id=None) -> Optional[Document]:
+        """Oldest processed document with the same bytes whose extracted text is current."""
+        if not content_hash:
+            return None
+        query = db.query(Document).filter(
+            Document.content_hash == content_hash,
+            Document.processed == True,
+            Document.processing_status == "completed"
+        )
+        if exclude_id is not None:
+            query = query.filter(Document.id != exclude_id)
+        for document in query.order_by(Document.uploaded_at).limit(5):
+            if "text" in self.reusable_stages(db, document):
+                return document
+        return None
+
+    def reusable_stages(self, db: Session, document: Document) -> set[str]:
+        """Stages that completed successfully under the current config."""
+        status = stage_checkpoints.summarize(db, document.id)
+        return {stage for stage, state in status.items() if state["status"] == "current"}
+
+    def clone_results(self, db: Session, source: Document, target: Document) -> dict:
+        """
+        Copy the source's current results onto target and commit.
+        Returns what was copied, the stages still to run ("rerun_stages" -
+        the caller schedules processing when it isn't empty) and the
+        estimated cost saved.
+        """
+        source_id, target_id = str(source.id), str(target.id)
+        reused = self.reusable_stages(db, source)
+        rerun = [stage for stage in AI_STAGES if stage not in reused]
+
+        target.ocr_text = source.ocr_text
+        target.page_count = source.page_count
+        target.document_type = source.document_type
+        target.dedup_source_id = source.id
+
+        entities = chunks = embeddings = 0
+        if "summary" in reused:
+            target.summary = source.summary
+
+        if "entities" in reused:
+            entities = db.execute(text("""
+                INSERT INTO extracted_entities (id, document_id, entity_type, entity_value, confidence, source_location, extracted_at)
+                SELECT gen_random_uuid(), :target_id, entity_type, entity_value, confidence, source_location, now()
+                FROM extracted_entities WHERE document_id = :source_id
+            """), {"source_id": source_id, "target_id": target_id}).rowcount
+
+        if "embeddings" in reused:
+            chunks = db.execute(text("""
+                INSERT INTO document_chunks (id, document_id, chunk_text, chunk_index, page_number, embedding_id, created_at)
+                SELECT gen_random_uuid(), :target_id, chunk_text, chunk_index, page_number,
+                       replace(embedding_id, :source_id, :target_id), now()
+                FROM document_chunks WHERE document_id = :source_id
+            """), {"source_id": source_id, "target_id": target_id}).rowcount
+
+            embeddings = self._clone_embeddings(db, source_id, target_id)
+
+        # Same inputs, same outputs - the copied stages are as current as the source's
+        db.execute(text("""
+            INSERT INTO stage_checkpoints (id, document_id, stage, input_fingerprint, config_version, details, completed_at)
+            SELECT gen_random_uuid(), :target_id, stage, input_fingerprint, config_version, details, now()
+            FROM stage_checkpoints WHERE document_id = :source_id AND stage = ANY(:stages)
+        """), {"source_id": source_id, "target_id": target_id, "stages": sorted(reused)})
+
+        saved = self.estimate_savings(source, reused)
+        target.processing_metrics = {
+            "dedup": {
+                "source_document_id": source_id,
+                "entities_cloned": entities,
+                "chunks_cloned": chunks,
+                "embeddings_cloned": embeddings,
+                "rerun_stages": rerun,
+                **saved,
+            }
+        }
+        if rerun:
+            target.processing_step = f"Reused text from an identical document; running {', '.join(rerun)}"
+        else:
+            target.processed = True
+            target.processing_status = "completed"
+            target.processing_progress = 100
+            target.processing_step = "Reused results from an identical document"
+        db.commit()
+
+        logger.info(f"Document {target_id} deduplicated from {source_id}: {entities} entities, "
+                    f"{chunks} chunks, {embeddings} embeddings cloned"
+                    + (f", rerunning {', '.join(rerun)}" if rerun else ""))
+        return target.processing_metrics["dedup"]
+
+    def _clone_embeddings(self, db: Session, source_id: str, target_id: str) -> int:
+        """
+        Copy the source's vectors with the document id rewritten in their
+        metadata, so the clone is searchable without re-embedding.
+        """
+        metadata_type = db.execute(text("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = :table AND column_name = 'cmetadata'
+        """), {"table": EMBEDDING_TABLE}).scalar()
+        if not metadata_type:
+            return 0  # vector store never initialized
+
+        savepoint = db.begin_nested()
+        try:
+            # document_id and "source" both embed the id, so rewrite it throughout
+            cloned = db.execute(text(f"""
+                INSERT INTO {EMBEDDING_TABLE} (uuid, collection_id, embedding, document, cmetadata, custom_id)
+                SELECT gen_random_uuid(), collection_id, embedding, document,
+                       replace(cmetadata::text, :source_id, :target_id)::{metadata_type},
+                       gen_random_uuid()::text
+                FROM {EMBEDDING_TABLE} WHERE cmetadata->>'document_id' = :source_id
+            """), {"source_id": source_id, "target_id": target_id}).rowcount
+            savepoint.commit()
+            return cloned
+        except Exception as e:
+            savepoint.rollback()
+            logger.warning(f"Could not clone embeddings from {source_id}: {e}")
+            return 0
+
+    @staticmethod
+    def estimate_savings(source: Document, reused: set[str]) -> dict:
+        """Processing time and LLM/embedding tokens the reused part of the source's pipeline run cost."""
+        metrics = source.processing_metrics or {}
+        if "dedup" in metrics and reused.issuperset(AI_STAGES):
+            # Source is itself a clone - it carries the original's estimate
+            return {key: metrics["dedup"][key] for key in ("seconds_saved", "tokens_saved") if key in metrics["dedup"]}
+
+        extraction = metrics.get("extraction", {})
+        stages = metrics.get("stages", {})
+        seconds = extraction.get("ocr_seconds", 0.0) + extraction.get("text_layer_seconds", 0.0)
+        if reused.issuperset(AI_STAGES):
+            seconds += stages.get("wall_seconds", 0.0)
+        else:
+            seconds += sum(stages.get(stage, {}).get("seconds", 0.0) for stage in AI_STAGES if stage in reused)
+            if reused.issuperset(("summary", "entities")):
+                seconds += stages.get("analysis", {}).get("seconds", 0.0)  # combined summary + entities call
+
+        # Summary (map-reduce), extraction (windows) and embeddings each read the whole text
+        text_tokens = len(source.ocr_text or "") // CHARS_PER_TOKEN
+        sections = max(1, math.ceil(text_tokens / settings.summary_section_tokens))
+        windows = max(1, math.ceil(text_tokens / settings.extraction_window_tokens))
+        # Multi-section summaries also write section notes, which the reduce call reads again
+        reduce_tokens = 2 * sections * settings.summary_section_max_tokens if sections > 1 else 0
+        stage_tokens = {
+            # The summary stage records what it actually used
+            "summary": stages.get("summary", {}).get("tokens")
+                       or text_tokens + sections * PROMPT_OVERHEAD_TOKENS + reduce_tokens,
+            "entities": text_tokens + windows * PROMPT_OVERHEAD_TOKENS,
+            "embeddings": text_tokens,
+        }
+        tokens = sum(count for stage, count in stage_tokens.items() if stage in reused)
+        return {"seconds_saved": round(seconds, 3), "tokens_saved": tokens}
+
+    def get_stats(self, db: Session) -> dict:
+        """Dedup hit rate and estimated savings, for usage stats."""
+        total = db.query(Document).count()
+        clones = db.query(Document.processing_metrics).filter(Document.dedup_source_id.isnot(None)).all()
+        seconds = tokens = 0
+        for (metrics,) in clones:
+            dedup = (metrics or {}).get("dedup", {})
+            seconds += dedup.get("seconds_saved", 0)
+            tokens += dedup.get("tokens_saved", 0)
+        return {
+            "enabled": settings.dedup_enabled,
+            "hits": len(clones),
+            "hit_rate": round(len(clones) / total, 3) if total else 0.0,
+            "seconds_saved": round(seconds, 1),
+            "tokens_saved": tokens,
+        }
+
+
+# Global instance
+dedup_service = DedupService()
@@ -0,0 +1,180 @@
+import re
+from collections import defaultdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# keyword -> weight, per document type. Distinctive phrases weigh more than
+# words that show up in every kind of medical document ("patient", "blood").
+KEYWORDS: dict[str, dict[str, int]] = {
+    "medical_record": {
+        "diagnosis": 2, "patient": 1, "medical": 1, "doctor": 1, "hospital": 1, "treatment": 1,
+        "chief complaint": 3, "history of present illness": 3, "assessment and plan": 3,
+        "physical exam": 2, "physical examination": 2, "progress note": 3, "discharge summary": 3,
+        "follow-up": 1, "icd-10": 2, "vital signs": 2,
+    },
+    "lab_report": {
+        "lab": 1, "test result": 2, "test results": 2, "blood": 1, "specimen": 3, "laboratory": 3,
+        "reference range": 3, "complete blood count": 3, "cbc": 2, "hemoglobin": 2,
+        "platelet": 2, "collection date": 2, "within normal limits": 1, "panel": 1,
+    },
+    "imaging_report": {
+        "x-ray": 3, "mri": 3, "ct scan": 3, "imaging": 2, "radiology": 3, "radiologist": 3,
+        "ultrasound": 3, "impression": 2, "contrast": 1, "views": 1,
+    },
+    "prescription": {
+        "prescription": 3, "medication": 1, "pharmacy": 3, "dosage": 2, "refills": 3,
+        "dispense": 3, "rx": 2, "sig": 2, "pharmacist": 3,
+    },
+}
+
+# Tie-break order (the order the old first-match classifier checked labels in)
+LABEL_PRIORITY = ["medical_record", "lab_report", "imaging_report", "prescription"]
+
+
+def _build_trie(words: list[str]) -> dict:
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True  # end of keyword
+    return trie
+
+
+def _trie_to_pattern(node: dict) -> str:
+    """
+    Compile a trie into a regex with shared prefixes factored out, e.g.
+    ["test", "test result", "testing"] -> "test(?:\\s+result|ing)?".
+    The regex engine then walks every keyword at once, like an Aho-Corasick
+    automaton, in a single C-level pass over the text.
+    """
+    optional = "" in node
+    branches = []
+    for char in sorted(k for k in node if k):
+        token = r"\s+" if char == " " else re.escape(char)
+        branches.append(token + _trie_to_pattern(node[char]))
+
+    if not branches:
+        return ""
+    if len(branches) == 1 and not optional:
+        return branches[0]
+    pattern = "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if optional else pattern
+
+
+class DocumentClassifier:
+    """
+    Keyword-scoring document classifier.
+    All keywords for all document types are matched in one pass; each hit adds
+    its weight to every label it belongs to and the best total wins (ties go
+    to LABEL_PRIORITY order). Scanning stops early once one label is so far
+    ahead that the rest of the text can't plausibly change the outcome.
+    """
+
+    MIN_SCORE = 2  # below this, fall back to general_document
+    CERTAIN_SCORE = 20  # early stop: leader has at least this much...
+    CERTAIN_MARGIN = 12  # ...and leads the runner-up by this much
+
+    def __init__(self, keywords: dict[str, dict[str, int]] = None):
+        keywords = keywords or KEYWORDS
+        self.labels = list(keywords)
+        self.weights: dict[str, list[tuple[str, int]]] = defaultdict(list)
+        for label, words in keywords.items():
+            for word, weight in words.items():
+                self.weights[word.lower()].append((label, weight))
+
+        trie = _build_trie(list(self.weights))
+        # Whole words only: "lab" must not match "label" or "collaborate"
+        self.pattern = re.compile(r"(?<!\w)" + _trie_to_pattern(trie) + r"(?!\w)", re.IGNORECASE)
+        # A match ending this close to the end of a piece may continue in the next one
+        self.hold_back = max(len(word) for word in self.weights)
+
+    def classify_with_scores(self, text: str) -> dict:
+        """
+        Returns {"document_type", "scores", "matches", "chars_scanned", "early_stop"}.
+        """
+        state = self.start()
+        self.feed(state, text)
+        return self.result(state)
+
+    def start(self) -> dict:
+        """Empty scoring state for incremental classification (start -> feed... -> result)."""
+        return {
+            "scores": {label: 0 for label in self.labels},
+            "matches": 0,
+            "chars_scanned": 0,
+            "early_stop": False,
+            "tail": "",  # end of the text fed so far, rescanned with the next piece
+            "resume": 0,  # where unscored text starts in the tail
+        }
+
+    def feed(self, state: dict, text: str) -> bool:
+        """
+        Add a piece of text (e.g. one page) to a scoring state.
+        Returns False once the outcome is certain and further text can be skipped.
+        The end of each piece is carried into the next, so keywords split
+        across pieces score the same as in one call with the whole text.
+        """
+        return self._scan(state, state["tail"] + text, final=False)
+
+    def result(self, state: dict) -> dict:
+        # Keywords held back at the end of the last piece
+        self._scan(state, state["tail"], final=True)
+        scores = state["scores"]
+        best = max(self.labels, key=lambda label: (scores[label], -self._priority(label)))
+        document_type = best if scores[best] >= self.MIN_SCORE else "general_document"
+        return {
+            "document_type": document_type,
+            "scores": scores,
+            "matches": state["matches"],
+            "chars_scanned": state["chars_scanned"],
+            "early_stop": state["early_stop"],
+        }
+
+    def _scan(self, state: dict, buffer: str, final: bool) -> bool:
+        """Score the keywords in buffer (tail + new text) from state["resume"] on."""
+        if state["early_stop"]:
+            return False
+        scores = state["scores"]
+        carried = len(state["tail"])
+        settled = len(buffer) if final else len(buffer) - self.hold_back
+        resume = max(state["resume"], settled)
+
+        # pos (not slicing) keeps the lookbehind seeing the character before the resume point
+        for match in self.pattern.finditer(buffer, state["resume"]):
+            if match.end() > settled:
+                resume = match.start()
+                break
+            keyword = " ".join(match.group(0).lower().split())
+            for label, weight in self.weights.get(keyword, ()):
+                scores[label] += weight
+            state["matches"] += 1
+            resume = max(match.end(), settled)
+
+            if state["matches"] % 4 == 0:
+                top, runner_up = sorted(scores.values(), reverse=True)[:2]
+                if top >= self.CERTAIN_SCORE and top - runner_up >= self.CERTAIN_MARGIN:
+                    # The tail was counted with the previous piece
+                    state["chars_scanned"] += match.end() - carried
+                    state["early_stop"] = True
+                    state["tail"] = ""
+                    return False
+
+        state["chars_scanned"] += len(buffer) - carried
+        # Keep one character before the resume point for the whole-word lookbehind
+        start = max(0, resume - 1)
+        state["tail"] = "" if final else buffer[start:]
+        state["resume"] = resume - start
+        return True
+
+    def classify(self, text: str) -> str:
+        return self.classify_with_scores(text)["document_type"]
+
+    @staticmethod
+    def _priority(label: str) -> int:
+        return LABEL_PRIORITY.index(label) if label in LABEL_PRIORITY else len(LABEL_PRIORITY)
+
+
+# Global instance
+document_classifier = DocumentClassifier()
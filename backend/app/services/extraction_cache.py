@@ -0,0 +1,109 @@
+import hashlib
+import json
+from typing import Optional
+import logging
+
+from app.config import settings
+from app.services.ocr_registry import ocr_registry
+from app.services.pdf_text_backends import get_text_backend
+from app.utils.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the extraction code changes in a way that alters its output
+EXTRACTION_VERSION = "1"
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of text extraction results.
+    Entries are keyed by the SHA-256 of the file bytes plus a fingerprint of
+    the OCR engine and every setting that affects extraction output, so the
+    same file uploaded to several cases (or reprocessed) is only OCR'd once.
+    """
+
+    def __init__(self):
+        self.cache = DiskCache(
+            settings.extraction_cache_dir,
+            settings.extraction_cache_max_mb * 1024 * 1024,
+        )
+
+    def config_fingerprint(self) -> str:
+        """Short hash of the engine and settings that determine extraction output."""
+        config = {
+            "extraction_version": EXTRACTION_VERSION,
+            "cache_version": settings.extraction_cache_version,
+            "engine": "easyocr" if ocr_registry.available else None,
+            "engine_version": ocr_registry.engine_version,
+            "languages": list(settings.ocr_languages),
+            "dpi": settings.ocr_dpi,
+            "text_backend": get_text_backend().name,
+            "text_layer_min_chars": settings.text_layer_min_chars,
+            "text_layer_min_word_ratio": settings.text_layer_min_word_ratio,
+            "preprocessing": settings.ocr_preprocessing_enabled and [
+                settings.ocr_target_text_height_px,
+                settings.ocr_max_upscale,
+                settings.ocr_max_megapixels,
+                settings.ocr_deskew_max_degrees,
+                settings.ocr_blank_ink_ratio,
+            ],
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _key(self, file_hash: str) -> str:
+        return f"{file_hash}-{self.config_fingerprint()}"
+
+    def get(self, file_hash: str) -> Optional[dict]:
+        return self.cache.get(self._key(file_hash))
+
+    def put(self, file_hash: str, pages: list[tuple[int, str]], page_count: int,
+            report: dict, empty_text: str):
+        try:
+            self.cache.set(self._key(file_hash), {
+                "pages": [[page_num, text] for page_num, text in pages],
+                "page_count": page_count,
+                "empty_text": empty_text,
+                "report": report,
+            })
+        except Exception as e:
+            # A cache write failure must never fail extraction
+            logger.warning(f"Failed to write extraction cache entry for {file_hash}: {e}")
+
+    def invalidate(self, file_hash: Optional[str] = None, stale_only: bool = False) -> int:
+        """
+        Remove cache entries. With file_hash, only that file's entries; with
+        stale_only, only entries built under a different OCR configuration.
+        """
+        current = self.config_fingerprint()
+
+        def matches(key: str) -> bool:
+            entry_hash, _, fingerprint = key.rpartition("-")
+            if file_hash and entry_hash != file_hash:
+                return False
+            if stale_only and fingerprint == current:
+                return False
+            return True
+
+        removed = self.cache.clear(matches)
+        logger.info(f"Invalidated {removed} extraction cache entries")
+        return removed
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": settings.extraction_cache_enabled,
+            "config_fingerprint": self.config_fingerprint(),
+            **self.cache.get_stats(),
+        }
+
+
+# Global instance
+extraction_cache = ExtractionCache()
@@ -1,9 +1,35 @@
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 from app.config import settings
+from app.services.llm_client import llm_client
+from app.services.tracing import tracer
+from app.utils.tokens import count_tokens, split_to_budget
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bump when the extraction prompt, schema or model changes (invalidates entity checkpoints)
+EXTRACTION_PROMPT_VERSION = "2"
+
+# Page separators written by the OCR service ("--- Page 12 ---")
+_PAGE_MARKER = re.compile(r"^--- Page (\d+) ---$", re.MULTILINE)
+
+# Confidence for findings that come without a usable one
+DEFAULT_CONFIDENCE = 0.8
+
+
+def parse_confidence(value) -> float:
+    """The model's confidence as a float ("0.9" included); DEFAULT_CONFIDENCE if it isn't a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_CONFIDENCE
+
 class ExtractionService:
     """
     Service for extracting structured entities from medical documents.
@@ -11,49 +37,42 @@ class ExtractionService:
     """
     
     def __init__(self):
-        if settings.openai_api_key and settings.openai_api_key != "your_openai_api_key_here":
-            try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=settings.openai_api_key)
-            except Exception as e:
-                logger.warning(f"Failed to initialize OpenAI client: {e}")
-                self.client = None
-        else:
-            self.client = None
+        # Shared, pooled client - constructing the service per document is cheap
+        self.client = llm_client if llm_client.available else None
     
     def extract_entities(self, text: str, document_type: str = "medical_record") -> list[dict]:
         """
-        Extract structured entities from document text.
+        Extract structured entities from the whole document text.
         Returns list of entities with type, value, and confidence.
         """
-        if not self.client:
-            return []
+        extractor = self.start_extraction()
+        extractor.add(text)
+        return extractor.finish(document_type)
+    
+    def start_extraction(self) -> "WindowedExtractor":
+        """Incremental extraction: add() text as it is extracted, then finish()."""
+        return WindowedExtractor(self)
+    
+    def _extract_window(self, text: str, schema: dict) -> list[dict]:
+        """One extraction call over one window of text."""
+        prompt = self._build_extraction_prompt(text, schema)
         
-        try:
-            schema = self._get_extraction_schema(document_type)
-            prompt = self._build_extraction_prompt(text, schema)
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a medical information extraction assistant. Extract structured data accurately from medical documents."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            entities = self._format_entities(result)
-            
-            return entities
-            
-        except Exception as e:
-            logger.error(f"Error extracting entities: {str(e)}")
-            return []
+        response = self.client.chat(
+            "extraction",
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "You are a medical information extraction assistant. Extract structured data accurately from medical documents."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            response_format={"type": "json_object"}
+        )
+        
+        result = json.loads(response.choices[0].message.content)
+        return self.format_entities(result)
     
-    def _get_extraction_schema(self, document_type: str) -> dict:
-        """Define extraction schema based on document type."""
+    def get_extraction_schema(self, document_type: str) -> dict:
+        """Define extraction schema based on document type (also used by the combined analysis prompt)."""
         
         base_schema = {
             "provider": "Healthcare provider name and specialty",
@@ -86,7 +105,7 @@ class ExtractionService:
     def _build_extraction_prompt(self, text: str, schema: dict) -> str:
         """Build extraction prompt with schema."""
         
-        schema_desc = "\n".join([f"- {key}: {desc}" for key, desc in schema.items()])
+        schema_desc = self.format_schema(schema)
         
         prompt = f"""Extract the following information from the medical document. 
 Return a JSON object with the extracted entities. For each entity type, provide a list of findings.
@@ -103,14 +122,18 @@ Format your response as JSON:
 }}
 
 Document text:
-{text[:3000]}
+{text}
 
 Return only valid JSON."""
         
         return prompt
     
-    def _format_entities(self, raw_result: dict) -> list[dict]:
-        """Format extracted entities into standard structure."""
+    def format_schema(self, schema: dict) -> str:
+        """Schema as the bullet list the extraction prompts show the model."""
+        return "\n".join([f"- {key}: {desc}" for key, desc in schema.items()])
+    
+    def format_entities(self, raw_result: dict) -> list[dict]:
+        """Format extracted entities into standard structure (also parses combined analysis responses)."""
         
         entities = []
         
@@ -123,15 +146,169 @@ Return only valid JSON."""
                     entities.append({
                         "entity_type": entity_type,
                         "entity_value": finding.get("value", str(finding)),
-                        "confidence": finding.get("confidence", 0.8),
+                        "confidence": parse_confidence(finding.get("confidence", DEFAULT_CONFIDENCE)),
                         "source_location": {"context": finding.get("context", "")}
                     })
                 elif finding:  # Simple string value
                     entities.append({
                         "entity_type": entity_type,
                         "entity_value": str(finding),
-                        "confidence": 0.8,
+                        "confidence": DEFAULT_CONFIDENCE,
                         "source_location": {}
                     })
         
         return entities
+
+
+def normalize_entity_value(value: str) -> str:
+    """Comparison key for an entity value: case, spacing and edge punctuation ignored."""
+    return re.sub(r"\s+", " ", str(value)).strip(" \t.,;:-").casefold()
+
+
+def merge_entities(entities: list[dict]) -> list[dict]:
+    """
+    Merge findings of the same entity type and normalized value.
+    The highest-confidence finding supplies the value and context; every
+    finding's location is kept in source_location["occurrences"].
+    """
+    merged = {}
+    for entity in entities:
+        key = (entity["entity_type"], normalize_entity_value(entity["entity_value"]))
+        if not key[1]:
+            continue
+        location = entity.get("source_location") or {}
+        existing = merged.get(key)
+        if existing is None:
+            merged[key] = existing = {**entity, "confidence": parse_confidence(entity.get("confidence")),
+                                      "source_location": {**location, "occurrences": []}}
+        elif parse_confidence(entity.get("confidence")) > parse_confidence(existing.get("confidence")):
+            existing.update(entity_value=entity["entity_value"], confidence=parse_confidence(entity["confidence"]))
+            existing["source_location"].update({k: v for k, v in location.items() if k != "occurrences"})
+        if location and location not in existing["source_location"]["occurrences"]:
+            existing["source_location"]["occurrences"].append(location)
+    return list(merged.values())
+
+
+class WindowedExtractor:
+    """
+    Entity extraction over a whole document of any length, fed incrementally.
+    
+    Text is packed into windows of about settings.extraction_window_tokens
+    tokens on paragraph boundaries, and finish() extracts every window on a
+    bounded thread pool (settings.extraction_max_concurrency; the shared
+    llm_client further caps calls across all documents). Windows wait
+    for finish() because the schema depends on the document type, which the
+    streaming pipeline only knows at the end. They wait in a temporary file
+    rather than in memory, so streaming stays bounded by pages in flight.
+    Findings are merged across windows (see merge_entities) and located by
+    page when the text carries page markers.
+    """
+    
+    def __init__(self, service: ExtractionService):
+        self.service = service
+        self.budget = settings.extraction_window_tokens
+        self.windows = []  # (offset in the spool file, length, page the window starts on)
+        self._spool = None
+        self._spool_lock = threading.Lock()
+        self.buffer = []
+        self.buffer_tokens = 0
+        self.buffer_page = None
+        self.page = None
+    
+    def add(self, text: str):
+        for piece in split_to_budget(text, self.budget):
+            tokens = count_tokens(piece)
+            if self.buffer and self.buffer_tokens + tokens > self.budget:
+                self._close_window()
+            if not self.buffer:
+                self.buffer_page = self.page
+            self.buffer.append(piece)
+            self.buffer_tokens += tokens
+            markers = _PAGE_MARKER.findall(piece)
+            if markers:
+                self.page = int(markers[-1])
+    
+    def _close_window(self):
+        data = "\n\n".join(self.buffer).encode("utf-8", "surrogatepass")
+        self.buffer, self.buffer_tokens = [], 0
+        with self._spool_lock:
+            if self._spool is None:
+                self._spool = tempfile.TemporaryFile(prefix="extraction-")
+            offset = self._spool.seek(0, os.SEEK_END)
+            self._spool.write(data)
+        self.windows.append((offset, len(data), self.buffer_page))
+    
+    def _window_text(self, index: int) -> str:
+        offset, length, _ = self.windows[index]
+        with self._spool_lock:
+            self._spool.seek(offset)
+            data = self._spool.read(length)
+        return data.decode("utf-8", "surrogatepass")
+    
+    def close(self):
+        """Drop the spooled windows (finish() does this itself)."""
+        with self._spool_lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+    
+    def finish(self, document_type: str = "medical_record") -> list[dict]:
+        try:
+            if not self.service.client:
+                return []
+            if self.buffer:
+                self._close_window()
+            if not self.windows:
+                return []
+            return self._extract_all(document_type)
+        finally:
+            self.close()
+    
+    def _extract_all(self, document_type: str) -> list[dict]:
+        schema = self.service.get_extraction_schema(document_type)
+        findings = []
+        failed = 0
+        with tracer.span("extraction.windows", windows=len(self.windows)):
+            workers = min(settings.extraction_max_concurrency, len(self.windows))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extraction") as executor:
+                futures = {
+                    executor.submit(tracer.run_in_context(self._extract), index, schema): index
+                    for index in range(len(self.windows))
+                }
+                for future in as_completed(futures):
+                    try:
+                        findings.extend(future.result())
+                    except Exception as e:
+                        # One bad window must not discard the rest of the document
+                        failed += 1
+                        logger.error(f"Error extracting entities from window {futures[future] + 1}: {str(e)}")
+        
+        # Window order, so merged occurrences read front to back
+        findings.sort(key=lambda entity: entity["source_location"].get("window", 0))
+        entities = merge_entities(findings)
+        if len(self.windows) > 1:
+            logger.info(f"Extracted {len(entities)} entities ({len(findings)} findings) from "
+                        f"{len(self.windows)} windows" + (f", {failed} failed" if failed else ""))
+        return entities
+    
+    def _extract(self, index: int, schema: dict) -> list[dict]:
+        text, start_page = self._window_text(index), self.windows[index][2]
+        entities = self.service._extract_window(text, schema)
+        for entity in entities:
+            location = entity["source_location"]
+            location["window"] = index + 1
+            page = self._locate_page(text, start_page, location.get("context") or entity["entity_value"])
+            if page is not None:
+                location["page"] = page
+        return entities
+    
+    @staticmethod
+    def _locate_page(text: str, start_page: Optional[int], snippet: str) -> Optional[int]:
+        """Page the snippet appears on: the last page marker before it in the window."""
+        position = text.find(snippet) if snippet else -1
+        if position < 0:
+            position = text.casefold().find(str(snippet).casefold()[:60]) if snippet else -1
+        if position < 0:
+            return start_page
+        markers = [int(match.group(1)) for match in _PAGE_MARKER.finditer(text, 0, position)]
+        return markers[-1] if markers else start_page
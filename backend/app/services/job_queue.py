@@ -0,0 +1,275 @@
+import random
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
+
+from sqlalchemy import func, or_, and_, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Document, ProcessingJob
+from app.services.progress_bus import progress_bus
+from app.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+PROCESS_DOCUMENT = "process_document"
+PROCESS_BATCH = "process_batch"
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobQueue:
+    """
+    Durable job queue stored in Postgres (processing_jobs table).
+
+    Workers lease one job at a time with SELECT ... FOR UPDATE SKIP LOCKED, so
+    any number of worker processes can poll the same table without handing
+    out a job twice. A lease is a visibility timeout: the worker heartbeats
+    to extend it, and a job whose lease runs out (worker crashed, deploy
+    killed it) becomes leasable again. Failed jobs are retried with
+    exponential backoff and dead-lettered after max_attempts.
+    """
+
+    def enqueue(self, db: Session, job_type: str, document_id=None, payload: Optional[dict] = None,
+                max_attempts: Optional[int] = None) -> ProcessingJob:
+        """
+        Add a job and commit. A document only ever has one active job: enqueuing
+        while one is queued or running returns the existing job. A partial
+        unique index backs this up, so concurrent enqueues for the same
+        document still end up with a single job.
+        The current trace context is stored in the payload so the worker's
+        spans join the trace of the request that enqueued the job.
+        """
+        if document_id is not None:
+            existing = self._active_job(db, job_type, document_id)
+            if existing:
+                logger.info(f"Job {existing.id} already active for document {document_id}")
+                return existing
+
+        payload = dict(payload or {})
+        traceparent = tracer.inject()
+        if traceparent:
+            payload["traceparent"] = traceparent
+        job = ProcessingJob(
+            job_type=job_type,
+            document_id=document_id,
+            payload=payload,
+            max_attempts=max_attempts or settings.job_max_attempts,
+        )
+        try:
+            # Savepoint: losing the race only undoes this insert, not the caller's changes
+            with db.begin_nested():
+                db.add(job)
+        except IntegrityError:
+            existing = self._active_job(db, job_type, document_id)
+            if not existing:
+                raise
+            db.commit()
+            logger.info(f"Job {existing.id} was enqueued concurrently for document {document_id}")
+            return existing
+        db.commit()
+        db.refresh(job)
+        logger.info(f"Enqueued {job_type} job {job.id}")
+        return job
+
+    def lease(self, db: Session, worker_id: str, job_types: Optional[list[str]] = None) -> Optional[ProcessingJob]:
+        """
+        Claim the next runnable job: queued and due, or running with an expired
+        lease. Returns None when there is nothing to do.
+        """
+        now = datetime.utcnow()
+        query = db.query(ProcessingJob).filter(or_(
+            and_(ProcessingJob.status == "queued", ProcessingJob.run_after <= now),
+            and_(ProcessingJob.status == "running", ProcessingJob.lease_expires_at < now),
+        ))
+        if job_types:
+            query = query.filter(ProcessingJob.job_type.in_(job_types))
+        job = query.order_by(ProcessingJob.run_after).with_for_update(skip_locked=True).first()
+        if not job:
+            db.rollback()
+            return None
+
+        if job.status == "running":
+            logger.warning(f"Job {job.id} lease held by {job.leased_by} expired, re-leasing")
+            if job.attempts >= job.max_attempts:
+                self._dead_letter(db, job, job.last_error or "Lease expired on final attempt")
+                db.commit()
+                return None
+
+        job.status = "running"
+        job.attempts += 1
+        job.leased_by = worker_id
+        job.lease_expires_at = now + timedelta(seconds=settings.job_lease_seconds)
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def heartbeat(self, db: Session, job_id, worker_id: str) -> bool:
+        """Extend a lease. Returns False if the worker no longer holds it."""
+        updated = db.query(ProcessingJob).filter(
+            ProcessingJob.id == job_id,
+            ProcessingJob.status == "running",
+            ProcessingJob.leased_by == worker_id
+        ).update({
+            ProcessingJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=settings.job_lease_seconds)
+        }, synchronize_session=False)
+        db.commit()
+        return bool(updated)
+
+    def complete(self, db: Session, job_id, worker_id: str) -> bool:
+        updated = db.query(ProcessingJob).filter(
+            ProcessingJob.id == job_id,
+            ProcessingJob.status == "running",
+            ProcessingJob.leased_by == worker_id
+        ).update({
+            ProcessingJob.status: "completed",
+            ProcessingJob.completed_at: datetime.utcnow(),
+            ProcessingJob.lease_expires_at: None,
+        }, synchronize_session=False)
+        db.commit()
+        if not updated:
+            logger.warning(f"Job {job_id} finished after {worker_id} lost its lease")
+        return bool(updated)
+
+    def fail(self, db: Session, job_id, worker_id: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt: schedule a retry with backoff, or dead-letter
+        the job once it is out of attempts. Returns the job's new status.
+        """
+        job = db.query(ProcessingJob).filter(
+            ProcessingJob.id == job_id,
+            ProcessingJob.leased_by == worker_id
+        ).with_for_update().first()
+        if not job or job.status != "running":
+            db.rollback()
+            logger.warning(f"Job {job_id} failed after {worker_id} lost its lease: {error}")
+            return None
+
+        if job.attempts >= job.max_attempts:
+            self._dead_letter(db, job, error)
+        else:
+            delay = self.retry_delay(job.attempts)
+            job.status = "queued"
+            job.last_error = error
+            job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            job.lease_expires_at = None
+            job.leased_by = None
+            self._set_document_step(db, job, "pending",
+                                    f"Retrying in {delay:.0f}s (attempt {job.attempts + 1} of {job.max_attempts})")
+            logger.warning(f"Job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+        db.commit()
+        return job.status
+
+    def retry_delay(self, attempts: int) -> float:
+        """Exponential backoff with +/-20% jitter so failed jobs don't retry in lockstep."""
+        delay = min(settings.job_retry_max_seconds, settings.job_retry_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def retry_dead(self, db: Session, job_id) -> Optional[ProcessingJob]:
+        """
+        Put a dead-lettered job back in the queue with a fresh set of attempts.
+        If its document has meanwhile got another active job, that job is returned.
+        """
+        job = db.query(ProcessingJob).filter(
+            ProcessingJob.id == job_id,
+            ProcessingJob.status == "dead"
+        ).first()
+        if not job:
+            return None
+        if job.document_id is not None:
+            existing = self._active_job(db, job.job_type, job.document_id)
+            if existing:
+                return existing
+        job.status = "queued"
+        job.attempts = 0
+        job.run_after = datetime.utcnow()
+        self._set_document_step(db, job, "pending", "Queued for processing")
+        db.commit()
+        db.refresh(job)
+        return job
+
+    def recover_stuck(self, db: Session) -> dict:
+        """
+        Housekeeping run by workers on startup and periodically:
+        - dead-letter running jobs whose lease expired on their final attempt
+          (expired leases with attempts left are simply re-leased)
+        - enqueue documents left "pending"/"processing" with no active job,
+          e.g. ones that were running in an API BackgroundTask when it restarted
+        """
+        now = datetime.utcnow()
+        dead = 0
+        expired = db.query(ProcessingJob).filter(
+            ProcessingJob.status == "running",
+            ProcessingJob.lease_expires_at < now,
+            ProcessingJob.attempts >= ProcessingJob.max_attempts
+        ).with_for_update(skip_locked=True).all()
+        for job in expired:
+            self._dead_letter(db, job, job.last_error or "Lease expired on final attempt")
+            dead += 1
+        db.commit()
+
+        cutoff = now - timedelta(seconds=settings.job_lease_seconds)
+        active_jobs = db.query(ProcessingJob.document_id).filter(
+            ProcessingJob.document_id.isnot(None),
+            ProcessingJob.status.in_(ACTIVE_STATUSES)
+        )
+        active_batches = db.query(ProcessingJob.payload["batch_id"].as_string()).filter(
+            ProcessingJob.job_type == PROCESS_BATCH,
+            ProcessingJob.status.in_(ACTIVE_STATUSES)
+        )
+        orphaned = db.query(Document.id).filter(
+            Document.processed == False,
+            Document.processing_status.in_(("pending", "processing")),
+            Document.uploaded_at < cutoff,
+            ~Document.id.in_(active_jobs),
+            or_(Document.batch_id.is_(None), ~Document.batch_id.cast(String).in_(active_batches))
+        ).all()
+        for (document_id,) in orphaned:
+            self.enqueue(db, PROCESS_DOCUMENT, document_id)
+
+        if dead or orphaned:
+            logger.info(f"Recovered stuck work: {dead} jobs dead-lettered, {len(orphaned)} orphaned documents re-enqueued")
+        return {"dead_lettered": dead, "requeued_documents": len(orphaned)}
+
+    def get_stats(self, db: Session) -> dict:
+        counts = dict(db.query(ProcessingJob.status, func.count(ProcessingJob.id)).group_by(ProcessingJob.status).all())
+        oldest = db.query(func.min(ProcessingJob.run_after)).filter(
+            ProcessingJob.status == "queued",
+            ProcessingJob.run_after <= datetime.utcnow()
+        ).scalar()
+        return {
+            "enabled": settings.job_queue_enabled,
+            "counts": {status: counts.get(status, 0) for status in ("queued", "running", "completed", "dead")},
+            "oldest_ready_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+        }
+
+    @staticmethod
+    def _active_job(db: Session, job_type: str, document_id) -> Optional[ProcessingJob]:
+        return db.query(ProcessingJob).filter(
+            ProcessingJob.document_id == document_id,
+            ProcessingJob.job_type == job_type,
+            ProcessingJob.status.in_(ACTIVE_STATUSES)
+        ).first()
+
+    def _dead_letter(self, db: Session, job: ProcessingJob, error: str):
+        job.status = "dead"
+        job.last_error = error
+        job.lease_expires_at = None
+        self._set_document_step(db, job, "failed", f"Processing failed after {job.attempts} attempts: {error}"[:100])
+        logger.error(f"Job {job.id} dead-lettered after {job.attempts} attempts: {error}")
+
+    @staticmethod
+    def _set_document_step(db: Session, job: ProcessingJob, status: str, step: str):
+        if job.document_id is None:
+            return
+        db.query(Document).filter(Document.id == job.document_id).update({
+            Document.processing_status: status,
+            Document.processing_step: step[:100],
+        }, synchronize_session=False)
+        progress_bus.publish(job.document_id, status=status, step=step)
+
+
+# Global instance
+job_queue = JobQueue()
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import threading
+from typing import Optional
+import logging
+
+from app.config import settings
+from app.services.metrics import LLM_CACHE_LOOKUPS, LLM_CACHE_TOKENS_SAVED, LLM_CACHE_SECONDS_SAVED
+from app.utils.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent cache of OpenAI responses, shared by every service through
+    llm_client.
+
+    Chat completions are keyed by the full request - model, messages and
+    every parameter (temperature, response_format, max_tokens, ...) - so
+    only an identical request is answered from cache. Embeddings are keyed
+    per input text, so a batch that is partly cached only sends the rest.
+    Reprocessing, duplicate documents and regenerated case summaries then
+    cost no tokens. Entries expire after a TTL and the least recently used
+    are evicted past the size limit (see DiskCache).
+
+    Each entry stores the original call's token usage and latency, so hits
+    report what they saved.
+    """
+
+    def __init__(self):
+        ttl = settings.llm_cache_ttl_hours * 3600 or None
+        self.chat_cache = DiskCache(
+            f"{settings.llm_cache_dir}/chat", settings.llm_cache_max_mb * 1024 * 1024 // 2, default_ttl=ttl
+        )
+        self.embedding_cache = DiskCache(
+            f"{settings.llm_cache_dir}/embeddings", settings.llm_cache_max_mb * 1024 * 1024 // 2, default_ttl=ttl
+        )
+        self._lock = threading.Lock()
+        self.tokens_saved = {"chat": 0, "embeddings": 0}
+        self.seconds_saved = {"chat": 0.0, "embeddings": 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.llm_cache_enabled
+
+    def chat_key(self, model: str, messages: list[dict], params: dict) -> str:
+        return _digest({"version": settings.llm_cache_version, "model": model, "messages": messages, "params": params})
+
+    def embedding_key(self, model: str, text: str) -> str:
+        return _digest({"version": settings.llm_cache_version, "model": model, "text": text})
+
+    def get_chat(self, key: str) -> Optional[dict]:
+        """Cached response as a dict (ChatCompletion.model_dump()), or None."""
+        entry = self._get(self.chat_cache, key, "chat")
+        return entry["response"] if entry else None
+
+    def put_chat(self, key: str, response: dict, seconds: float):
+        usage = response.get("usage") or {}
+        self._put(self.chat_cache, key, {
+            "response": response,
+            "tokens": (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0),
+            "seconds": round(seconds, 4),
+        })
+
+    def get_embeddings(self, keys: list[str]) -> list[Optional[list[float]]]:
+        """Cached vectors in key order, None for misses."""
+        vectors = []
+        for key in keys:
+            entry = self._get(self.embedding_cache, key, "embeddings")
+            vectors.append(entry["embedding"] if entry else None)
+        return vectors
+
+    def put_embeddings(self, keys: list[str], vectors: list[list[float]], tokens: int, seconds: float):
+        # Usage is reported per request, so each text is credited an even share
+        share = len(keys) or 1
+        for key, vector in zip(keys, vectors):
+            self._put(self.embedding_cache, key, {
+                "embedding": vector,
+                "tokens": tokens // share,
+                "seconds": round(seconds / share, 4),
+            })
+
+    def _get(self, cache: DiskCache, key: str, kind: str) -> Optional[dict]:
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            entry = None
+        LLM_CACHE_LOOKUPS.inc(kind=kind, result="hit" if entry else "miss")
+        if entry:
+            LLM_CACHE_TOKENS_SAVED.inc(entry.get("tokens", 0), kind=kind)
+            LLM_CACHE_SECONDS_SAVED.inc(entry.get("seconds", 0.0), kind=kind)
+            with self._lock:
+                self.tokens_saved[kind] += entry.get("tokens", 0)
+                self.seconds_saved[kind] += entry.get("seconds", 0.0)
+        return entry
+
+    def _put(self, cache: DiskCache, key: str, value: dict):
+        try:
+            cache.set(key, value)
+        except Exception as e:
+            # A cache write failure must never fail the LLM call
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def clear(self) -> int:
+        removed = self.chat_cache.clear() + self.embedding_cache.clear()
+        logger.info(f"Cleared {removed} LLM cache entries")
+        return removed
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            tokens_saved, seconds_saved = dict(self.tokens_saved), dict(self.seconds_saved)
+        stats = {"enabled": self.enabled, "ttl_hours": settings.llm_cache_ttl_hours}
+        for kind, cache in (("chat", self.chat_cache), ("embeddings", self.embedding_cache)):
+            stats[kind] = {
+                **cache.get_stats(),
+                "tokens_saved": tokens_saved[kind],
+                "seconds_saved": round(seconds_saved[kind], 2),
+            }
+        return stats
+
+
+# Global instance
+llm_cache = LLMCache()
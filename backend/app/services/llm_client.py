@@ -0,0 +1,241 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Optional
+import logging
+
+from app.config import settings
+from app.services.metrics import track_openai
+from app.services.llm_cache import llm_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+    from openai import OpenAI, AsyncOpenAI
+    from openai.types.chat import ChatCompletion
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+    logger.warning("openai/httpx not installed - LLM features disabled")
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    Embeddings = object
+
+DEFAULT_CHAT_MODEL = "gpt-4o-mini"
+
+# The embeddings endpoint accepts up to 2048 inputs; keep requests well below that
+MAX_TEXTS_PER_EMBEDDING_REQUEST = 512
+
+
+class LLMClient:
+    """
+    Process-wide OpenAI access for every service (summaries, extraction,
+    embeddings, chat).
+
+    Services used to build their own OpenAI/LangChain clients - and with them
+    a fresh HTTP connection pool - for every DocumentProcessor, i.e. every
+    document. Here one sync client and one async client per event loop are
+    created lazily and reused, so TLS handshakes and pool warm-up happen once
+    per process. Connections are kept alive and multiplexed over HTTP/2 when
+    the h2 package is installed (HTTP/1.1 keep-alive otherwise).
+
+    Every call is timed and its token usage counted (see track_openai), and
+    responses are cached persistently (see llm_cache).
+
+    Sync requests from all threads share settings.llm_max_connections slots.
+    Per-document fan-out (section summaries, extraction windows) times
+    concurrent documents can exceed the pool; excess calls wait here instead
+    of timing out on the HTTP pool or piling into rate limits.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, settings.llm_max_connections))
+        self._client = None
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+
+    @property
+    def available(self) -> bool:
+        return OPENAI_AVAILABLE and bool(settings.openai_api_key) \
+            and settings.openai_api_key != "your_openai_api_key_here"
+
+    def _http_options(self) -> dict:
+        return {
+            "http2": settings.llm_http2 and HTTP2_AVAILABLE,
+            "timeout": httpx.Timeout(settings.openai_timeout_seconds, connect=10.0),
+            "limits": httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry_seconds,
+            ),
+        }
+
+    @property
+    def client(self) -> "OpenAI":
+        """Shared sync client (thread-safe; used from pipeline worker threads)."""
+        if not self.available:
+            raise RuntimeError("OpenAI API key not configured")
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = OpenAI(
+                        api_key=settings.openai_api_key,
+                        max_retries=settings.openai_max_retries,
+                        http_client=httpx.Client(**self._http_options()),
+                    )
+                    logger.info(f"OpenAI client created (HTTP/2: {settings.llm_http2 and HTTP2_AVAILABLE})")
+        return self._client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """
+        Shared async client for the running event loop. httpx async pools
+        belong to the loop that opened their connections, so each loop gets
+        its own client (in practice: one, the API server's).
+        """
+        if not self.available:
+            raise RuntimeError("OpenAI API key not configured")
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                max_retries=settings.openai_max_retries,
+                http_client=httpx.AsyncClient(**self._http_options()),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def chat(self, operation: str, messages: list[dict], model: str = DEFAULT_CHAT_MODEL,
+             cache: bool = True, **kwargs):
+        """
+        Chat completion; operation labels the call in metrics and traces.
+        Identical requests are answered from the LLM cache unless cache=False.
+        Returns the API response (a ChatCompletion, also on cache hits).
+        """
+        key = llm_cache.chat_key(model, messages, kwargs) if cache and llm_cache.enabled else None
+        if key and (cached := llm_cache.get_chat(key)):
+            return ChatCompletion.model_validate(cached)
+        start = time.perf_counter()
+        with self._slots, track_openai(operation) as call:
+            call["response"] = self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        self._cache_chat(key, call["response"], time.perf_counter() - start)
+        return call["response"]
+
+    async def achat(self, operation: str, messages: list[dict], model: str = DEFAULT_CHAT_MODEL,
+                    cache: bool = True, **kwargs):
+        key = llm_cache.chat_key(model, messages, kwargs) if cache and llm_cache.enabled else None
+        if key and (cached := llm_cache.get_chat(key)):
+            return ChatCompletion.model_validate(cached)
+        start = time.perf_counter()
+        with track_openai(operation) as call:
+            call["response"] = await self.async_client.chat.completions.create(model=model, messages=messages, **kwargs)
+        self._cache_chat(key, call["response"], time.perf_counter() - start)
+        return call["response"]
+
+    @staticmethod
+    def _cache_chat(key: Optional[str], response, seconds: float):
+        # Truncated or filtered answers are not worth replaying
+        if key and response.choices and all(choice.finish_reason == "stop" for choice in response.choices):
+            llm_cache.put_chat(key, response.model_dump(), seconds)
+
+    def embed(self, texts: list[str], model: str, operation: str = "embeddings") -> list[list[float]]:
+        """Embed texts; cached texts are served from the LLM cache and only the rest are sent."""
+        keys, vectors, missing = self._cached_embeddings(texts, model)
+        for start in range(0, len(missing), MAX_TEXTS_PER_EMBEDDING_REQUEST):
+            batch = missing[start:start + MAX_TEXTS_PER_EMBEDDING_REQUEST]
+            began = time.perf_counter()
+            with self._slots, track_openai(operation) as call:
+                call["response"] = self.client.embeddings.create(model=model, input=[texts[i] for i in batch])
+            self._store_embeddings(call["response"], batch, keys, vectors, time.perf_counter() - began)
+        return vectors
+
+    async def aembed(self, texts: list[str], model: str, operation: str = "embeddings") -> list[list[float]]:
+        keys, vectors, missing = self._cached_embeddings(texts, model)
+        for start in range(0, len(missing), MAX_TEXTS_PER_EMBEDDING_REQUEST):
+            batch = missing[start:start + MAX_TEXTS_PER_EMBEDDING_REQUEST]
+            began = time.perf_counter()
+            with track_openai(operation) as call:
+                call["response"] = await self.async_client.embeddings.create(model=model, input=[texts[i] for i in batch])
+            self._store_embeddings(call["response"], batch, keys, vectors, time.perf_counter() - began)
+        return vectors
+
+    @staticmethod
+    def _cached_embeddings(texts: list[str], model: str) -> tuple[Optional[list[str]], list, list[int]]:
+        """Returns (cache keys or None, vectors with None for misses, indexes of the misses)."""
+        if not llm_cache.enabled:
+            return None, [None] * len(texts), list(range(len(texts)))
+        keys = [llm_cache.embedding_key(model, text) for text in texts]
+        vectors = llm_cache.get_embeddings(keys)
+        return keys, vectors, [i for i, vector in enumerate(vectors) if vector is None]
+
+    @staticmethod
+    def _store_embeddings(response, batch: list[int], keys: Optional[list[str]], vectors: list, seconds: float):
+        batch_vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        for i, vector in zip(batch, batch_vectors):
+            vectors[i] = vector
+        if keys:
+            tokens = getattr(response.usage, "prompt_tokens", 0) if response.usage else 0
+            llm_cache.put_embeddings([keys[i] for i in batch], batch_vectors, tokens, seconds)
+
+    def close(self):
+        """Close the sync pool (async pools are closed by aclose() on their loop)."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.pop(loop, None)
+        if client is not None:
+            await client.close()
+        self.close()
+
+    def get_stats(self) -> dict:
+        return {
+            "available": self.available,
+            "http2": settings.llm_http2 and HTTP2_AVAILABLE,
+            "sync_client": self._client is not None,
+            "async_clients": len(self._async_clients),
+            "max_connections": settings.llm_max_connections,
+            "cache": llm_cache.get_stats(),
+        }
+
+
+class PooledOpenAIEmbeddings(Embeddings):
+    """
+    LangChain Embeddings backed by the shared client, for PGVector - so
+    vector store writes and query embedding reuse the pooled connections
+    instead of a per-service OpenAIEmbeddings client.
+    """
+
+    def __init__(self, model: str, client: Optional[LLMClient] = None):
+        self.model = model
+        self.client = client or llm_client
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.client.embed(list(texts), self.model)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.client.embed([text], self.model, operation="embed_query")[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self.client.aembed(list(texts), self.model)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.client.aembed([text], self.model, operation="embed_query"))[0]
+
+
+# Global instance
+llm_client = LLMClient()
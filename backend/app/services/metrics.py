@@ -0,0 +1,354 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+import logging
+
+from app.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a fast classification call up to a multi-minute OCR/LLM stage
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: tuple, values: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        """Current values by label tuple (histograms: {"counts", "sum", "count"}), for in-process reports."""
+        with self._lock:
+            return {key: dict(value) if isinstance(value, dict) else value for key, value in self._values.items()}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key: tuple, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block, including when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key: tuple, state) -> list[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process Prometheus registry rendering the text exposition
+    format, so /metrics needs no client library.
+
+    Metrics are per process: the API and each standalone worker expose their
+    own (workers on settings.worker_metrics_port) and Prometheus sums them.
+    Collectors are callbacks run at scrape time to refresh gauges that are
+    cheaper to read on demand than to track, such as queue depth.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+            metrics = list(self._metrics)
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                # A failing collector (e.g. database down) must not break the scrape
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry
+metrics = MetricsRegistry()
+
+# Pipeline
+STAGE_SECONDS = metrics.histogram(
+    "docparser_stage_duration_seconds",
+    "Duration of a document processing stage",
+    ("stage",)
+)
+PAGE_SECONDS = metrics.histogram(
+    "docparser_page_extraction_seconds",
+    "Per-page text extraction time, by how the page was read",
+    ("source",)
+)
+DOCUMENT_SECONDS = metrics.histogram(
+    "docparser_document_duration_seconds",
+    "End-to-end processing time per document",
+    ("pipeline", "status")
+)
+PAGES_TOTAL = metrics.counter(
+    "docparser_pages_total",
+    "Pages extracted, by source (text_layer, ocr, ocr_failed, blank, none, cache)",
+    ("source",)
+)
+CHUNKS_TOTAL = metrics.counter(
+    "docparser_chunks_total",
+    "Text chunks stored for retrieval",
+    ("embedded",)
+)
+STAGE_FAILURES_TOTAL = metrics.counter(
+    "docparser_stage_failures_total",
+    "Stage failures (documents still complete when an AI stage fails)",
+    ("stage",)
+)
+DOCUMENTS_TOTAL = metrics.counter(
+    "docparser_documents_total",
+    "Documents finished, by final status",
+    ("status",)
+)
+SUMMARY_SECTIONS = metrics.histogram(
+    "docparser_summary_sections",
+    "Sections per document summary (1 = single call, more = map-reduce)",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+# OpenAI
+OPENAI_SECONDS = metrics.histogram(
+    "docparser_openai_request_seconds",
+    "OpenAI API call latency by operation",
+    ("operation", "status")
+)
+OPENAI_TOKENS_TOTAL = metrics.counter(
+    "docparser_openai_tokens_total",
+    "OpenAI tokens reported by the API",
+    ("operation", "kind")
+)
+
+LLM_CACHE_LOOKUPS = metrics.counter(
+    "docparser_llm_cache_lookups_total",
+    "LLM response cache lookups",
+    ("kind", "result")
+)
+LLM_CACHE_TOKENS_SAVED = metrics.counter(
+    "docparser_llm_cache_tokens_saved_total",
+    "OpenAI tokens not spent thanks to cache hits",
+    ("kind",)
+)
+LLM_CACHE_SECONDS_SAVED = metrics.counter(
+    "docparser_llm_cache_seconds_saved_total",
+    "OpenAI latency avoided thanks to cache hits",
+    ("kind",)
+)
+
+# HTTP
+HTTP_SECONDS = metrics.histogram(
+    "docparser_http_request_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+# Queues (refreshed by collectors at scrape time)
+QUEUE_DEPTH = metrics.gauge(
+    "docparser_job_queue_jobs",
+    "Processing jobs by status",
+    ("status",)
+)
+QUEUE_OLDEST_READY_SECONDS = metrics.gauge(
+    "docparser_job_queue_oldest_ready_seconds",
+    "Age of the oldest job waiting for a worker"
+)
+OCR_BATCHER_QUEUED = metrics.gauge(
+    "docparser_ocr_batcher_queued_images",
+    "Page images waiting in the OCR batcher"
+)
+
+
+@contextmanager
+def track_openai(operation: str):
+    """
+    Time an OpenAI call, also as an openai.<operation> trace span. Assign the
+    API response to the yielded dict's "response" key to also count the
+    tokens it reports.
+    """
+    call = {"response": None}
+    start = time.perf_counter()
+    status = "error"
+    with tracer.span(f"openai.{operation}") as span:
+        try:
+            yield call
+            status = "ok"
+        finally:
+            OPENAI_SECONDS.observe(time.perf_counter() - start, operation=operation, status=status)
+            tokens = record_token_usage(operation, call["response"])
+            if span is not None and tokens:
+                span.set_attribute("openai.prompt_tokens", tokens[0])
+                span.set_attribute("openai.completion_tokens", tokens[1])
+
+
+def record_token_usage(operation: str, response) -> Optional[tuple[int, int]]:
+    """Count tokens from an OpenAI SDK response or a LangChain message. Returns (prompt, completion)."""
+    if response is None:
+        return None
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        prompt, completion = getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0)
+    else:
+        usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    if prompt:
+        OPENAI_TOKENS_TOTAL.inc(prompt, operation=operation, kind="prompt")
+    if completion:
+        OPENAI_TOKENS_TOTAL.inc(completion, operation=operation, kind="completion")
+    return prompt, completion
+
+
+def collect_queue_metrics():
+    """Scrape-time collector for job queue depth and OCR batcher backlog."""
+    from app.database import SessionLocal
+    from app.services.job_queue import job_queue
+    from app.services.ocr_batcher import ocr_batcher
+
+    OCR_BATCHER_QUEUED.set(ocr_batcher.get_stats()["queued"])
+    db = SessionLocal()
+    try:
+        stats = job_queue.get_stats(db)
+    finally:
+        db.close()
+    for status, count in stats["counts"].items():
+        QUEUE_DEPTH.set(count, status=status)
+    QUEUE_OLDEST_READY_SECONDS.set(round(stats["oldest_ready_seconds"], 3))
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve /metrics on its own port - for worker processes, which have no HTTP API."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would flood the log
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving metrics on :{port}/metrics")
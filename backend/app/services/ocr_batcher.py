@@ -0,0 +1,149 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Optional
+import logging
+
+import numpy as np
+
+from app.config import settings
+from app.services.ocr_registry import ocr_registry
+
+logger = logging.getLogger(__name__)
+
+
+def pad_to_common_shape(images: list[np.ndarray]) -> list[np.ndarray]:
+    """
+    Pad images with white to the largest height/width in the batch.
+    EasyOCR's batched detector stacks images into one array, so they must match;
+    padding (rather than resizing) keeps text at its original scale.
+    """
+    max_height = max(image.shape[0] for image in images)
+    max_width = max(image.shape[1] for image in images)
+    padded = []
+    for image in images:
+        if image.shape[0] == max_height and image.shape[1] == max_width:
+            padded.append(image)
+            continue
+        canvas_shape = (max_height, max_width) + image.shape[2:]
+        canvas = np.full(canvas_shape, 255, dtype=image.dtype)
+        canvas[:image.shape[0], :image.shape[1]] = image
+        padded.append(canvas)
+    return padded
+
+
+class _BatchItem:
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self.future: Future = Future()
+        self.submitted_at = time.monotonic()
+
+
+class OCRBatcher:
+    """
+    Collects page images from any thread (and any document) and runs them
+    through EasyOCR's batched detector in groups of up to `batch_size`.
+    A batch is dispatched when it is full or when the oldest image has waited
+    `max_wait_ms`, trading a little latency for throughput under load.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, max_wait_ms: Optional[int] = None):
+        self.batch_size = max(1, batch_size or settings.ocr_batch_size)
+        self.max_wait = (settings.ocr_batch_max_wait_ms if max_wait_ms is None else max_wait_ms) / 1000
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Stats
+        self.batches = 0
+        self.images = 0
+        self.fallbacks = 0
+        self.total_batch_seconds = 0.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ocr-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, image: np.ndarray) -> Future:
+        """Queue an image; the returned future resolves to EasyOCR readtext results."""
+        self._ensure_started()
+        item = _BatchItem(image)
+        self._queue.put(item)
+        return item.future
+
+    def readtext(self, image: np.ndarray) -> list:
+        return self.submit(image).result()
+
+    def _collect_batch(self) -> list[_BatchItem]:
+        batch = [self._queue.get()]
+        deadline = batch[0].submitted_at + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, remaining)) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._process_batch(batch)
+            except Exception as e:
+                logger.error(f"OCR batch failed: {e}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    def _process_batch(self, batch: list[_BatchItem]):
+        start = time.perf_counter()
+        if len(batch) == 1:
+            results = [ocr_registry.readtext(batch[0].image, batch_size=settings.ocr_recognizer_batch_size)]
+        else:
+            try:
+                images = pad_to_common_shape([item.image for item in batch])
+                results = ocr_registry.readtext_batched(images, batch_size=settings.ocr_recognizer_batch_size)
+            except Exception as e:
+                # Fall back to one image at a time so one bad page can't fail the batch
+                logger.warning(f"Batched OCR failed for {len(batch)} images, retrying individually: {e}")
+                self.fallbacks += 1
+                results = []
+                for item in batch:
+                    try:
+                        results.append(ocr_registry.readtext(item.image, batch_size=settings.ocr_recognizer_batch_size))
+                    except Exception as item_error:
+                        results.append(item_error)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.batches += 1
+            self.images += len(batch)
+            self.total_batch_seconds += elapsed
+
+        for item, result in zip(batch, results):
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "batch_size": self.batch_size,
+                "max_wait_ms": int(self.max_wait * 1000),
+                "batches": self.batches,
+                "images": self.images,
+                "avg_batch_size": round(self.images / self.batches, 2) if self.batches else 0.0,
+                "avg_batch_seconds": round(self.total_batch_seconds / self.batches, 4) if self.batches else 0.0,
+                "fallbacks": self.fallbacks,
+                "queued": self._queue.qsize(),
+            }
+
+
+# Global instance
+ocr_batcher = OCRBatcher()
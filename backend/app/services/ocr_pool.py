@@ -0,0 +1,198 @@
+import os
+import signal
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional
+import logging
+
+from app.config import settings
+from app.services.ocr_registry import ocr_registry
+from app.utils.image_preprocessing import normalize_for_ocr
+
+logger = logging.getLogger(__name__)
+
+MIN_OCR_CONFIDENCE = 0.3  # Filter low-confidence results
+
+
+def ocr_text_segments(results: list) -> list[str]:
+    """Keep the text of EasyOCR results above the confidence threshold."""
+    return [text for (bbox, text, confidence) in results if confidence > MIN_OCR_CONFIDENCE]
+
+
+def prepare_page_image(image) -> tuple[Optional[object], dict]:
+    """
+    Normalize a page image for OCR if preprocessing is enabled.
+    Returns (image to OCR, or None for a blank page, partial page result).
+    """
+    page = {"blank": False}
+    if settings.ocr_preprocessing_enabled:
+        image, info = normalize_for_ocr(image)
+        page.update(blank=info["blank"], pixels_original=info["pixels_original"],
+                    pixels_processed=info["pixels_processed"])
+    else:
+        pixels = int(image.shape[0] * image.shape[1])
+        page.update(pixels_original=pixels, pixels_processed=pixels)
+    return image, page
+
+
+def ocr_page_image(image) -> dict:
+    """
+    Normalize (if enabled) and OCR one page image.
+    Returns {"text", "seconds", "blank", "pixels_original", "pixels_processed"}.
+    """
+    start = time.perf_counter()
+    image, page = prepare_page_image(image)
+    if image is None:
+        page["text"] = ""
+    else:
+        results = ocr_registry.readtext(image, batch_size=settings.ocr_recognizer_batch_size)
+        page["text"] = " ".join(ocr_text_segments(results))
+    page["seconds"] = time.perf_counter() - start
+    return page
+
+
+def _init_worker(worker_pids=None):
+    """Process pool initializer: report this worker's pid, then load a warm reader once per worker process."""
+    if worker_pids is not None:
+        worker_pids.put(os.getpid())
+    ocr_registry.preload()
+
+
+def _ocr_pdf_page(file_path: str, page_num: int, dpi: int) -> tuple[int, dict]:
+    """
+    Rasterize and OCR a single PDF page inside a worker process.
+    Pages are rasterized in the worker so only text crosses the process boundary.
+    """
+    from app.utils.pdf_rasterizer import rasterize_pdf_page
+
+    start = time.perf_counter()
+    image = rasterize_pdf_page(file_path, page_num, dpi)
+    page = ocr_page_image(image)
+    page["seconds"] = time.perf_counter() - start
+    return page_num, page
+
+
+class OCRProcessPool:
+    """
+    Spreads the pages of a scanned PDF across worker processes, each holding
+    its own warm EasyOCR reader. At most one page per worker is in flight, so
+    a per-page timeout can be measured from submission.
+    """
+
+    def __init__(self, workers: Optional[int] = None, page_timeout: Optional[float] = None):
+        self.workers = workers or settings.ocr_process_workers or os.cpu_count() or 1
+        self.page_timeout = page_timeout or settings.ocr_page_timeout_seconds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._worker_pids = None  # queue the current pool's workers report their pids on
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking a process that already holds torch threads can deadlock
+                context = multiprocessing.get_context("spawn")
+                self._worker_pids = context.SimpleQueue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._worker_pids,),
+                )
+                logger.info(f"Started OCR process pool with {self.workers} workers")
+            return self._executor
+
+    def _recycle(self):
+        """Tear down the pool, killing workers stuck on a timed-out page."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            worker_pids, self._worker_pids = self._worker_pids, None
+        if executor is None:
+            return
+        pids = []
+        while worker_pids is not None and not worker_pids.empty():
+            pids.append(worker_pids.get())
+        executor.shutdown(wait=False, cancel_futures=True)
+        # shutdown() lets busy workers finish their page; a stuck page never does
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass  # already exited
+        logger.warning(f"OCR process pool recycled after a page timeout ({len(pids)} workers terminated)")
+
+    def ocr_pdf_pages(self, file_path: str, page_numbers: list[int], dpi: int) -> dict[int, dict]:
+        """
+        OCR the given 1-based page numbers in parallel.
+        Returns {page_num: page result} (see ocr_page_image); pages that time out
+        or fail get a bracketed note as their text, "failed": True and the "error"
+        (plus "timed_out": True), so callers don't cache or checkpoint them.
+        """
+        executor = self._get_executor()
+        pending_pages = list(page_numbers)
+        in_flight = {}  # future -> (page_num, deadline)
+        results: dict[int, dict] = {}
+        stuck_workers = 0  # workers still busy with a page we gave up on
+
+        while pending_pages or in_flight:
+            if pending_pages and not in_flight and stuck_workers >= self.workers:
+                self._recycle()
+                executor = self._get_executor()
+                stuck_workers = 0
+
+            while pending_pages and len(in_flight) < self.workers - stuck_workers:
+                page_num = pending_pages.pop(0)
+                future = executor.submit(_ocr_pdf_page, file_path, page_num, dpi)
+                in_flight[future] = (page_num, time.monotonic() + self.page_timeout)
+
+            if not in_flight:
+                continue
+
+            next_deadline = min(deadline for _, deadline in in_flight.values())
+            done, _ = wait(list(in_flight), timeout=max(0.0, next_deadline - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                page_num, deadline = in_flight.pop(future)
+                try:
+                    _, results[page_num] = future.result()
+                except Exception as e:
+                    logger.error(f"OCR failed for page {page_num}: {e}")
+                    elapsed = time.monotonic() - (deadline - self.page_timeout)
+                    results[page_num] = {"text": f"[OCR failed for page {page_num}: {e}]", "seconds": elapsed,
+                                         "failed": True, "error": str(e)}
+
+            now = time.monotonic()
+            for future, (page_num, deadline) in list(in_flight.items()):
+                if now >= deadline:
+                    logger.error(f"OCR timed out for page {page_num} after {self.page_timeout}s")
+                    results[page_num] = {"text": f"[OCR timed out for page {page_num}]",
+                                         "seconds": float(self.page_timeout), "failed": True, "timed_out": True,
+                                         "error": f"timed out after {self.page_timeout}s"}
+                    del in_flight[future]
+                    stuck_workers += 1
+
+        if stuck_workers:
+            self._recycle()
+
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_ocr_process_pool: Optional[OCRProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_process_pool() -> OCRProcessPool:
+    """Process-wide OCR process pool, created on first use."""
+    global _ocr_process_pool
+    with _pool_lock:
+        if _ocr_process_pool is None:
+            _ocr_process_pool = OCRProcessPool()
+        return _ocr_process_pool
@@ -0,0 +1,249 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Import EasyOCR with fallback
+try:
+    import easyocr
+    EASYOCR_AVAILABLE = True
+except ImportError:
+    EASYOCR_AVAILABLE = False
+    logger.warning("EasyOCR not available. Install with: pip install easyocr")
+
+
+def _current_rss_mb() -> float:
+    """Resident set size of the current process in MB (0.0 if unknown)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak, in KB on Linux - close enough as a fallback
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return 0.0
+
+
+class OCREnginePool:
+    """
+    A small pool of warm EasyOCR readers sharing one language/device configuration.
+    Readers are created lazily, up to `max_size`, and borrowed exclusively so a
+    reader is never used by two threads at once.
+    """
+
+    def __init__(self, languages: tuple[str, ...], gpu: bool, max_size: int):
+        self.languages = languages
+        self.gpu = gpu
+        self.max_size = max(1, max_size)
+        self._idle: queue.Queue = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        # Stats
+        self.load_seconds: list[float] = []
+        self.rss_delta_mb: list[float] = []
+        self.calls = 0
+        self.errors = 0
+        self.total_call_seconds = 0.0
+        self.max_call_seconds = 0.0
+        self.last_call_seconds = 0.0
+
+    def _load_reader(self):
+        rss_before = _current_rss_mb()
+        start = time.perf_counter()
+        reader = easyocr.Reader(list(self.languages), gpu=self.gpu)
+        elapsed = time.perf_counter() - start
+        rss_delta = max(0.0, _current_rss_mb() - rss_before)
+
+        self.load_seconds.append(elapsed)
+        self.rss_delta_mb.append(rss_delta)
+        logger.info(
+            f"EasyOCR reader loaded for {','.join(self.languages)} "
+            f"(gpu={self.gpu}) in {elapsed:.2f}s, +{rss_delta:.0f}MB RSS"
+        )
+        return reader
+
+    def warm_up(self):
+        """Ensure at least one reader is loaded."""
+        with self._lock:
+            if self._created > 0:
+                return
+            self._created += 1
+        try:
+            self._idle.put(self._load_reader())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def acquire(self, timeout: Optional[float] = None):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Grow the pool if we are below capacity, otherwise wait for a reader
+        with self._lock:
+            can_grow = self._created < self.max_size
+            if can_grow:
+                self._created += 1
+        if can_grow:
+            try:
+                return self._load_reader()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Timed out waiting for an idle OCR engine")
+
+    def release(self, reader):
+        self._idle.put(reader)
+
+    def record_call(self, seconds: float, failed: bool = False):
+        with self._lock:
+            self.calls += 1
+            if failed:
+                self.errors += 1
+            self.total_call_seconds += seconds
+            self.last_call_seconds = seconds
+            self.max_call_seconds = max(self.max_call_seconds, seconds)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            avg = self.total_call_seconds / self.calls if self.calls else 0.0
+            return {
+                "languages": list(self.languages),
+                "gpu": self.gpu,
+                "engines_loaded": self._created,
+                "engines_idle": self._idle.qsize(),
+                "max_engines": self.max_size,
+                "load_seconds": [round(s, 3) for s in self.load_seconds],
+                "load_rss_delta_mb": [round(m, 1) for m in self.rss_delta_mb],
+                "calls": self.calls,
+                "errors": self.errors,
+                "avg_call_seconds": round(avg, 4),
+                "max_call_seconds": round(self.max_call_seconds, 4),
+                "last_call_seconds": round(self.last_call_seconds, 4),
+            }
+
+
+class OCREngineRegistry:
+    """
+    Process-wide registry of warm OCR engines.
+    EasyOCR weights are loaded once per process (at startup or on first use)
+    and shared by every OCRService instead of being reloaded per document.
+    """
+
+    def __init__(self):
+        self._pools: dict[tuple, OCREnginePool] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return EASYOCR_AVAILABLE
+
+    @property
+    def engine_version(self) -> Optional[str]:
+        return getattr(easyocr, "__version__", None) if EASYOCR_AVAILABLE else None
+
+    def _key(self, languages: Optional[list[str]], gpu: Optional[bool]) -> tuple:
+        langs = tuple(languages or settings.ocr_languages)
+        return (langs, settings.ocr_gpu if gpu is None else gpu)
+
+    def _get_pool(self, languages: Optional[list[str]] = None, gpu: Optional[bool] = None) -> OCREnginePool:
+        key = self._key(languages, gpu)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = OCREnginePool(key[0], key[1], settings.ocr_engine_pool_size)
+                    self._pools[key] = pool
+        return pool
+
+    def preload(self, languages: Optional[list[str]] = None, gpu: Optional[bool] = None) -> bool:
+        """Load the default engine now so the first document doesn't pay for it."""
+        if not EASYOCR_AVAILABLE:
+            return False
+        try:
+            self._get_pool(languages, gpu).warm_up()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to preload EasyOCR: {e}")
+            return False
+
+    @contextmanager
+    def borrow(self, languages: Optional[list[str]] = None, gpu: Optional[bool] = None,
+               timeout: Optional[float] = None):
+        """Borrow a warm reader for exclusive use. Yields None if EasyOCR is unavailable."""
+        if not EASYOCR_AVAILABLE:
+            yield None
+            return
+
+        pool = self._get_pool(languages, gpu)
+        reader = pool.acquire(timeout=timeout)
+        try:
+            yield reader
+        finally:
+            pool.release(reader)
+
+    def _call(self, method: str, image, languages: Optional[list[str]], gpu: Optional[bool], **kwargs):
+        """Run a reader method on a borrowed reader, recording per-call latency."""
+        pool = self._get_pool(languages, gpu)
+        with self.borrow(languages, gpu) as reader:
+            if reader is None:
+                raise RuntimeError("EasyOCR not available")
+            start = time.perf_counter()
+            failed = False
+            try:
+                return getattr(reader, method)(image, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                pool.record_call(time.perf_counter() - start, failed)
+
+    def readtext(self, image, languages: Optional[list[str]] = None, gpu: Optional[bool] = None, **kwargs) -> list:
+        """Run `readtext` on a single image (path or numpy array)."""
+        return self._call("readtext", image, languages, gpu, **kwargs)
+
+    def readtext_batched(self, images: list, languages: Optional[list[str]] = None,
+                         gpu: Optional[bool] = None, **kwargs) -> list[list]:
+        """Run `readtext_batched` on equally sized images; returns one result list per image."""
+        return self._call("readtext_batched", images, languages, gpu, **kwargs)
+
+    def average_call_seconds(self) -> float:
+        """Mean readtext latency across all engines so far (0.0 before any call)."""
+        pools = list(self._pools.values())
+        calls = sum(pool.calls for pool in pools)
+        if not calls:
+            return 0.0
+        return sum(pool.total_call_seconds for pool in pools) / calls
+
+    def get_stats(self) -> dict:
+        return {
+            "easyocr_available": EASYOCR_AVAILABLE,
+            "process_id": os.getpid(),
+            "rss_mb": round(_current_rss_mb(), 1),
+            "engines": [pool.get_stats() for pool in list(self._pools.values())],
+        }
+
+
+# Global instance
+ocr_registry = OCREngineRegistry()
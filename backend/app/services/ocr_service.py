@@ -1,181 +1,444 @@
 import os
-from typing import Optional
-from PIL import Image
-import PyPDF2
-from pdf2image import convert_from_path
+import re
+import time
+from typing import Iterator, Optional
+from PIL import Image, ImageOps
 import io
 import logging
+import numpy as np
+from app.config import settings
+from app.services.ocr_registry import ocr_registry
+from app.services.ocr_batcher import ocr_batcher
+from app.services.pdf_text_backends import get_text_backend
+from app.services.document_classifier import document_classifier
+from app.services.extraction_cache import extraction_cache, file_sha256
+from app.services.metrics import PAGE_SECONDS, PAGES_TOTAL
+from app.services.tracing import tracer
+from app.services.ocr_pool import get_ocr_process_pool, ocr_page_image, ocr_text_segments, prepare_page_image
+from app.utils.pdf_rasterizer import iter_pdf_page_images
 
 logger = logging.getLogger(__name__)
 
-# Import EasyOCR with fallback
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    EASYOCR_AVAILABLE = False
-    logger.warning("EasyOCR not available. Install with: pip install easyocr")
+# Words, acronyms and numbers/dates - what a real text layer is mostly made of
+_WORD_LIKE = re.compile(r"(?=[A-Za-z]*[AEIOUYaeiouy])[A-Za-z][a-z]+|[A-Z]{2,}|[A-Za-z]|\d[\d.,/:%-]*|[A-Za-z]+[\d.-]+[A-Za-z\d]*")
 
 class OCRService:
     """
     OCR service for extracting text from documents.
-    Uses PyPDF2 for digital PDFs and EasyOCR for images and scanned documents.
+    Uses a pluggable text-layer backend (PyPDF2, pypdfium2, pdfminer) for digital
+    PDFs and EasyOCR for images and scanned documents.
     Supports handwriting recognition through EasyOCR.
+    EasyOCR readers are borrowed from the process-wide ocr_registry,
+    so constructing an OCRService is cheap.
     """
     
     def __init__(self):
         self.supported_formats = ['.pdf', '.jpg', '.jpeg', '.png']
-        self.easyocr_reader = None
-        
-        # Initialize EasyOCR reader if available
-        if EASYOCR_AVAILABLE:
-            try:
-                self.easyocr_reader = easyocr.Reader(['en'], gpu=False)
-                logger.info("EasyOCR initialized successfully")
-            except Exception as e:
-                logger.error(f"Failed to initialize EasyOCR: {e}")
-                self.easyocr_reader = None
+        self.ocr_available = ocr_registry.available
     
     def extract_text(self, file_path: str) -> tuple[str, int]:
         """
         Extract text from a document.
         Returns: (extracted_text, page_count)
         """
+        extracted_text, page_count, _ = self.extract_text_with_report(file_path)
+        return extracted_text, page_count
+    
+    def extract_text_with_report(self, file_path: str, file_hash: Optional[str] = None) -> tuple[str, int, dict]:
+        """
+        Extract text from a document, recording how each page was handled.
+        Results are served from the extraction cache when the same file bytes
+        were already extracted under the current OCR configuration.
+        Returns: (extracted_text, page_count, extraction_report)
+        """
         file_ext = os.path.splitext(file_path)[1].lower()
+        if file_ext not in self.supported_formats:
+            raise ValueError(f"Unsupported file format: {file_ext}")
+        
+        if settings.extraction_cache_enabled:
+            file_hash = file_hash or file_sha256(file_path)
+            cached = extraction_cache.get(file_hash)
+            if cached:
+                logger.info(f"Extraction cache hit for {file_path} ({file_hash[:12]})")
+                report = dict(cached["report"], cache="hit")
+                PAGES_TOTAL.inc(cached["page_count"], source="cache")
+                extracted_text = self._join_pages(cached["pages"], cached["empty_text"], file_ext == '.pdf')
+                return extracted_text, cached["page_count"], report
         
         if file_ext == '.pdf':
-            return self._extract_from_pdf(file_path)
-        elif file_ext in ['.jpg', '.jpeg', '.png']:
-            return self._extract_from_image(file_path)
+            pages, page_count, report, empty_text = self._extract_from_pdf(file_path)
+            cacheable = not report.get("ocr_error") and not (report["ocr_needed_pages"] and not self.ocr_available)
+        else:
+            extracted_text, page_count, page = self._extract_from_image(file_path)
+            page_report = {
+                "page": 1,
+                "layer": "image_only",
+                "source": "blank" if page.get("blank") else ("ocr" if self.ocr_available else "none"),
+                "chars": len(extracted_text),
+                "seconds": page["seconds"],
+            }
+            for key in ("pixels_original", "pixels_processed"):
+                if key in page:
+                    page_report[key] = page[key]
+            PAGE_SECONDS.observe(page["seconds"], source=page_report["source"])
+            PAGES_TOTAL.inc(source=page_report["source"])
+            report = self._build_report([page_report])
+            pages, empty_text = [(1, extracted_text)], ""
+            cacheable = self.ocr_available
+        
+        if settings.extraction_cache_enabled:
+            report["cache"] = "miss"
+            if cacheable:
+                extraction_cache.put(file_hash, pages, page_count, report, empty_text)
         else:
+            report["cache"] = "disabled"
+        
+        return self._join_pages(pages, empty_text, file_ext == '.pdf'), page_count, report
+    
+    def _join_pages(self, pages: list, empty_text: str, page_markers: bool) -> str:
+        """Join (page_num, text) pairs into the stored document text."""
+        if not pages:
+            return empty_text
+        if not page_markers:
+            return "\n\n".join(text for _, text in pages)
+        return "\n\n".join(f"--- Page {page_num} ---\n{text}" for page_num, text in pages)
+    
+    def iter_pages(self, file_path: str, report: Optional[dict] = None,
+                   file_hash: Optional[str] = None) -> Iterator[tuple[int, str]]:
+        """
+        Yield (page_num, text) for each non-empty page, in order, as soon as its
+        window of pages has been extracted. At most one OCR window of pages is
+        held at a time, so memory doesn't grow with document length.
+        If given, `report` is filled with the extraction report once the
+        generator is exhausted. Streamed results are not written to the
+        extraction cache, but cache hits are served.
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        if file_ext not in self.supported_formats:
             raise ValueError(f"Unsupported file format: {file_ext}")
+        report = report if report is not None else {}
+        
+        if settings.extraction_cache_enabled:
+            cached = extraction_cache.get(file_hash or file_sha256(file_path))
+            if cached:
+                report.update(cached["report"], cache="hit")
+                for page_num, text in cached["pages"]:
+                    yield page_num, text
+                return
+        
+        if file_ext != '.pdf':
+            extracted_text, _, report_for_image = self.extract_text_with_report(file_path, file_hash)
+            report.update(report_for_image)
+            yield 1, extracted_text
+            return
+        
+        page_reports = []
+        state = {}
+        yield from self._iter_pdf_pages(file_path, page_reports, state)
+        report.update(self._build_report(page_reports), cache="streamed",
+                      ocr_needed_pages=state["ocr_needed_pages"], text_backend=state["text_backend"])
+        self._report_ocr_errors(report, state)
+    
+    @staticmethod
+    def _report_ocr_errors(report: dict, state: dict):
+        """Copy OCR failures into the report; a report with ocr_error is never cached or checkpointed."""
+        if state.get("ocr_error"):
+            report["ocr_error"] = state["ocr_error"]
+        if state.get("ocr_failed_pages"):
+            report["ocr_failed_pages"] = state["ocr_failed_pages"]
+    
+    def page_count(self, file_path: str) -> int:
+        """Number of pages in a document without extracting it."""
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            return get_text_backend().page_count(file_path)
+        return 1
     
-    def _extract_from_pdf(self, file_path: str) -> tuple[str, int]:
-        """Extract text from PDF using PyPDF2"""
+    def _extract_from_pdf(self, file_path: str) -> tuple[list[tuple[int, str]], int, dict, str]:
+        """
+        Extract text from PDF page by page (see _iter_pdf_pages).
+        Returns: (non-empty (page_num, text) pairs, page_count, report, text to use if empty)
+        """
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                page_count = len(pdf_reader.pages)
-                
-                text_parts = []
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        text_parts.append(f"--- Page {page_num + 1} ---\n{text}")
-                
-                extracted_text = "\n\n".join(text_parts)
-                
-                # If no text extracted, it might be a scanned PDF - try OCR
-                if not extracted_text.strip():
-                    logger.info("No text found in PDF, attempting OCR on scanned pages")
-                    extracted_text = self._ocr_scanned_pdf(file_path, page_count)
-                
-                return extracted_text, page_count
+            page_reports = []
+            state = {}
+            page_texts = list(self._iter_pdf_pages(file_path, page_reports, state))
+            page_count = len(page_reports)
+            
+            if state.get("ocr_error"):
+                empty_text = f"[Error processing scanned PDF: {state['ocr_error']}]"
+            elif state["ocr_needed_pages"] and not self.ocr_available:
+                empty_text = "[Scanned PDF - EasyOCR not available for text extraction]"
+            else:
+                empty_text = "[No readable text found in scanned PDF]"
+            
+            report = self._build_report(page_reports)
+            report["ocr_needed_pages"] = state["ocr_needed_pages"]
+            report["text_backend"] = state["text_backend"]
+            self._report_ocr_errors(report, state)
+            logger.info(
+                f"Extracted {page_count} pages: {report['text_layer_pages']} from text layer, "
+                f"{report['ocr_pages']} via OCR ({report['ocr_seconds']:.2f}s), "
+                f"~{report['ocr_seconds_saved_estimate']:.2f}s of OCR avoided"
+            )
+            return page_texts, page_count, report, empty_text
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
     
-    def _extract_from_image(self, file_path: str) -> tuple[str, int]:
+    def _iter_pdf_pages(self, file_path: str, page_reports: list, state: dict) -> Iterator[tuple[int, str]]:
+        """
+        Hybrid per-page extraction.
+        Pages with a usable text layer are read with the configured text-layer
+        backend (PyPDF2 by default); pages whose text layer is missing or
+        garbage are sent to OCR, one window of pages at a time. Mixed PDFs
+        keep both. Appends a report entry per page and yields non-empty pages.
+        """
+        text_backend = get_text_backend()
+        state.update(text_backend=text_backend.name, ocr_needed_pages=0)
+        window_size = settings.ocr_pages_in_flight
+        if settings.ocr_parallel_mode == "process":
+            # Give every worker a page to chew on
+            window_size = max(window_size, get_ocr_process_pool().workers)
+        
+        window = []
+        page_iter = text_backend.iter_pages(file_path)
+        page_num = 0
+        while True:
+            start = time.perf_counter()
+            text = next(page_iter, None)
+            if text is None:
+                break
+            page_num += 1
+            window.append({
+                "page": page_num,
+                "layer": self._classify_text_layer(text),
+                "text": text,
+                "seconds": time.perf_counter() - start,
+            })
+            if len(window) >= window_size:
+                yield from self._finish_window(file_path, window, page_reports, state)
+                window = []
+        if window:
+            yield from self._finish_window(file_path, window, page_reports, state)
+    
+    def _finish_window(self, file_path: str, window: list[dict], page_reports: list,
+                       state: dict) -> Iterator[tuple[int, str]]:
+        """OCR the pages of a window that need it, then yield the window's pages in order."""
+        ocr_page_numbers = [page["page"] for page in window if page["layer"] != "text"]
+        state["ocr_needed_pages"] += len(ocr_page_numbers)
+        ocr_results = {}
+        if ocr_page_numbers and self.ocr_available:
+            logger.info(f"OCR needed for pages {ocr_page_numbers} of {file_path}")
+            try:
+                with tracer.span("ocr.window", pages=len(ocr_page_numbers), first_page=ocr_page_numbers[0]):
+                    ocr_results = self._ocr_pdf_pages(file_path, ocr_page_numbers)
+            except Exception as e:
+                logger.error(f"Error processing scanned PDF: {str(e)}")
+                state["ocr_error"] = str(e)
+        
+        for page in window:
+            page_num = page["page"]
+            text = page["text"]
+            source = "text_layer"
+            seconds = page["seconds"]
+            
+            page_report = {"page": page_num, "layer": page["layer"]}
+            
+            if page["layer"] != "text":
+                if page_num in ocr_results:
+                    ocr_result = ocr_results[page_num]
+                    text = ocr_result["text"]
+                    source = "blank" if ocr_result.get("blank") else "ocr"
+                    seconds += ocr_result["seconds"]
+                    if ocr_result.get("failed"):
+                        # Timeouts and worker errors are transient: keep them out of the cache and checkpoints
+                        source = "ocr_failed"
+                        page_report["error"] = ocr_result.get("error")
+                        state.setdefault("ocr_failed_pages", []).append(page_num)
+                        state.setdefault("ocr_error", f"OCR failed for page {page_num}: {ocr_result.get('error')}")
+                    for key in ("pixels_original", "pixels_processed"):
+                        if key in ocr_result:
+                            page_report[key] = ocr_result[key]
+                elif page["layer"] == "image_only":
+                    text = ""
+                    source = "none"
+                # A garbage layer is still kept when OCR couldn't run
+            
+            page_report.update(source=source, chars=len(text.strip()), seconds=seconds)
+            page_reports.append(page_report)
+            PAGE_SECONDS.observe(seconds, source=source)
+            PAGES_TOTAL.inc(source=source)
+            if text.strip():
+                yield page_num, text
+    
+    def _classify_text_layer(self, text: str) -> str:
+        """
+        Classify a page's text layer:
+        - 'text': usable as-is
+        - 'garbage': present but junk (broken font maps, bad embedded OCR)
+        - 'image_only': little or no text, most likely a scanned page
+        """
+        compact = "".join(text.split())
+        if len(compact) < settings.text_layer_min_chars:
+            return "image_only"
+        
+        # Unmapped glyphs show up as replacement characters or "(cid:NN)"
+        if compact.count("\ufffd") + compact.count("(cid:") * 5 > len(compact) * 0.05:
+            return "garbage"
+        
+        alnum_ratio = sum(c.isalnum() for c in compact) / len(compact)
+        if alnum_ratio < 0.6:
+            return "garbage"
+        
+        tokens = text.split()
+        word_like = sum(1 for token in tokens if _WORD_LIKE.fullmatch(token.strip(".,;:!?()[]\"'")))
+        if word_like / len(tokens) < settings.text_layer_min_word_ratio:
+            return "garbage"
+        
+        return "text"
+    
+    def _build_report(self, page_reports: list[dict]) -> dict:
+        """Summarize per-page extraction decisions, timings and OCR pixel counts."""
+        text_layer_pages = sum(1 for page in page_reports if page["source"] == "text_layer")
+        blank_pages = sum(1 for page in page_reports if page["source"] == "blank")
+        ocr_reports = [page for page in page_reports if page["source"] == "ocr"]
+        ocr_seconds = sum(page["seconds"] for page in ocr_reports)
+        
+        # Estimate what OCR-ing the skipped pages would have cost
+        avg_ocr_seconds = ocr_seconds / len(ocr_reports) if ocr_reports else ocr_registry.average_call_seconds()
+        
+        # OCR time grows roughly linearly with pixel count; upscaled pages count as a cost
+        pixels_original = sum(page.get("pixels_original", 0) for page in page_reports)
+        pixels_processed = sum(page.get("pixels_processed", 0) for page in page_reports)
+        resize_seconds_saved = sum(
+            page["seconds"] * (page["pixels_original"] / page["pixels_processed"] - 1)
+            for page in ocr_reports
+            if page.get("pixels_processed")
+        )
+        
+        for page in page_reports:
+            page["seconds"] = round(page["seconds"], 4)
+        
+        return {
+            "page_count": len(page_reports),
+            "text_layer_pages": text_layer_pages,
+            "ocr_pages": len(ocr_reports),
+            "blank_pages": blank_pages,
+            "garbage_layer_pages": sum(1 for page in page_reports if page["layer"] == "garbage"),
+            "image_only_pages": sum(1 for page in page_reports if page["layer"] == "image_only"),
+            "text_layer_seconds": round(sum(p["seconds"] for p in page_reports if p["source"] == "text_layer"), 4),
+            "ocr_seconds": round(ocr_seconds, 4),
+            "ocr_seconds_saved_estimate": round(text_layer_pages * avg_ocr_seconds, 4),
+            "preprocessing": {
+                "enabled": settings.ocr_preprocessing_enabled,
+                "pixels_original": pixels_original,
+                "pixels_processed": pixels_processed,
+                "seconds_saved_estimate": round(resize_seconds_saved + blank_pages * avg_ocr_seconds, 4),
+            },
+            "pages": page_reports,
+        }
+    
+    def _extract_from_image(self, file_path: str) -> tuple[str, int, dict]:
         """
         Extract text from image using EasyOCR.
         Supports handwriting recognition.
+        Returns: (extracted_text, page_count, page result)
         """
         try:
-            # Verify image can be opened
             with Image.open(file_path) as img:
                 width, height = img.size
+                if self.ocr_available:
+                    # Respect phone camera orientation before OCR
+                    image = np.asarray(ImageOps.exif_transpose(img).convert("RGB"))
             
-            if self.easyocr_reader:
+            if self.ocr_available:
                 # Use EasyOCR for text extraction
-                results = self.easyocr_reader.readtext(file_path)
+                if settings.ocr_batching_enabled:
+                    page = self._ocr_images_batched([image])[0]
+                else:
+                    page = ocr_page_image(image)
+                extracted_text = page["text"]
                 
-                if results:
-                    # Extract text with confidence scores
-                    text_parts = []
-                    for (bbox, text, confidence) in results:
-                        if confidence > 0.3:  # Filter low-confidence results
-                            text_parts.append(text)
-                    
-                    extracted_text = " ".join(text_parts)
-                    
-                    if extracted_text.strip():
-                        logger.info(f"EasyOCR extracted {len(text_parts)} text segments")
-                        return extracted_text, 1
-                    else:
-                        return "[No readable text found in image]", 1
+                if page.get("blank"):
+                    return "[No text detected in image]", 1, page
+                elif extracted_text.strip():
+                    logger.info(f"EasyOCR extracted {len(extracted_text)} characters from image")
+                    return extracted_text, 1, page
                 else:
-                    return "[No text detected in image]", 1
+                    return "[No readable text found in image]", 1, page
             else:
                 # Fallback when EasyOCR not available
                 extracted_text = f"[EasyOCR not available - Image size: {width}x{height}]"
-                return extracted_text, 1
+                return extracted_text, 1, {"text": extracted_text, "seconds": 0.0}
                 
         except Exception as e:
             logger.error(f"Error processing image with OCR: {str(e)}")
             raise Exception(f"Error processing image: {str(e)}")
     
-    def _ocr_scanned_pdf(self, file_path: str, page_count: int) -> str:
+    def _ocr_pdf_pages(self, file_path: str, page_numbers: list[int]) -> dict[int, dict]:
         """
-        Extract text from scanned PDF using EasyOCR.
-        Converts PDF pages to images and processes with OCR.
+        OCR the given pages of a PDF with EasyOCR, either serially in this
+        process or spread across the OCR process pool.
+        Returns {page_num: page result} (see ocr_page_image).
         """
-        if not self.easyocr_reader:
-            return "[Scanned PDF - EasyOCR not available for text extraction]"
+        if settings.ocr_parallel_mode == "process" and len(page_numbers) > 1:
+            return get_ocr_process_pool().ocr_pdf_pages(file_path, page_numbers, settings.ocr_dpi)
+        return self._ocr_pages_serial(file_path, page_numbers)
+    
+    def _ocr_pages_serial(self, file_path: str, page_numbers: list[int]) -> dict[int, dict]:
+        """
+        OCR PDF pages in this process.
+        Pages are rasterized in small windows and passed to EasyOCR in memory,
+        either one at a time or through the shared OCR batcher.
+        """
+        page_results = {}
+        window = []
         
-        try:
-            # Convert PDF pages to images
-            images = convert_from_path(file_path, dpi=200)
-            text_parts = []
+        for page_num, image in iter_pdf_page_images(
+            file_path, page_numbers,
+            dpi=settings.ocr_dpi, window=settings.ocr_pages_in_flight
+        ):
+            if not settings.ocr_batching_enabled:
+                logger.info(f"Processing scanned page {page_num}")
+                page_results[page_num] = ocr_page_image(image)
+                continue
             
-            for page_num, image in enumerate(images):
-                logger.info(f"Processing scanned page {page_num + 1}/{len(images)}")
-                
-                # Save image temporarily for EasyOCR
-                temp_image_path = f"/tmp/temp_page_{page_num}.jpg"
-                image.save(temp_image_path, 'JPEG')
-                
-                try:
-                    # Extract text from image
-                    results = self.easyocr_reader.readtext(temp_image_path)
-                    
-                    page_text = []
-                    for (bbox, text, confidence) in results:
-                        if confidence > 0.3:  # Filter low-confidence results
-                            page_text.append(text)
-                    
-                    if page_text:
-                        text_parts.append(f"--- Page {page_num + 1} ---\n" + " ".join(page_text))
-                    
-                finally:
-                    # Clean up temporary file
-                    if os.path.exists(temp_image_path):
-                        os.remove(temp_image_path)
-            
-            if text_parts:
-                extracted_text = "\n\n".join(text_parts)
-                logger.info(f"Successfully extracted text from {len(text_parts)} scanned pages")
-                return extracted_text
-            else:
-                return "[No readable text found in scanned PDF]"
-                
-        except Exception as e:
-            logger.error(f"Error processing scanned PDF: {str(e)}")
-            return f"[Error processing scanned PDF: {str(e)}]"
+            window.append((page_num, image))
+            if len(window) >= settings.ocr_pages_in_flight:
+                page_results.update(zip([n for n, _ in window], self._ocr_images_batched([i for _, i in window])))
+                window = []
+        
+        if window:
+            page_results.update(zip([n for n, _ in window], self._ocr_images_batched([i for _, i in window])))
+        
+        return page_results
+    
+    def _ocr_images_batched(self, images: list) -> list[dict]:
+        """
+        Normalize images and submit them to the OCR batcher, which may group
+        them with pages from other documents being processed concurrently.
+        Blank pages never reach the batcher.
+        """
+        pending = []
+        for image in images:
+            start = time.perf_counter()
+            image, page = prepare_page_image(image)
+            future = None if image is None else ocr_batcher.submit(image)
+            pending.append((page, future, start))
+        
+        results = []
+        for page, future, start in pending:
+            page["text"] = " ".join(ocr_text_segments(future.result())) if future else ""
+            page["seconds"] = time.perf_counter() - start
+            results.append(page)
+        return results
     
     def classify_document(self, text: str) -> str:
         """
-        Simple keyword-based document classification.
+        Keyword-scoring document classification (see DocumentClassifier).
         In production, would use ML model or LLM.
         """
-        text_lower = text.lower()
-        
-        # Medical document keywords
-        if any(keyword in text_lower for keyword in ['diagnosis', 'patient', 'medical', 'doctor', 'hospital', 'treatment']):
-            return 'medical_record'
-        elif any(keyword in text_lower for keyword in ['lab', 'test result', 'blood', 'specimen', 'laboratory']):
-            return 'lab_report'
-        elif any(keyword in text_lower for keyword in ['x-ray', 'mri', 'ct scan', 'imaging', 'radiology']):
-            return 'imaging_report'
-        elif any(keyword in text_lower for keyword in ['prescription', 'medication', 'pharmacy', 'dosage']):
-            return 'prescription'
-        else:
-            return 'general_document'
+        return document_classifier.classify(text)
+    
+    def classify_document_with_scores(self, text: str) -> dict:
+        """Classify a document and return the per-type keyword scores behind the decision."""
+        return document_classifier.classify_with_scores(text)
@@ -0,0 +1,141 @@
+from abc import ABC, abstractmethod
+from typing import Iterator
+import logging
+
+import PyPDF2
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Optional backends - imported with fallback like EasyOCR
+try:
+    import pypdfium2
+    PYPDFIUM2_AVAILABLE = True
+except ImportError:
+    PYPDFIUM2_AVAILABLE = False
+
+try:
+    from pdfminer.high_level import extract_pages as pdfminer_extract_pages
+    from pdfminer.layout import LTTextContainer
+    PDFMINER_AVAILABLE = True
+except ImportError:
+    PDFMINER_AVAILABLE = False
+
+
+class PDFTextBackend(ABC):
+    """
+    Interface for reading the embedded text layer of a PDF, page by page.
+    Implementations yield one string per page, in order, and must yield an
+    empty string for pages without text so page numbers stay aligned.
+    """
+
+    name = "base"
+
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def iter_pages(self, file_path: str) -> Iterator[str]:
+        ...
+
+    @abstractmethod
+    def page_count(self, file_path: str) -> int:
+        ...
+
+
+class PyPDF2Backend(PDFTextBackend):
+    """Pure-Python PyPDF2 - always available, slowest on long documents."""
+
+    name = "pypdf2"
+
+    def iter_pages(self, file_path: str) -> Iterator[str]:
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for page in pdf_reader.pages:
+                yield page.extract_text() or ""
+
+    def page_count(self, file_path: str) -> int:
+        with open(file_path, 'rb') as file:
+            return len(PyPDF2.PdfReader(file).pages)
+
+
+class PdfiumBackend(PDFTextBackend):
+    """pypdfium2 bindings to PDFium (Chrome's PDF engine) - native and fast."""
+
+    name = "pypdfium2"
+
+    def available(self) -> bool:
+        return PYPDFIUM2_AVAILABLE
+
+    def iter_pages(self, file_path: str) -> Iterator[str]:
+        pdf = pypdfium2.PdfDocument(file_path)
+        try:
+            for index in range(len(pdf)):
+                page = pdf[index]
+                text_page = page.get_textpage()
+                try:
+                    yield text_page.get_text_range() or ""
+                finally:
+                    text_page.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+    def page_count(self, file_path: str) -> int:
+        pdf = pypdfium2.PdfDocument(file_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+
+
+class PdfMinerBackend(PDFTextBackend):
+    """pdfminer.six - pure Python with layout analysis; best reading order, slowest."""
+
+    name = "pdfminer"
+
+    def available(self) -> bool:
+        return PDFMINER_AVAILABLE
+
+    def iter_pages(self, file_path: str) -> Iterator[str]:
+        for page_layout in pdfminer_extract_pages(file_path):
+            yield "".join(
+                element.get_text() for element in page_layout if isinstance(element, LTTextContainer)
+            )
+
+    def page_count(self, file_path: str) -> int:
+        return sum(1 for _ in pdfminer_extract_pages(file_path))
+
+
+TEXT_BACKENDS: dict[str, PDFTextBackend] = {
+    backend.name: backend for backend in (PdfiumBackend(), PyPDF2Backend(), PdfMinerBackend())
+}
+
+# Preference order for "auto"
+_AUTO_ORDER = ["pypdfium2", "pypdf2"]
+
+
+def get_text_backend(name: str = None) -> PDFTextBackend:
+    """
+    Resolve a text-layer backend by name ("auto" picks the fastest installed).
+    A backend asked for by name that isn't installed is an error rather than
+    a silent fallback to the slow PyPDF2 path; the API and workers resolve
+    the configured backend at startup so this surfaces immediately.
+    """
+    name = (name or settings.pdf_text_backend).lower()
+    if name == "auto":
+        for candidate in _AUTO_ORDER:
+            if TEXT_BACKENDS[candidate].available():
+                return TEXT_BACKENDS[candidate]
+
+    backend = TEXT_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown PDF text backend: {name}. Options: auto, {', '.join(TEXT_BACKENDS)}")
+    if not backend.available():
+        raise RuntimeError(f"PDF text backend '{name}' is not installed. "
+                           f"Installed: {', '.join(available_text_backends())} (or use auto)")
+    return backend
+
+
+def available_text_backends() -> list[str]:
+    return [name for name, backend in TEXT_BACKENDS.items() if backend.available()]
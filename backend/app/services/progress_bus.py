@@ -0,0 +1,239 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+import logging
+
+from sqlalchemy import text
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "document_progress"
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class _Subscriber:
+    """An asyncio queue fed from any thread. Drops the oldest event when full - only the latest state matters."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = 100):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event: dict):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: dict):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class ProgressBus:
+    """
+    In-memory publish/subscribe bus for document processing progress.
+
+    Pipeline stages publish fine-grained progress here instead of committing
+    it to the documents table; SSE endpoints subscribe per document or per
+    case. The latest event per document is kept so new subscribers (and the
+    status endpoint) get the current state without a database read.
+
+    Workers running in other processes reach the API's bus through Postgres
+    LISTEN/NOTIFY: publish() also sends a NOTIFY, and the API process runs a
+    listener thread that republishes those events locally. NOTIFYs are
+    coalesced per document - at most one per settings.progress_notify_interval_ms,
+    carrying the latest state - so per-page ticks don't flood Postgres;
+    completed/failed events are always sent immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest: dict[str, dict] = {}
+        self._document_subscribers: dict[str, set[_Subscriber]] = {}
+        self._case_subscribers: dict[str, set[_Subscriber]] = {}
+        self._listener: Optional[threading.Thread] = None
+        self._origin = f"{os.getpid()}-{id(self)}"
+        # NOTIFY coalescing; sends happen under the lock so a document's events stay in order
+        self._notify_lock = threading.Lock()
+        self._pending_notifies: dict[str, dict] = {}
+        self._last_notify: dict[str, float] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self.published = 0
+        self.notify_failures = 0
+        self.notifies_coalesced = 0
+
+    def publish(self, document_id, case_id=None, status: str = "processing", progress: Optional[int] = None,
+                step: Optional[str] = None, notify: bool = True, **extra):
+        """Record and broadcast a progress event. Safe to call from any thread; never raises."""
+        event = {
+            "document_id": str(document_id),
+            "case_id": str(case_id) if case_id else None,
+            "processing_status": status,
+            "processing_progress": progress,
+            "processing_step": step,
+            "timestamp": time.time(),
+            **extra,
+        }
+        self._dispatch(event)
+        if notify and settings.progress_notify_enabled:
+            self._queue_notify(event)
+
+    def latest(self, document_id) -> Optional[dict]:
+        return self._latest.get(str(document_id))
+
+    def latest_for_case(self, case_id) -> list[dict]:
+        case_id = str(case_id)
+        return [event for event in list(self._latest.values()) if event.get("case_id") == case_id]
+
+    def subscribe(self, document_id=None, case_id=None) -> _Subscriber:
+        """Subscribe from an async context, to one document or to every document of a case."""
+        subscriber = _Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            if document_id:
+                self._document_subscribers.setdefault(str(document_id), set()).add(subscriber)
+            if case_id:
+                self._case_subscribers.setdefault(str(case_id), set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            for subscribers in (self._document_subscribers, self._case_subscribers):
+                for key in [key for key, subs in subscribers.items() if subscriber in subs]:
+                    subscribers[key].discard(subscriber)
+                    if not subscribers[key]:
+                        del subscribers[key]
+
+    def _dispatch(self, event: dict):
+        with self._lock:
+            document_id = event["document_id"]
+            # Keep what the publisher didn't know (e.g. case id and filename on a retry event)
+            event = {**self._latest.get(document_id, {}), **{k: v for k, v in event.items() if v is not None}}
+            self._latest[document_id] = event
+            self._prune()
+            subscribers = set(self._document_subscribers.get(document_id, ()))
+            if event.get("case_id"):
+                subscribers |= self._case_subscribers.get(event["case_id"], set())
+            self.published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.deliver(event)
+            except RuntimeError:
+                # Subscriber's event loop already closed
+                self.unsubscribe(subscriber)
+
+    def _prune(self):
+        """Forget finished documents after a while so the snapshot map stays bounded."""
+        if len(self._latest) <= settings.progress_max_tracked_documents:
+            return
+        cutoff = time.time() - settings.progress_retention_seconds
+        for document_id, event in list(self._latest.items()):
+            if event["processing_status"] in TERMINAL_STATUSES and event["timestamp"] < cutoff:
+                del self._latest[document_id]
+
+    def _queue_notify(self, event: dict):
+        """NOTIFY now, or hold the event for the flusher if this document was notified too recently."""
+        document_id = event["document_id"]
+        interval = settings.progress_notify_interval_ms / 1000
+        with self._notify_lock:
+            pending = self._pending_notifies.pop(document_id, None)
+            if pending:
+                event = {**pending, **{k: v for k, v in event.items() if v is not None}}
+            now = time.monotonic()
+            if event["processing_status"] in TERMINAL_STATUSES:
+                self._last_notify.pop(document_id, None)
+            elif now - self._last_notify.get(document_id, 0.0) < interval:
+                self._pending_notifies[document_id] = event
+                self.notifies_coalesced += 1
+                self._ensure_flusher()
+                return
+            else:
+                self._last_notify[document_id] = now
+            self._notify(event)
+    
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_notifies, name="progress-notify", daemon=True)
+            self._flusher.start()
+    
+    def _flush_notifies(self):
+        """Send held events once their document's interval has passed."""
+        while True:
+            interval = settings.progress_notify_interval_ms / 1000
+            time.sleep(interval / 2)
+            with self._notify_lock:
+                now = time.monotonic()
+                for document_id in list(self._pending_notifies):
+                    if now - self._last_notify.get(document_id, 0.0) >= interval:
+                        self._last_notify[document_id] = now
+                        self._notify(self._pending_notifies.pop(document_id))
+                # Documents that stopped publishing without a final event
+                for document_id, sent in list(self._last_notify.items()):
+                    if now - sent > 60 and document_id not in self._pending_notifies:
+                        del self._last_notify[document_id]
+    
+    def _notify(self, event: dict):
+        from app.database import engine
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT pg_notify(:channel, :payload)"), {
+                    "channel": NOTIFY_CHANNEL,
+                    "payload": json.dumps({**event, "origin": self._origin}),
+                })
+                conn.commit()
+        except Exception as e:
+            self.notify_failures += 1
+            logger.debug(f"Progress NOTIFY failed: {e}")
+
+    def start_listener(self):
+        """Relay progress NOTIFYs from worker processes into this process's bus (API side)."""
+        if self._listener or not settings.progress_notify_enabled:
+            return
+        self._listener = threading.Thread(target=self._listen, name="progress-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        import select
+        from app.database import engine
+        while True:
+            try:
+                conn = engine.raw_connection()
+                # Dedicated connection: never returned to the pool in autocommit mode
+                conn.detach()
+                try:
+                    listen_conn = conn.dbapi_connection
+                    listen_conn.set_isolation_level(0)  # autocommit - LISTEN must not sit in a transaction
+                    listen_conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    logger.info(f"Listening for progress events on {NOTIFY_CHANNEL}")
+                    while True:
+                        if select.select([listen_conn], [], [], 30) == ([], [], []):
+                            continue
+                        listen_conn.poll()
+                        while listen_conn.notifies:
+                            notification = listen_conn.notifies.pop(0)
+                            event = json.loads(notification.payload)
+                            if event.pop("origin", None) != self._origin:
+                                self._dispatch(event)
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.warning(f"Progress listener error, reconnecting: {e}")
+                time.sleep(5)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "tracked_documents": len(self._latest),
+                "document_subscribers": sum(len(subs) for subs in self._document_subscribers.values()),
+                "case_subscribers": sum(len(subs) for subs in self._case_subscribers.values()),
+                "published": self.published,
+                "notify_failures": self.notify_failures,
+                "notifies_coalesced": self.notifies_coalesced,
+                "listening": self._listener is not None,
+            }
+
+
+# Global instance
+progress_bus = ProgressBus()
@@ -1,45 +1,69 @@
-import os
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
 from uuid import UUID
+from sqlalchemy import or_, text
 from sqlalchemy.orm import Session
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import PGVector
 from langchain.schema import Document as LangChainDocument
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
 from app.models import Document, DocumentChunk, ChatMessage
 from app.config import settings
+from app.services.metrics import CHUNKS_TOTAL
+from app.services.llm_client import llm_client, PooledOpenAIEmbeddings
+from app.services.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHAT_MODEL = "gpt-4o-mini"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# LangChain PGVector table holding chunk embeddings
+EMBEDDING_TABLE = "langchain_pg_embedding"
+
+# Medical-specific prompt for answering from retrieved chunks
+VECTOR_QA_PROMPT = PromptTemplate(
+    template="""
+        You are a medical AI assistant analyzing medical documents. Use the following context to answer the question accurately and professionally.
+
+        Context:
+        {context}
+
+        Question: {question}
+
+        Instructions:
+        1. Provide a clear, accurate answer based only on the information in the context
+        2. If the information is not available in the context, clearly state that
+        3. Use medical terminology appropriately
+        4. Be specific about dates, names, and medical details when available
+        5. If multiple documents contain relevant information, synthesize the information clearly
+
+        Answer:
+        """,
+    input_variables=["context", "question"]
+)
+
 class RAGService:
     def __init__(self):
         self.embeddings = None
         self.vectorstore = None
         self.llm = None
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len,
             separators=["\n\n", "\n", ". ", " ", ""]
         )
         
         # Initialize components if OpenAI API key is available
-        if settings.openai_api_key:
+        if llm_client.available:
             try:
-                # Set OpenAI API key as environment variable for compatibility
-                os.environ["OPENAI_API_KEY"] = settings.openai_api_key
-                
-                self.embeddings = OpenAIEmbeddings(
-                    model="text-embedding-ada-002"
-                )
-                self.llm = ChatOpenAI(
-                    model="gpt-4o-mini",
-                    temperature=0.1
-                )
+                # Both go through the shared, pooled OpenAI client
+                self.embeddings = PooledOpenAIEmbeddings(model=EMBEDDING_MODEL)
+                self.llm = llm_client
                 self._initialize_vectorstore()
                 logger.info("RAG service initialized with OpenAI")
             except Exception as e:
@@ -106,12 +130,14 @@ class RAGService:
             try:
                 self.vectorstore.add_documents(documents)
                 db.commit()
+                CHUNKS_TOTAL.inc(len(chunks), embedded="true")
                 logger.info(f"Added {len(chunks)} chunks for document {document_id}")
                 return True
             except Exception as vector_error:
                 logger.error(f"Vector store error: {vector_error}")
                 # Still save chunks to database for fallback search
                 db.commit()
+                CHUNKS_TOTAL.inc(len(chunks), embedded="false")
                 logger.info(f"Saved {len(chunks)} chunks to database (vector store failed)")
                 return True  # Return True since we saved the chunks
             
@@ -120,16 +146,79 @@ class RAGService:
             db.rollback()
             return False
 
+    def iter_page_chunks(self, pages: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        """
+        Split a stream of (page_num, text) pages into (page_num, chunk) pairs.
+        The last chunk of each page is carried over and re-split with the next
+        page, so chunks still span page breaks; only one page plus one chunk
+        is held at a time. A chunk's page is the page it starts on.
+        """
+        carry, carry_page = "", None
+        for page_num, text in pages:
+            chunks = self.text_splitter.split_text(f"{carry}\n\n{text}" if carry else text)
+            if not chunks:
+                continue
+            for i, chunk in enumerate(chunks[:-1]):
+                yield (carry_page if i == 0 and carry else page_num), chunk
+            if len(chunks) > 1 or not carry:
+                carry_page = page_num
+            carry = chunks[-1]
+        if carry:
+            yield carry_page, carry
+
+    def add_chunk_batch(self, document_id: UUID, chunks: List[Tuple[int, str]], first_index: int, db: Session) -> int:
+        """
+        Embed and store one batch of (page_num, chunk) pairs, committing so the
+        chunks are searchable right away. Used by streaming ingestion.
+        Returns the number of chunks stored.
+        """
+        if settings.demo_mode:
+            chunks = chunks[:max(0, settings.max_embeddings_per_document - first_index)]
+        if not chunks:
+            return 0
+
+        documents = []
+        for i, (page_num, chunk) in enumerate(chunks, start=first_index):
+            documents.append(LangChainDocument(
+                page_content=chunk,
+                metadata={
+                    "document_id": str(document_id),
+                    "chunk_index": i,
+                    "page_number": page_num,
+                    "source": f"document_{document_id}_chunk_{i}"
+                }
+            ))
+            db.add(DocumentChunk(
+                document_id=document_id,
+                chunk_text=chunk,
+                chunk_index=i,
+                page_number=page_num,
+                embedding_id=f"document_{document_id}_chunk_{i}"
+            ))
+
+        embedded = False
+        if self.embeddings and self.vectorstore:
+            try:
+                self.vectorstore.add_documents(documents)
+                embedded = True
+            except Exception as vector_error:
+                # Still save chunks to database for fallback search
+                logger.error(f"Vector store error: {vector_error}")
+        db.commit()
+        CHUNKS_TOTAL.inc(len(chunks), embedded=str(embedded).lower())
+        return len(chunks)
+
     def query_documents(self, question: str, case_id: UUID, db: Session) -> Dict:
         """
         Perform similarity search and generate answer with source citations
         """
         try:
-            # Get documents for this case
-            case_documents = db.query(Document).filter(
-                Document.case_id == case_id,
-                Document.processed == True
-            ).all()
+            # Get documents for this case - streamed documents are searchable while processing
+            with tracer.span("rag.case_documents", case_id=str(case_id)):
+                case_documents = db.query(Document).filter(
+                    Document.case_id == case_id,
+                    or_(Document.processed == True, Document.processing_status == "processing")
+                ).all()
             
             if not case_documents:
                 return {
@@ -157,70 +246,52 @@ class RAGService:
             }
 
     def _vector_search_query(self, question: str, case_id: UUID, db: Session, case_documents) -> Dict:
-        """Perform vector-based similarity search"""
-        # Perform similarity search
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5}  # Get top 5 most relevant chunks
-        )
-        
-        # Create medical-specific prompt
-        prompt_template = """
-        You are a medical AI assistant analyzing medical documents. Use the following context to answer the question accurately and professionally.
-
-        Context:
-        {context}
-
-        Question: {question}
-
-        Instructions:
-        1. Provide a clear, accurate answer based only on the information in the context
-        2. If the information is not available in the context, clearly state that
-        3. Use medical terminology appropriately
-        4. Be specific about dates, names, and medical details when available
-        5. If multiple documents contain relevant information, synthesize the information clearly
-
-        Answer:
         """
+        Perform vector-based similarity search.
+        Runs as explicit steps - embed the question, pgvector search, one
+        lookup for all source documents, LLM answer - each in its own trace
+        span, so a slow answer shows which step the time went to.
+        """
+        query_embedding = self.embeddings.embed_query(question)
         
-        PROMPT = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
-        )
-        
-        # Create QA chain
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=retriever,
-            chain_type_kwargs={"prompt": PROMPT},
-            return_source_documents=True
-        )
+        with tracer.span("rag.vector_search", k=5) as span:
+            # Top 5 most relevant chunks, with cosine distance
+            results = self.vectorstore.similarity_search_with_score_by_vector(query_embedding, k=5)
+            if span is not None:
+                span.set_attribute("results", len(results))
         
-        # Get answer
-        result = qa_chain({"query": question})
+        # One query for every cited document instead of one per chunk
+        with tracer.span("rag.source_lookup"):
+            doc_ids = {doc.metadata.get("document_id") for doc, _ in results if doc.metadata.get("document_id")}
+            filenames = dict(db.query(Document.id, Document.filename).filter(Document.id.in_(doc_ids)).all()) \
+                if doc_ids else {}
+            filenames = {str(doc_id): filename for doc_id, filename in filenames.items()}
         
         # Process sources
         sources = []
-        for doc in result.get("source_documents", []):
+        for doc, distance in results:
             doc_id = doc.metadata.get("document_id")
-            if doc_id:
-                # Get document info
-                document = db.query(Document).filter(Document.id == doc_id).first()
-                if document:
-                    sources.append({
-                        "document_id": str(document.id),
-                        "document_name": document.filename,
-                        "chunk_text": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
-                        "relevance_score": 0.8,  # Placeholder - could implement actual scoring
-                        "page_number": doc.metadata.get("page_number")
-                    })
+            if doc_id in filenames:
+                sources.append({
+                    "document_id": doc_id,
+                    "document_name": filenames[doc_id],
+                    "chunk_text": doc.page_content[:200] + "..." if len(doc.page_content) > 200 else doc.page_content,
+                    "relevance_score": round(max(0.0, 1.0 - distance), 3),
+                    "page_number": doc.metadata.get("page_number")
+                })
+        
+        prompt = VECTOR_QA_PROMPT.format(
+            context="\n\n".join(doc.page_content for doc, _ in results),
+            question=question
+        )
+        response = self.llm.chat("chat", [{"role": "user", "content": prompt}], model=CHAT_MODEL, temperature=0.1)
+        answer = response.choices[0].message.content
         
         # Calculate confidence based on source quality
         confidence = min(0.9, len(sources) * 0.2) if sources else 0.1
         
         return {
-            "answer": result["result"],
+            "answer": answer,
             "sources": sources,
             "confidence": confidence
         }
@@ -280,8 +351,8 @@ Documents:
 
 Please provide a clear, accurate answer based only on the information provided. If the information is not available, clearly state that."""
 
-                response = self.llm.invoke(prompt)
-                answer = response.content if hasattr(response, 'content') else str(response)
+                response = self.llm.chat("chat", [{"role": "user", "content": prompt}], model=CHAT_MODEL, temperature=0.1)
+                answer = response.choices[0].message.content
                 
                 return {
                     "answer": answer,
@@ -336,6 +407,18 @@ Please provide a clear, accurate answer based only on the information provided.
             db.rollback()
             return False
 
+    def delete_document_embeddings(self, document_id: UUID, db: Session) -> int:
+        """
+        Remove a document's chunks and their vectors (PGVector has no delete by
+        metadata, so the embedding rows are deleted in SQL). Does not commit.
+        """
+        removed = db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
+        has_table = db.execute(text("SELECT to_regclass(:table)"), {"table": EMBEDDING_TABLE}).scalar()
+        if has_table:
+            db.execute(text(f"DELETE FROM {EMBEDDING_TABLE} WHERE cmetadata->>'document_id' = :document_id"),
+                       {"document_id": str(document_id)})
+        return removed
+
     def reprocess_document_embeddings(self, document_id: UUID, db: Session) -> bool:
         """Reprocess embeddings for a specific document"""
         try:
@@ -343,12 +426,8 @@ Please provide a clear, accurate answer based only on the information provided.
             if not document or not document.ocr_text:
                 return False
             
-            # Remove existing chunks
-            db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete()
-            
-            # Remove from vector store (if possible)
-            # Note: PGVector doesn't have a direct delete by metadata method
-            # This would need to be implemented based on specific requirements
+            # Remove existing chunks and vectors
+            self.delete_document_embeddings(document_id, db)
             
             # Re-add document
             return self.add_document_to_vectorstore(document_id, document.ocr_text, db)
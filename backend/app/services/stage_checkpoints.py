@@ -0,0 +1,113 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional
+import logging
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import StageCheckpoint
+from app.services.analysis_service import ANALYSIS_PROMPT_VERSION
+from app.services.document_classifier import document_classifier
+from app.services.extraction_cache import extraction_cache
+from app.services.extraction_service import EXTRACTION_PROMPT_VERSION
+from app.services.summary_service import SUMMARY_PROMPT_VERSION
+from app.services.rag_service import EMBEDDING_MODEL, CHUNK_SIZE, CHUNK_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages, in dependency order
+STAGES = ["text", "classification", "summary", "entities", "embeddings"]
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of a stage's inputs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class StageCheckpoints:
+    """
+    Records, per document and stage, a fingerprint of the stage's inputs and
+    the version of the engine/prompt/model that produced its output.
+
+    A stage is current when both match what a rerun would use, so reprocessing
+    skips it. Downstream fingerprints are built from upstream outputs (e.g.
+    summary <- text + document type), so a changed OCR result invalidates
+    everything after it, while a changed prompt only invalidates its own stage.
+    """
+
+    def config_version(self, stage: str) -> str:
+        if stage == "text":
+            return extraction_cache.config_fingerprint()
+        if stage == "classification":
+            return fingerprint(json.dumps(document_classifier.weights, sort_keys=True),
+                               document_classifier.MIN_SCORE)[:16]
+        if stage in ("summary", "entities") and settings.combined_analysis_enabled:
+            # Both come from the combined prompt; switching modes reruns them
+            return f"combined-{ANALYSIS_PROMPT_VERSION}"
+        if stage == "summary":
+            return SUMMARY_PROMPT_VERSION
+        if stage == "entities":
+            return EXTRACTION_PROMPT_VERSION
+        if stage == "embeddings":
+            return f"{EMBEDDING_MODEL}:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+        raise ValueError(f"Unknown stage: {stage}")
+
+    def get(self, db: Session, document_id) -> dict[str, StageCheckpoint]:
+        checkpoints = db.query(StageCheckpoint).filter(StageCheckpoint.document_id == document_id).all()
+        return {checkpoint.stage: checkpoint for checkpoint in checkpoints}
+
+    def is_current(self, checkpoints: dict, stage: str, input_fingerprint: Optional[str]) -> bool:
+        checkpoint = checkpoints.get(stage)
+        return bool(
+            checkpoint
+            and input_fingerprint
+            and checkpoint.input_fingerprint == input_fingerprint
+            and checkpoint.config_version == self.config_version(stage)
+        )
+
+    def record(self, db: Session, document_id, stage: str, input_fingerprint: str, details: dict = None):
+        """Upsert a checkpoint. Not committed - commit it together with the stage's output."""
+        checkpoint = db.query(StageCheckpoint).filter(
+            StageCheckpoint.document_id == document_id,
+            StageCheckpoint.stage == stage
+        ).first()
+        if not checkpoint:
+            checkpoint = StageCheckpoint(document_id=document_id, stage=stage)
+            db.add(checkpoint)
+        checkpoint.input_fingerprint = input_fingerprint
+        checkpoint.config_version = self.config_version(stage)
+        checkpoint.details = details or {}
+        checkpoint.completed_at = datetime.utcnow()
+
+    def invalidate(self, db: Session, document_id, stages: Optional[list[str]] = None) -> int:
+        """Drop checkpoints (all, or the given stages) so they rerun. Not committed."""
+        query = db.query(StageCheckpoint).filter(StageCheckpoint.document_id == document_id)
+        if stages:
+            query = query.filter(StageCheckpoint.stage.in_(stages))
+        return query.delete(synchronize_session=False)
+
+    def summarize(self, db: Session, document_id) -> dict:
+        """Per-stage status for a document: current, stale or missing."""
+        checkpoints = self.get(db, document_id)
+        status = {}
+        for stage in STAGES:
+            checkpoint = checkpoints.get(stage)
+            if not checkpoint:
+                status[stage] = {"status": "missing"}
+                continue
+            status[stage] = {
+                "status": "current" if checkpoint.config_version == self.config_version(stage) else "stale",
+                "config_version": checkpoint.config_version,
+                "completed_at": checkpoint.completed_at,
+            }
+        return status
+
+
+# Global instance
+stage_checkpoints = StageCheckpoints()
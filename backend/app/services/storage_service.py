@@ -1,7 +1,14 @@
 import os
 import shutil
+import hashlib
+import uuid
 from typing import Optional
 
+import aiofiles
+from fastapi import UploadFile
+
+from app.config import settings
+
 class StorageService:
     """
     Local file storage service.
@@ -39,3 +46,63 @@ class StorageService:
             return False
         except Exception:
             return False
+    
+    async def save_upload(self, upload: UploadFile, extension: str, max_bytes: int) -> tuple[str, int, str]:
+        """
+        Stream an upload to storage in chunks without blocking the event loop.
+        The SHA-256 and size are computed as bytes arrive, and the upload is
+        abandoned (partial file removed) as soon as it exceeds max_bytes.
+        Memory use is one chunk regardless of file size.
+        Returns (path, size in bytes, sha256 hex).
+        Raises ValueError if the file is too large.
+        """
+        chunk_size = settings.upload_chunk_size_kb * 1024
+        file_path = os.path.join(self.base_path, f"{uuid.uuid4()}{extension}")
+        digest = hashlib.sha256()
+        size = 0
+        
+        try:
+            async with aiofiles.open(file_path, "wb") as out:
+                while chunk := await upload.read(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(
+                            f"File size exceeds maximum allowed size ({max_bytes / 1024 / 1024:.0f}MB)"
+                        )
+                    digest.update(chunk)
+                    await out.write(chunk)
+        except BaseException:
+            # Includes client disconnects / cancellation - never leave partial files behind
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        
+        return file_path, size, digest.hexdigest()
+    
+    def save_fileobj(self, fileobj, extension: str, max_bytes: int) -> tuple[str, int, str]:
+        """
+        Blocking counterpart of save_upload for file-like objects (e.g. ZIP
+        members) - run it in a thread from async code.
+        Returns (path, size in bytes, sha256 hex). Raises ValueError if too large.
+        """
+        chunk_size = settings.upload_chunk_size_kb * 1024
+        file_path = os.path.join(self.base_path, f"{uuid.uuid4()}{extension}")
+        digest = hashlib.sha256()
+        size = 0
+        
+        try:
+            with open(file_path, "wb") as out:
+                while chunk := fileobj.read(chunk_size):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(
+                            f"File size exceeds maximum allowed size ({max_bytes / 1024 / 1024:.0f}MB)"
+                        )
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        
+        return file_path, size, digest.hexdigest()
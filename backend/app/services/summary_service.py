@@ -1,68 +1,108 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from app.config import settings
+from app.services.llm_client import llm_client
+from app.services.metrics import SUMMARY_SECTIONS
+from app.services.tracing import tracer
+from app.utils.tokens import count_tokens, split_to_budget, pack_to_budget
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bump when the summary prompt or model changes (invalidates summary checkpoints)
+SUMMARY_PROMPT_VERSION = "2"
+
+SUMMARY_SYSTEM_PROMPT = "You are a medical document summarization assistant. Provide clear, concise summaries that highlight key medical information."
+
+
 class SummaryService:
     """
     Service for generating AI-powered summaries using OpenAI.
     """
     
     def __init__(self):
-        if settings.openai_api_key and settings.openai_api_key != "your_openai_api_key_here":
-            try:
-                from openai import OpenAI
-                self.client = OpenAI(api_key=settings.openai_api_key)
-            except Exception as e:
-                logger.warning(f"Failed to initialize OpenAI client: {e}")
-                self.client = None
-        else:
-            self.client = None
+        # Shared, pooled client - constructing the service per document is cheap
+        self.client = llm_client if llm_client.available else None
     
     def generate_document_summary(self, text: str, document_type: str = "general") -> str:
         """
         Generate a concise summary of a document.
         """
-        if not self.client:
-            return "[OpenAI API key not configured - summary generation disabled]"
-        
-        try:
-            prompt = self._build_summary_prompt(text, document_type)
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Using mini for cost efficiency
-                messages=[
-                    {"role": "system", "content": "You are a medical document summarization assistant. Provide clear, concise summaries that highlight key medical information."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            summary = response.choices[0].message.content
-            return summary.strip()
-            
-        except Exception as e:
-            logger.error(f"Error generating summary: {str(e)}")
-            return f"[Error generating summary: {str(e)}]"
+        return self.summarize_document(text, document_type)["summary"]
+    
+    def summarize_document(self, text: str, document_type: str = "general") -> dict:
+        """
+        Summarize the whole document (map-reduce when it spans several sections).
+        Returns {"summary": str, "sections": int, "tokens": int}.
+        """
+        summarizer = self.start_summary()
+        summarizer.add(text)
+        return summarizer.finish(document_type)
+    
+    def start_summary(self) -> "SectionSummarizer":
+        """Incremental summary: add() text as it is extracted, then finish()."""
+        return SectionSummarizer(self)
+    
+    def _complete(self, operation: str, prompt: str, max_tokens: int) -> tuple[str, int]:
+        """One summarization call. Returns (text, tokens used)."""
+        response = self.client.chat(
+            operation,
+            model="gpt-4o-mini",  # Using mini for cost efficiency
+            messages=[
+                {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+        tokens = response.usage.total_tokens if response.usage else 0
+        return response.choices[0].message.content.strip(), tokens
     
     def _build_summary_prompt(self, text: str, document_type: str) -> str:
         """Build the prompt for summarization based on document type."""
         
         base_prompt = f"Summarize the following {document_type.replace('_', ' ')} in 3-5 concise bullet points. Focus on:\n"
+        base_prompt += self.summary_focus(document_type) + "\n"
+        base_prompt += f"Document text:\n{text}"
         
+        return base_prompt
+    
+    def _build_section_prompt(self, section: str, index: int) -> str:
+        """Map step: condense one section, keeping facts the final summary may need."""
+        return f"""This is section {index} of a longer document. List its key facts as concise bullet points:
+names, dates, diagnoses, test results with values, treatments, medications and follow-up items.
+Keep exact dates and values. Omit boilerplate. If the section has no relevant content, answer "- (no relevant content)".
+
+Section text:
+{section}"""
+    
+    def _build_reduce_prompt(self, partials: list[str], document_type: str) -> str:
+        """Reduce step: the final bullet list from the section notes, in document order."""
+        notes = "\n\n".join(f"Section {i}:\n{partial}" for i, partial in enumerate(partials, 1))
+        prompt = f"The notes below cover every section of a {document_type.replace('_', ' ')}, in order. "
+        prompt += "Summarize the whole document in 3-5 concise bullet points. Focus on:\n"
+        prompt += self.summary_focus(document_type) + "\n"
+        prompt += f"Section notes:\n{notes}"
+        return prompt
+    
+    def _build_condense_prompt(self, partials: str) -> str:
+        """Intermediate reduce for very long documents: merge consecutive section notes."""
+        return f"""Merge these notes from consecutive sections of a document into one concise bullet list.
+Keep exact dates and values, drop duplicates.
+
+Notes:
+{partials}"""
+    
+    def summary_focus(self, document_type: str) -> str:
+        """What the summary bullets should cover for a document type (also used by the combined analysis prompt)."""
         if document_type == "medical_record":
-            base_prompt += "- Patient information\n- Chief complaint\n- Diagnosis\n- Treatment plan\n- Follow-up instructions\n\n"
+            return "- Patient information\n- Chief complaint\n- Diagnosis\n- Treatment plan\n- Follow-up instructions\n"
         elif document_type == "lab_report":
-            base_prompt += "- Test type\n- Key results\n- Abnormal findings\n- Clinical significance\n\n"
+            return "- Test type\n- Key results\n- Abnormal findings\n- Clinical significance\n"
         elif document_type == "imaging_report":
-            base_prompt += "- Imaging modality\n- Findings\n- Impressions\n- Recommendations\n\n"
-        else:
-            base_prompt += "- Main purpose\n- Key findings\n- Important dates\n- Action items\n\n"
-        
-        base_prompt += f"Document text:\n{text[:3000]}"  # Limit to avoid token limits
-        
-        return base_prompt
+            return "- Imaging modality\n- Findings\n- Impressions\n- Recommendations\n"
+        return "- Main purpose\n- Key findings\n- Important dates\n- Action items\n"
     
     def generate_case_summary(self, documents_text: list[tuple[str, str]]) -> str:
         """
@@ -92,7 +132,8 @@ Organize the summary with these sections:
 Documents:
 {combined_text[:4000]}"""
             
-            response = self.client.chat.completions.create(
+            response = self.client.chat(
+                "case_summary",
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "You are a medical case summarization expert. Create clear, organized summaries for legal and medical professionals."},
@@ -107,3 +148,114 @@ Documents:
         except Exception as e:
             logger.error(f"Error generating case summary: {str(e)}")
             return f"[Error generating case summary: {str(e)}]"
+
+
+class SectionSummarizer:
+    """
+    Map-reduce summary of a whole document, fed incrementally.
+    
+    Text is packed into sections of about settings.summary_section_tokens
+    tokens on paragraph boundaries. Each section is summarized on a bounded
+    thread pool as soon as it is full - while the rest is still being
+    extracted, when fed page by page - and finish() reduces the section
+    notes into the final bullet list. Wall-clock time stays near one map
+    call plus one reduce call however long the document is. A document that
+    fits one section gets the single-call summary.
+    """
+    
+    def __init__(self, service: SummaryService):
+        self.service = service
+        self.budget = settings.summary_section_tokens
+        self.buffer = []
+        self.buffer_tokens = 0
+        self.futures = []
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.tokens = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def started(self) -> bool:
+        """Whether text beyond the first section has arrived (map calls are running)."""
+        return bool(self.futures)
+    
+    def add(self, text: str):
+        for piece in split_to_budget(text, self.budget):
+            tokens = count_tokens(piece)
+            if self.buffer and self.buffer_tokens + tokens > self.budget:
+                self._submit_section()
+            self.buffer.append(piece)
+            self.buffer_tokens += tokens
+    
+    def _submit_section(self):
+        section = "\n\n".join(self.buffer)
+        self.buffer, self.buffer_tokens = [], 0
+        if not self.service.client:
+            return
+        self.futures.append(self._submit(self._summarize_section, section, len(self.futures) + 1))
+    
+    def _submit(self, fn, *args):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=settings.summary_max_concurrency,
+                                               thread_name_prefix="summary")
+        return self.executor.submit(tracer.run_in_context(fn), *args)
+    
+    def _call(self, operation: str, prompt: str, max_tokens: int) -> str:
+        text, tokens = self.service._complete(operation, prompt, max_tokens)
+        with self._lock:
+            self.tokens += tokens
+        return text
+    
+    def _summarize_section(self, section: str, index: int) -> str:
+        return self._call("summary_map", self.service._build_section_prompt(section, index),
+                          settings.summary_section_max_tokens)
+    
+    def finish(self, document_type: str = "general") -> dict:
+        """Wait for the section summaries and reduce them. Returns {"summary", "sections", "tokens"}."""
+        if not self.service.client:
+            return {"summary": "[OpenAI API key not configured - summary generation disabled]", "sections": 0, "tokens": 0}
+        
+        try:
+            with tracer.span("summary.map_reduce", document_type=document_type) as span:
+                if not self.futures:
+                    text = "\n\n".join(self.buffer)
+                    summary = self._call("summary", self.service._build_summary_prompt(text, document_type), 500)
+                    sections = 1
+                else:
+                    if self.buffer:
+                        self._submit_section()
+                    partials = [future.result() for future in self.futures]
+                    sections = len(partials)
+                    summary = self._reduce(partials, document_type)
+                if span:
+                    span.set_attribute("sections", sections)
+                    span.set_attribute("tokens", self.tokens)
+            SUMMARY_SECTIONS.observe(sections)
+            if sections > 1:
+                logger.info(f"Map-reduce summary: {sections} sections, {self.tokens} tokens")
+            return {"summary": summary, "sections": sections, "tokens": self.tokens}
+            
+        except Exception as e:
+            logger.error(f"Error generating summary: {str(e)}")
+            return {"summary": f"[Error generating summary: {str(e)}]", "sections": len(self.futures), "tokens": self.tokens}
+        finally:
+            self.close()
+    
+    def _reduce(self, partials: list[str], document_type: str) -> str:
+        # Notes too long for one call are merged in parallel rounds first
+        budget = settings.summary_reduce_tokens
+        while len(partials) > 1 and sum(count_tokens(partial) for partial in partials) > budget:
+            groups = pack_to_budget(partials, budget)
+            if len(groups) == len(partials):
+                break
+            futures = [
+                self._submit(self._call, "summary_reduce", self.service._build_condense_prompt(group),
+                             settings.summary_section_max_tokens)
+                for group in groups
+            ]
+            partials = [future.result() for future in futures]
+        return self._call("summary_reduce", self.service._build_reduce_prompt(partials, document_type), 500)
+    
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,235 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Optional
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context: version-traceid-spanid-flags
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation in a trace. Use Tracer.span() rather than constructing these."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "sampled",
+                 "start_ns", "end_ns", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _SpanExporter:
+    """
+    Ships finished spans from a background thread so tracing never blocks
+    the request or pipeline. Spans go to a local JSONL file (inspect offline)
+    or to an OTLP/HTTP collector as OTLP JSON. When the buffer is full, spans
+    are dropped and counted rather than applying backpressure.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+
+    def submit(self, span: Span):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + settings.tracing_flush_seconds
+            while len(batch) < 512:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                if settings.tracing_exporter == "otlp":
+                    self._export_otlp(batch)
+                else:
+                    self._export_jsonl(batch)
+                self.exported += len(batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.warning(f"Failed to export {len(batch)} spans: {e}")
+
+    def _export_jsonl(self, batch: list[Span]):
+        path = settings.tracing_file
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Keep one rotated file so traces can't fill the disk
+        if os.path.exists(path) and os.path.getsize(path) > settings.tracing_max_file_mb * 1024 * 1024:
+            os.replace(path, f"{path}.1")
+        with open(path, "a", encoding="utf-8") as out:
+            for span in batch:
+                out.write(json.dumps({**span.to_dict(), "service": tracer.service_name}, default=str) + "\n")
+
+    def _export_otlp(self, batch: list[Span]):
+        body = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", tracer.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "app.services.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+                    "status": {"code": 2, "message": span.error or ""} if span.status == "error" else {"code": 1},
+                } for span in batch],
+            }],
+        }]}, default=str).encode()
+        request = urllib.request.Request(settings.tracing_otlp_endpoint, data=body,
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            response.read()
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """
+    Lightweight built-in tracing: nested spans tracked with contextvars, so
+    the current span follows the request through sync route handlers and
+    async code. Threads started by the app (stage executors, batch pools)
+    must run with a copied context - see run_in_context().
+
+    Trace context crosses process boundaries as a W3C traceparent string:
+    the upload request injects it into the job payload and the worker
+    continues the same trace, so a slow document can be followed from the
+    upload to every pipeline stage.
+    """
+
+    def __init__(self):
+        self.service_name = settings.tracing_service_name
+        self._exporter = _SpanExporter()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[str] = None, **attributes):
+        """
+        Time the with-block as a child of the current span (or of the
+        traceparent given as parent, or as a new trace). Exceptions mark the
+        span as failed and propagate.
+        """
+        if not settings.tracing_enabled:
+            yield None
+            return
+
+        current = _current_span.get()
+        match = _TRACEPARENT.match(parent) if parent else None
+        if match:
+            trace_id, parent_id, sampled = match.group(1), match.group(2), match.group(3) == "01"
+        elif current is not None:
+            trace_id, parent_id, sampled = current.trace_id, current.span_id, current.sampled
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+            sampled = random.random() < settings.tracing_sample_rate
+
+        span = Span(name, trace_id, parent_id, sampled, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"[:500]
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            if span.sampled:
+                self._exporter.submit(span)
+
+    def current(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def inject(self) -> Optional[str]:
+        """traceparent of the current span, for job payloads and outgoing requests."""
+        span = _current_span.get()
+        return span.traceparent if span else None
+
+    @staticmethod
+    def run_in_context(fn):
+        """Wrap fn to run in a copy of the caller's context, for thread pools and threads."""
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": settings.tracing_enabled,
+            "exporter": settings.tracing_exporter,
+            "exported": self._exporter.exported,
+            "dropped": self._exporter.dropped,
+        }
+
+
+# Global instance
+tracer = Tracer()
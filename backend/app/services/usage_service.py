@@ -6,6 +6,8 @@ from sqlalchemy import func, text
 from app.config import settings
 from app.database import get_db
 from app.models import Document, ChatMessage
+from app.services.dedup_service import dedup_service
+from app.services.llm_cache import llm_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -45,20 +47,20 @@ class UsageService:
         return True
     
     @staticmethod
-    def check_document_count(db: Session, case_id: str = None) -> bool:
-        """Check document count limits"""
+    def check_document_count(db: Session, case_id: str = None, adding: int = 1) -> bool:
+        """Check document count limits for adding `adding` documents"""
         if not settings.demo_mode:
             return True
         
         # Check total documents in system
         total_docs = db.query(Document).count()
-        if total_docs >= settings.max_total_files:
+        if total_docs + adding > settings.max_total_files:
             raise ValueError(f"Maximum total documents ({settings.max_total_files}) reached")
         
         # Check documents per case if case_id provided
         if case_id:
             case_docs = db.query(Document).filter(Document.case_id == case_id).count()
-            if case_docs >= settings.max_files_per_case:
+            if case_docs + adding > settings.max_files_per_case:
                 raise ValueError(f"Maximum documents per case ({settings.max_files_per_case}) reached")
         
         return True
@@ -117,6 +119,8 @@ class UsageService:
                     "limit_mb": settings.max_storage_mb,
                     "percentage": round((total_storage_mb / settings.max_storage_mb) * 100, 1)
                 },
+                "dedup": dedup_service.get_stats(db),
+                "llm_cache": llm_cache.get_stats(),
                 "chat": {
                     "requests_24h": recent_chats,
                     "hourly_limit": settings.max_chat_requests_per_hour,
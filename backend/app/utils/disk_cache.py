@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import threading
+from typing import Callable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    Small persistent key/value cache of JSON documents on local disk.
+    Entries are evicted least-recently-used (by file mtime, refreshed on every
+    hit) once the directory grows past `max_bytes`, and optionally expire after
+    a TTL. Writes are atomic, so several processes can share one directory.
+
+    Size and entry count are running totals: the directory is walked once,
+    then again on each eviction pass, never while holding the lock that
+    get() and set() take. With several processes sharing a directory they
+    are approximate between evictions.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, default_ttl: Optional[float] = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()  # one eviction pass at a time
+        self._total_bytes: Optional[int] = None  # lazily computed from disk
+        self._entry_count = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _iter_entries(self):
+        """Yield (path, size, mtime) for every entry on disk."""
+        if not os.path.isdir(self.directory):
+            return
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _ensure_totals(self):
+        """Count the directory once; the walk happens outside the lock."""
+        if self._total_bytes is not None:
+            return
+        entries = list(self._iter_entries())
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in entries)
+                self._entry_count = len(entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry["value"]
+
+    def set(self, key: str, value: dict, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = {
+            "key": key,
+            "created_at": time.time(),
+            "expires_at": time.time() + ttl if ttl else None,
+            "value": value,
+        }
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Before the write, or the first walk would count this entry twice
+        self._ensure_totals()
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self.writes += 1
+            self._total_bytes += size - previous_size
+            if not previous_size:
+                self._entry_count += 1
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def delete(self, key: str) -> bool:
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+                self._entry_count -= 1
+        return True
+
+    def evict(self, target_ratio: float = 0.9):
+        """Drop least-recently-used entries until the cache is under target_ratio * max_bytes."""
+        if not self._evict_lock.acquire(blocking=False):
+            return  # another thread is already evicting
+        try:
+            entries = sorted(self._iter_entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            count = len(entries)
+            target = self.max_bytes * target_ratio
+            evicted = 0
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    count -= 1
+                    evicted += 1
+                except OSError:
+                    pass
+            with self._lock:
+                self._total_bytes = total
+                self._entry_count = count
+                self.evictions += evicted
+        finally:
+            self._evict_lock.release()
+
+    def clear(self, predicate: Optional[Callable[[str], bool]] = None) -> int:
+        """Delete every entry (or those whose key matches predicate). Returns the count removed."""
+        removed = 0
+        for path, _, _ in list(self._iter_entries()):
+            key = os.path.basename(path)[:-len(".json")]
+            if predicate is None or predicate(key):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        with self._lock:
+            self._total_bytes = None
+        return removed
+
+    def get_stats(self) -> dict:
+        self._ensure_totals()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "entries": self._entry_count,
+                "size_mb": round(self._total_bytes / (1024 * 1024), 2),
+                "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
@@ -1,22 +1,154 @@
+import hashlib
+import os
+import queue
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session
-from app.models import Document, ExtractedEntity
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, ExtractedEntity, UploadBatch
 from app.services.ocr_service import OCRService
 from app.services.storage_service import StorageService
 from app.services.summary_service import SummaryService
 from app.services.extraction_service import ExtractionService
+from app.services.analysis_service import AnalysisService
 from app.services.rag_service import rag_service
+from app.services.document_classifier import document_classifier
+from app.services.progress_bus import progress_bus
+from app.services.stage_checkpoints import stage_checkpoints, fingerprint
+from app.services.extraction_cache import file_sha256
+from app.services.metrics import STAGE_SECONDS, STAGE_FAILURES_TOTAL, DOCUMENT_SECONDS, DOCUMENTS_TOTAL
+from app.services.tracing import tracer
+from app.utils.tokens import count_tokens
 import logging
 
 logger = logging.getLogger(__name__)
 
+_END = object()
+
+
+@contextmanager
+def _stage(name: str, **attributes):
+    """Record a pipeline stage in the stage latency histogram and as a trace span."""
+    with tracer.span(f"stage.{name}", **attributes), STAGE_SECONDS.time(stage=name):
+        yield
+
+
+class ProgressReporter:
+    """
+    Publishes fine-grained progress to the progress bus. The values are also
+    set on the document, but only reach the database with the next commit at
+    a stage boundary - progress alone never costs a write. It only assigns
+    attributes, so an expired document is not reloaded to report progress.
+    """
+
+    def __init__(self, document: Document):
+        self.document = document
+        self.document_id = document.id
+        self.case_id = document.case_id
+        self.details = {
+            "id": str(document.id),
+            "filename": document.filename,
+            "uploaded_at": document.uploaded_at.isoformat() if document.uploaded_at else None,
+        }
+
+    def __call__(self, progress: int, step: str, status: str = "processing"):
+        self.document.processing_status = status
+        self.document.processing_progress = progress
+        self.document.processing_step = step[:100]
+        progress_bus.publish(self.document_id, self.case_id, status, progress, step,
+                             processed=status == "completed", **self.details)
+
+
+def _prefetch(items: Iterator, maxsize: int) -> Iterator:
+    """
+    Run an iterator in a producer thread, at most `maxsize` items ahead of the
+    consumer. The bounded queue is the backpressure: extraction pauses while
+    chunking/embedding catch up. Producer exceptions are re-raised here.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((_END, e))
+            return
+        put((_END, None))
+
+    threading.Thread(target=tracer.run_in_context(produce), daemon=True, name="page-prefetch").start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        # Consumer finished or failed - let the producer exit
+        stop.set()
+
+
+class _PageSpool:
+    """
+    Extracted (page_num, text) pages kept in a temporary file for stages held
+    back while streaming, so replaying them later doesn't hold the document
+    in memory. Iterating is safe from several threads at once.
+    """
+
+    def __init__(self):
+        self.pages = []  # (offset in the file, length, page_num)
+        self._file = tempfile.TemporaryFile(prefix="pages-")
+        self._lock = threading.Lock()
+
+    def add(self, page_num: int, text: str):
+        data = text.encode("utf-8", "surrogatepass")
+        with self._lock:
+            offset = self._file.seek(0, os.SEEK_END)
+            self._file.write(data)
+        self.pages.append((offset, len(data), page_num))
+
+    def __iter__(self) -> Iterator[tuple[int, str]]:
+        for offset, length, page_num in self.pages:
+            with self._lock:
+                self._file.seek(offset)
+                data = self._file.read(length)
+            yield page_num, data.decode("utf-8", "surrogatepass")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
 class DocumentProcessor:
     """
     Orchestrates document processing pipeline:
     1. OCR/Text extraction
     2. Document classification
-    3. AI summarization
-    4. Entity extraction
-    5. Update database
+    3. AI summarization, entity extraction and embeddings (concurrently)
+    4. Update database
+    
+    Progress is published to the progress bus as it happens; the database is
+    only written at stage boundaries and on completion or failure.
     """
     
     def __init__(self):
@@ -24,109 +156,590 @@ class DocumentProcessor:
         self.storage_service = StorageService()
         self.summary_service = SummaryService()
         self.extraction_service = ExtractionService()
+        self.analysis_service = AnalysisService(self.summary_service, self.extraction_service)
     
-    def process_document(self, document: Document, db: Session) -> Document:
+    def process_document(self, document: Document, db: Session, stages: Optional[list[str]] = None) -> Document:
         """
         Process a document through the full pipeline with progress tracking.
+        
+        Every stage is checkpointed with a fingerprint of its inputs and its
+        config version (see stage_checkpoints). With stages=None, stages whose
+        checkpoint is still current are skipped - reprocessing after a prompt
+        change reruns that stage only, never OCR. With an explicit list, exactly
+        those stages are rerun (plus text/classification if they were never run).
+        Long documents needing text extraction go through the page-streaming
+        pipeline instead.
         """
-        try:
-            logger.info(f"Processing document: {document.id}")
-            
-            # Initialize processing
-            document.processing_status = "processing"
-            document.processing_progress = 0
-            document.processing_step = "Starting document processing..."
-            db.commit()
-            
-            # Step 1: Extract text (20% progress)
-            document.processing_step = "Extracting text from document..."
-            document.processing_progress = 10
-            db.commit()
-            
-            extracted_text, page_count = self.ocr_service.extract_text(document.file_path)
-            
-            document.processing_progress = 20
-            db.commit()
-            
-            # Step 2: Classify document (40% progress)
-            document.processing_step = "Classifying document type..."
-            document.processing_progress = 30
-            db.commit()
+        with tracer.span("document.process", document_id=str(document.id), filename=document.filename,
+                         stages=",".join(stages) if stages else "changed") as span:
+            checkpoints = stage_checkpoints.get(db, document.id)
+            content_hash = document.content_hash or file_sha256(document.file_path)
+            text_input = fingerprint(content_hash)
+            run_text = self._should_run("text", stages, checkpoints, text_input) or document.ocr_text is None
+            if run_text and self._should_stream(document):
+                if span is not None:
+                    span.set_attribute("pipeline", "streaming")
+                return self.process_document_streaming(document, db, text_input, stages, checkpoints)
             
-            document_type = self.ocr_service.classify_document(extracted_text)
-            
-            document.processing_progress = 40
+            report_progress = ProgressReporter(document)
+            started = time.perf_counter()
+            try:
+                logger.info(f"Processing document: {document.id}")
+                skipped = []
+                metrics = dict(document.processing_metrics or {})
+                
+                # Initialize processing
+                report_progress(0, "Starting document processing...")
+                db.commit()
+                
+                # Step 1: Extract text
+                if run_text:
+                    report_progress(10, "Extracting text from document...")
+                    with _stage("text"):
+                        extracted_text, page_count, extraction_report = self.ocr_service.extract_text_with_report(
+                            document.file_path, content_hash
+                        )
+                    text_fingerprint = fingerprint(extracted_text)
+                    document.ocr_text = extracted_text
+                    document.page_count = page_count
+                    metrics["extraction"] = extraction_report
+                    # Text with failed OCR pages is kept for now but re-extracted next time
+                    if not extraction_report.get("ocr_error"):
+                        stage_checkpoints.record(db, document.id, "text", text_input, {"output_fingerprint": text_fingerprint})
+                else:
+                    skipped.append("text")
+                    extracted_text = document.ocr_text
+                    text_fingerprint = (checkpoints["text"].details or {}).get("output_fingerprint") \
+                        if "text" in checkpoints else None
+                    text_fingerprint = text_fingerprint or fingerprint(extracted_text)
+                
+                # Step 2: Classify document
+                if self._should_run("classification", stages, checkpoints, text_fingerprint) or not document.document_type:
+                    report_progress(30, "Classifying document type...")
+                    with _stage("classification"):
+                        classification = self.ocr_service.classify_document_with_scores(extracted_text)
+                    document.document_type = classification["document_type"]
+                    metrics["classification"] = classification
+                    stage_checkpoints.record(db, document.id, "classification", text_fingerprint)
+                else:
+                    skipped.append("classification")
+                document_type = document.document_type
+                
+                # Stage boundary: text and classification survive a failed AI stage
+                document.processing_metrics = metrics
+                report_progress(40, "Text extracted and classified")
+                db.commit()
+                
+                # Steps 3-5: summary, entities and embeddings run concurrently (40% -> 100%)
+                document_id = document.id
+                ai_inputs = {
+                    "summary": fingerprint(text_fingerprint, document_type),
+                    "entities": fingerprint(text_fingerprint, document_type),
+                    "embeddings": text_fingerprint,
+                }
+                ai_stages = {
+                    "summary": lambda: self.summary_service.summarize_document(extracted_text, document_type),
+                    "entities": lambda: self.extraction_service.extract_entities(extracted_text, document_type),
+                    "embeddings": lambda: self._embed_document(document_id, extracted_text),
+                }
+                for name in list(ai_stages):
+                    if not self._should_run(name, stages, checkpoints, ai_inputs[name]):
+                        skipped.append(name)
+                        del ai_stages[name]
+                self._combine_analysis(ai_stages, ai_inputs, extracted_text, document_type)
+                stage_metrics = self._run_ai_stages(document, db, report_progress, ai_stages, base_progress=40,
+                                                    fingerprints=ai_inputs) if ai_stages else {}
+                document.processing_metrics = {**metrics, "stages": stage_metrics, "skipped_stages": skipped}
+                entity_count = stage_metrics.get("entities", stage_metrics.get("analysis", {})).get("count", 0)
+                
+                # Mark as completed
+                document.processed = True
+                report_progress(100, "Processing completed successfully", status="completed")
+                db.commit()
+                db.refresh(document)
+                DOCUMENT_SECONDS.observe(time.perf_counter() - started, pipeline="standard", status="completed")
+                DOCUMENTS_TOTAL.inc(status="completed")
+                
+                logger.info(f"Document processed successfully: {document.id} - {entity_count} entities extracted"
+                            + (f", skipped unchanged stages: {', '.join(skipped)}" if skipped else ""))
+                return document
+                
+            except Exception as e:
+                logger.error(f"Error processing document {report_progress.document_id}: {str(e)}")
+                db.rollback()
+                document.processed = False
+                report_progress(document.processing_progress or 0, f"Processing failed: {str(e)}", status="failed")
+                db.commit()
+                DOCUMENT_SECONDS.observe(time.perf_counter() - started, pipeline="standard", status="failed")
+                DOCUMENTS_TOTAL.inc(status="failed")
+                raise
+    
+    @staticmethod
+    def _should_run(stage: str, stages: Optional[list[str]], checkpoints: dict, input_fingerprint: str) -> bool:
+        if stages is not None:
+            return stage in stages
+        return not stage_checkpoints.is_current(checkpoints, stage, input_fingerprint)
+    
+    def process_batch(self, batch_id) -> dict:
+        """
+        Process every unfinished document of an upload batch, settings.batch_concurrency
+        at a time. Running a batch's documents together lets their OCR pages share
+        batched recognizer calls (see ocr_batcher) and their LLM/embedding calls
+        overlap. Each document gets its own session and thread.
+        Documents already processed (e.g. on a retry) are skipped.
+        Raises if any document failed, after all of them have been attempted.
+        """
+        db = SessionLocal()
+        try:
+            batch = db.query(UploadBatch).filter(UploadBatch.id == batch_id).first()
+            if not batch:
+                logger.warning(f"Upload batch {batch_id} no longer exists")
+                return {}
+            batch.status = "processing"
             db.commit()
+            document_ids = [document_id for (document_id,) in db.query(Document.id).filter(
+                Document.batch_id == batch_id,
+                Document.processed == False
+            ).all()]
+        finally:
+            db.close()
+        
+        logger.info(f"Processing batch {batch_id}: {len(document_ids)} documents")
+        failures = {}
+        with ThreadPoolExecutor(max_workers=max(1, settings.batch_concurrency), thread_name_prefix="batch") as executor:
+            futures = {
+                executor.submit(tracer.run_in_context(self._process_by_id), document_id): document_id
+                for document_id in document_ids
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[str(futures[future])] = str(e)
+        
+        db = SessionLocal()
+        try:
+            batch = db.query(UploadBatch).filter(UploadBatch.id == batch_id).first()
+            if batch:
+                failed = db.query(Document).filter(
+                    Document.batch_id == batch_id,
+                    Document.processing_status == "failed"
+                ).count()
+                batch.status = "completed" if not failed else ("failed" if failed == batch.document_count else "partial")
+                batch.completed_at = datetime.utcnow()
+                db.commit()
+        finally:
+            db.close()
+        
+        if failures:
+            raise RuntimeError(f"{len(failures)} of {len(document_ids)} documents in batch {batch_id} failed")
+        return {"documents": len(document_ids)}
+    
+    def _process_by_id(self, document_id):
+        db = SessionLocal()
+        try:
+            document = db.query(Document).filter(Document.id == document_id).first()
+            if document:
+                self.process_document(document, db)
+        finally:
+            db.close()
+    
+    def _run_ai_stages(self, document: Document, db: Session, report_progress: ProgressReporter,
+                       stages: dict, base_progress: int, fingerprints: Optional[dict] = None) -> dict:
+        """
+        Run independent network-bound stages (name -> callable) on a thread pool
+        and persist each result on this thread, with this session, as soon as
+        it finishes. A failing stage is recorded and doesn't cancel the others,
+        so latency is about the slowest stage rather than the sum.
+        fingerprints (name -> input fingerprint) checkpoints each successful stage.
+        Returns per-stage timings and status for processing_metrics.
+        """
+        metrics = {}
+        started = {}
+        start = time.perf_counter()
+        remaining = set(stages)
+        report_progress(base_progress, f"Running {', '.join(sorted(remaining))}...")
+        
+        def timed(name, stage):
+            started[name] = time.perf_counter()
+            with tracer.span(f"stage.{name}", document_id=str(report_progress.document_id)):
+                return stage()
+        
+        with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="ai-stage") as executor:
+            futures = {
+                executor.submit(tracer.run_in_context(timed), name, stage): name
+                for name, stage in stages.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                remaining.discard(name)
+                seconds = time.perf_counter() - started.get(name, start)
+                STAGE_SECONDS.observe(seconds, stage=name)
+                metrics[name] = {"seconds": round(seconds, 3), "status": "ok"}
+                report_progress(
+                    base_progress + (100 - base_progress) * (len(stages) - len(remaining)) // (len(stages) + 1),
+                    f"Running {', '.join(sorted(remaining))}..." if remaining else "Finalizing..."
+                )
+                try:
+                    # Stage boundary: the result and the progress above are committed together
+                    metrics[name].update(self._persist_stage_result(
+                        document, name, future.result(), db, (fingerprints or {}).get(name)
+                    ))
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Stage {name} failed for document {report_progress.document_id}: {str(e)}")
+                    STAGE_FAILURES_TOTAL.inc(stage=name)
+                    metrics[name].update(status="failed", error=str(e))
+        
+        metrics["wall_seconds"] = round(time.perf_counter() - start, 3)
+        return metrics
+    
+    def _combine_analysis(self, ai_stages: dict, fingerprints: dict, text: str, document_type: str):
+        """
+        With combined analysis enabled, replace the summary and entities stages
+        by one "analysis" stage (a single LLM call, see analysis_service). Only
+        when both are due - a lone stale stage keeps its dedicated prompt - and
+        the text fits one summary section; longer documents need the map-reduce summary.
+        """
+        if not (settings.combined_analysis_enabled and "summary" in ai_stages and "entities" in ai_stages):
+            return
+        if count_tokens(text) > settings.summary_section_tokens:
+            return
+        del ai_stages["summary"], ai_stages["entities"]
+        ai_stages["analysis"] = lambda: self.analysis_service.analyze_document(text, document_type)
+        fingerprints["analysis"] = fingerprints["summary"]
+    
+    def _persist_stage_result(self, document: Document, name: str, result, db: Session,
+                              input_fingerprint: Optional[str] = None) -> dict:
+        """
+        Save one stage's output and commit, with its checkpoint when the output
+        is usable (error placeholders and empty results are retried next time).
+        The combined analysis stage is saved as the summary and entities stages.
+        Returns extra metrics for the stage.
+        """
+        if name == "analysis":
+            extra = self._apply_stage_result(document, "summary", result["summary"], db, input_fingerprint)
+            extra.update(self._apply_stage_result(document, "entities", result["entities"], db, input_fingerprint))
+        else:
+            extra = self._apply_stage_result(document, name, result, db, input_fingerprint)
+        db.commit()
+        return extra
+    
+    def _apply_stage_result(self, document: Document, name: str, result, db: Session,
+                            input_fingerprint: Optional[str] = None) -> dict:
+        """Stage output and checkpoint into the session, uncommitted."""
+        extra = {}
+        succeeded = bool(result)
+        if name == "summary":
+            if isinstance(result, dict):
+                extra.update(sections=result["sections"], tokens=result["tokens"])
+                result = result["summary"]
+            succeeded = bool(result) and not result.startswith("[")
+            # A failed summary (placeholder text) doesn't replace a good one from an earlier run
+            if succeeded or not document.summary or document.summary.startswith("["):
+                document.summary = result
+        elif name == "entities":
+            # Extraction errors come back as [] - keep the previous entities rather than wiping them
+            if result:
+                # Replace, don't append - reprocessing used to duplicate every entity
+                db.query(ExtractedEntity).filter(ExtractedEntity.document_id == document.id).delete(synchronize_session=False)
+                # One multi-row INSERT - long charts yield thousands of entities
+                db.execute(insert(ExtractedEntity), [
+                    {
+                        "document_id": document.id,
+                        "entity_type": entity_data["entity_type"],
+                        "entity_value": entity_data["entity_value"],
+                        "confidence": entity_data["confidence"],
+                        "source_location": entity_data.get("source_location"),
+                    }
+                    for entity_data in result
+                ])
+            extra["count"] = len(result)
+        elif name == "embeddings":
+            if result:
+                logger.info(f"Embeddings generated successfully for document: {document.id}")
+            else:
+                logger.warning(f"Failed to generate embeddings for document: {document.id}")
+            extra["stored"] = bool(result)
+        if succeeded and input_fingerprint:
+            stage_checkpoints.record(db, document.id, name, input_fingerprint)
+        elif not succeeded and name != "entities":
+            # Summary/embedding errors come back as values rather than exceptions
+            STAGE_FAILURES_TOTAL.inc(stage=name)
+        return extra
+    
+    def _embed_document(self, document_id, text: str) -> bool:
+        """Embedding stage. Runs on a worker thread, so it uses its own session."""
+        db = SessionLocal()
+        try:
+            rag_service.delete_document_embeddings(document_id, db)
+            return rag_service.add_document_to_vectorstore(document_id, text, db)
+        finally:
+            db.close()
+    
+    def _should_stream(self, document: Document) -> bool:
+        if not settings.streaming_ingest_enabled:
+            return False
+        try:
+            return self.ocr_service.page_count(document.file_path) >= settings.streaming_min_pages
+        except Exception as e:
+            logger.warning(f"Could not count pages of {document.file_path}, not streaming: {e}")
+            return False
+    
+    def process_document_streaming(self, document: Document, db: Session, text_input: Optional[str] = None,
+                                   stages: Optional[list[str]] = None, checkpoints: Optional[dict] = None) -> Document:
+        """
+        Page-streaming pipeline for long documents.
+        Pages flow extraction -> classification -> chunking -> embedding as a
+        generator pipeline, with at most settings.stream_pages_in_flight pages
+        buffered ahead of the embedder. Extracted text is appended to the
+        database and chunks are committed one embedding batch at a time, so
+        memory depends on pages in flight rather than document size, and the
+        first chunks are searchable before the last page is extracted.
+        Summary and entity extraction cover every page: summary sections are
+        summarized as they fill up (see SectionSummarizer) and extraction windows
+        are collected for when the document type is known (see WindowedExtractor).
+        The first settings.stream_head_chars characters are kept for the combined
+        analysis of short documents. text_input is the text stage's input
+        fingerprint, recorded as its checkpoint.
+        
+        stages and checkpoints work as in process_document. A stage whose
+        checkpoint is current for the previous text is held back: pages are
+        spooled to a temporary file (see _PageSpool) and the stage only runs,
+        from the spool, if the finished text or document type turned out
+        different. Re-extracting unchanged text keeps its embeddings, summary
+        and entities.
+        """
+        report_progress = ProgressReporter(document)
+        # Each commit expires the document; reading document.id would reload the row
+        document_id = document.id
+        started = time.perf_counter()
+        summarizer = extractor = spool = None
+        try:
+            logger.info(f"Processing document (streaming): {document_id}")
             
-            # Step 3: Generate summary (60% progress)
-            document.processing_step = "Generating AI summary..."
-            document.processing_progress = 50
+            checkpoints = checkpoints if checkpoints is not None else stage_checkpoints.get(db, document_id)
+            held = self._held_stages(stages, checkpoints, document.document_type)
+            live = {name for name in ("summary", "entities", "embeddings")
+                    if name not in held and (stages is None or name in stages)}
+            page_count = self.ocr_service.page_count(document.file_path)
+            document.page_count = page_count
+            document.ocr_text = ""
+            if "embeddings" in live:
+                rag_service.delete_document_embeddings(document_id, db)
+            report_progress(0, f"Extracting and indexing {page_count} pages...")
             db.commit()
             
-            summary = self.summary_service.generate_document_summary(extracted_text, document_type)
+            report = {}
+            pages = _prefetch(self.ocr_service.iter_pages(document.file_path, report, document.content_hash), settings.stream_pages_in_flight)
+            classifier_state = document_classifier.start()
+            # Section summaries run while the remaining pages are extracted
+            summarizer = self.summary_service.start_summary()
+            extractor = self.extraction_service.start_extraction()
+            # Extraction windows are spooled anyway, so held-back entities need no page spool
+            spool = _PageSpool() if held - {"entities"} else None
+            # digest hashes ocr_text as it is appended, the same as fingerprint(ocr_text)
+            progress = {"pages": 0, "chars": 0, "head": [], "pending": [],
+                        "digest": hashlib.sha256(), "embed_failed": False}
             
-            document.processing_progress = 60
-            db.commit()
+            def observed_pages():
+                head_chars = 0
+                separator = ""
+                for page_num, text in pages:
+                    page_text = f"--- Page {page_num} ---\n{text}"
+                    # Classify the text exactly as stored, so both pipelines agree
+                    document_classifier.feed(classifier_state, separator + page_text)
+                    separator = "\n\n"
+                    if head_chars < settings.stream_head_chars:
+                        progress["head"].append(page_text)
+                        head_chars += len(page_text)
+                    progress["pending"].append(page_text)
+                    if "summary" in live:
+                        summarizer.add(page_text)
+                    if "entities" in live or "entities" in held:
+                        extractor.add(page_text)
+                    if spool is not None:
+                        spool.add(page_num, text)
+                    progress["pages"] = page_num
+                    yield page_num, text
             
-            # Step 4: Extract entities (80% progress)
-            document.processing_step = "Extracting medical entities..."
-            document.processing_progress = 70
-            db.commit()
+            def report_pages():
+                report_progress(5 + int(65 * progress["pages"] / max(page_count, 1)),
+                                f"Extracted and indexed {progress['pages']} of {page_count} pages...")
             
-            entities = self.extraction_service.extract_entities(extracted_text, document_type)
+            chunk_count = 0
+            batch = []
+            if "embeddings" in live:
+                for page_num, chunk in rag_service.iter_page_chunks(observed_pages()):
+                    batch.append((page_num, chunk))
+                    if len(batch) >= settings.embedding_batch_size:
+                        chunk_count += self._flush_stream_batch(document_id, batch, chunk_count, progress, db)
+                        report_pages()
+                        batch = []
+            else:
+                for _ in observed_pages():
+                    if len(progress["pending"]) >= settings.stream_pages_in_flight:
+                        self._flush_stream_batch(document_id, [], 0, progress, db)
+                        report_pages()
+            chunk_count += self._flush_stream_batch(document_id, batch, chunk_count, progress, db)
             
-            document.processing_progress = 80
-            db.commit()
+            classification = document_classifier.result(classifier_state)
+            document_type = classification["document_type"]
+            head_text = "\n\n".join(progress["head"])[:settings.stream_head_chars]
+            if not progress["chars"]:
+                empty_text = (f"[Error processing scanned PDF: {report['ocr_error']}]" if report.get("ocr_error")
+                              else "[No readable text found in scanned PDF]")
+                document.ocr_text = empty_text
+                head_text = empty_text
+                summarizer.add(empty_text)
+                extractor.add(empty_text)
+                text_fingerprint = fingerprint(empty_text)
+            else:
+                progress["digest"].update(b"\0")
+                text_fingerprint = progress["digest"].hexdigest()
             
-            # Update document record
-            document.ocr_text = extracted_text
-            document.page_count = page_count
             document.document_type = document_type
-            document.summary = summary
-            
-            # Save extracted entities
-            for entity_data in entities:
-                entity = ExtractedEntity(
-                    document_id=document.id,
-                    entity_type=entity_data["entity_type"],
-                    entity_value=entity_data["entity_value"],
-                    confidence=entity_data["confidence"],
-                    source_location=entity_data.get("source_location")
-                )
-                db.add(entity)
-            
-            db.commit()
-            
-            # Step 5: Generate embeddings for RAG (100% progress)
-            document.processing_step = "Generating embeddings for AI search..."
-            document.processing_progress = 90
+            if text_input and not report.get("ocr_error"):
+                stage_checkpoints.record(db, document_id, "text", text_input, {"output_fingerprint": text_fingerprint})
+            stage_checkpoints.record(db, document_id, "classification", text_fingerprint)
+            if "embeddings" in live and chunk_count and not progress["embed_failed"]:
+                stage_checkpoints.record(db, document_id, "embeddings", text_fingerprint)
+            report_progress(70, f"Extracted and indexed {page_count} pages")
             db.commit()
+            ai_input = fingerprint(text_fingerprint, document_type)
+            ai_inputs = {"summary": ai_input, "entities": ai_input, "embeddings": text_fingerprint}
+            ai_stages = {
+                "summary": lambda: summarizer.finish(document_type),
+                "entities": lambda: extractor.finish(document_type),
+            }
+            if "summary" in held and progress["chars"]:
+                # Without text the live summarizer already holds the placeholder
+                ai_stages["summary"] = lambda: self._summarize_pages(spool, document_type)
+            if "embeddings" in held:
+                ai_stages["embeddings"] = lambda: self._embed_pages(document_id, spool)
+            skipped = []
+            for name in list(ai_stages):
+                unchanged = name in held and stage_checkpoints.is_current(checkpoints, name, ai_inputs[name])
+                if unchanged or (name not in live and name not in held):
+                    skipped.append(name)
+                    del ai_stages[name]
+            if not summarizer.started and progress["chars"] <= settings.stream_head_chars:
+                # The whole text is in the head: one combined call can serve both stages
+                self._combine_analysis(ai_stages, ai_inputs, head_text, document_type)
+            if "summary" not in ai_stages:
+                summarizer.close()
+            if "entities" not in ai_stages:
+                extractor.close()
+            stage_metrics = self._run_ai_stages(document, db, report_progress, ai_stages, base_progress=70,
+                                                fingerprints=ai_inputs) if ai_stages else {}
+            entity_count = stage_metrics.get("entities", stage_metrics.get("analysis", {})).get("count", 0)
             
-            try:
-                embedding_success = rag_service.add_document_to_vectorstore(document.id, extracted_text, db)
-                if embedding_success:
-                    logger.info(f"Embeddings generated successfully for document: {document.id}")
-                else:
-                    logger.warning(f"Failed to generate embeddings for document: {document.id}")
-            except Exception as e:
-                logger.error(f"Error generating embeddings for document {document.id}: {str(e)}")
-                # Don't fail the entire process if embedding generation fails
+            document.processing_metrics = {
+                "extraction": report,
+                "classification": classification,
+                "streaming": {"chunks": chunk_count, "chars": progress["chars"]},
+                "stages": stage_metrics,
+                "skipped_stages": skipped,
+            }
             
-            # Mark as completed
             document.processed = True
-            document.processing_status = "completed"
-            document.processing_progress = 100
-            document.processing_step = "Processing completed successfully"
+            report_progress(100, "Processing completed successfully", status="completed")
             db.commit()
             db.refresh(document)
+            DOCUMENT_SECONDS.observe(time.perf_counter() - started, pipeline="streaming", status="completed")
+            DOCUMENTS_TOTAL.inc(status="completed")
             
-            logger.info(f"Document processed successfully: {document.id} - {len(entities)} entities extracted")
+            logger.info(f"Document streamed successfully: {document_id} - {page_count} pages, "
+                        f"{chunk_count} chunks, {entity_count} entities extracted"
+                        + (f", skipped unchanged stages: {', '.join(skipped)}" if skipped else ""))
             return document
             
         except Exception as e:
-            logger.error(f"Error processing document {document.id}: {str(e)}")
+            logger.error(f"Error processing document {document_id}: {str(e)}")
+            if summarizer is not None:
+                summarizer.close()
+            if extractor is not None:
+                extractor.close()
+            db.rollback()
             document.processed = False
-            document.processing_status = "failed"
-            document.processing_step = f"Processing failed: {str(e)}"
+            report_progress(document.processing_progress or 0, f"Processing failed: {str(e)}", status="failed")
             db.commit()
+            DOCUMENT_SECONDS.observe(time.perf_counter() - started, pipeline="streaming", status="failed")
+            DOCUMENTS_TOTAL.inc(status="failed")
             raise
+        finally:
+            if spool is not None:
+                spool.close()
+    
+    @staticmethod
+    def _held_stages(stages: Optional[list[str]], checkpoints: dict, document_type: Optional[str]) -> set:
+        """
+        AI stages that are current for the text extracted last time. Whether
+        they must rerun is only known once the new text is complete.
+        """
+        previous = (checkpoints["text"].details or {}).get("output_fingerprint") if "text" in checkpoints else None
+        if stages is not None or not previous:
+            return set()
+        inputs = {
+            "summary": fingerprint(previous, document_type),
+            "entities": fingerprint(previous, document_type),
+            "embeddings": previous,
+        }
+        return {name for name, input_fingerprint in inputs.items()
+                if stage_checkpoints.is_current(checkpoints, name, input_fingerprint)}
+    
+    def _summarize_pages(self, spool: "_PageSpool", document_type: str) -> dict:
+        """Summary stage over spooled pages (held back while streaming)."""
+        summarizer = self.summary_service.start_summary()
+        for page_num, text in spool:
+            summarizer.add(f"--- Page {page_num} ---\n{text}")
+        return summarizer.finish(document_type)
+    
+    def _embed_pages(self, document_id, spool: "_PageSpool") -> bool:
+        """Embedding stage over spooled pages. Runs on a worker thread, so it uses its own session."""
+        db = SessionLocal()
+        try:
+            rag_service.delete_document_embeddings(document_id, db)
+            db.commit()
+            stored = 0
+            batch = []
+            for page_num, chunk in rag_service.iter_page_chunks(spool):
+                batch.append((page_num, chunk))
+                if len(batch) >= settings.embedding_batch_size:
+                    stored += rag_service.add_chunk_batch(document_id, batch, stored, db)
+                    batch = []
+            stored += rag_service.add_chunk_batch(document_id, batch, stored, db)
+            return stored > 0
+        finally:
+            db.close()
+    
+    def _flush_stream_batch(self, document_id, batch: list, first_index: int,
+                            progress: dict, db: Session) -> int:
+        """Append the pages read so far to ocr_text, then store one batch of chunks (if any)."""
+        if progress["pending"]:
+            text = "\n\n".join(progress["pending"])
+            if progress["chars"]:
+                text = "\n\n" + text
+            # Append in SQL so the full text never has to be loaded back into memory
+            # (ocr_text is deferred, so the commit's expiry doesn't reload it either)
+            db.query(Document).filter(Document.id == document_id).update(
+                {Document.ocr_text: func.coalesce(Document.ocr_text, "") + text},
+                synchronize_session=False
+            )
+            db.commit()
+            progress["digest"].update(text.encode("utf-8", "surrogatepass"))
+            progress["chars"] += len(text)
+            progress["pending"] = []
+        if not batch:
+            return 0
+        
+        try:
+            with _stage("embedding_batch", chunks=len(batch)):
+                return rag_service.add_chunk_batch(document_id, batch, first_index, db)
+        except Exception as e:
+            logger.error(f"Error generating embeddings for document {document_id}: {str(e)}")
+            db.rollback()
+            progress["embed_failed"] = True
+            STAGE_FAILURES_TOTAL.inc(stage="embeddings")
+            # Don't fail the entire process if embedding generation fails
+            return 0
@@ -0,0 +1,139 @@
+import time
+from typing import Optional
+import logging
+
+import numpy as np
+from PIL import Image
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Size of the thumbnail used for blank detection, text height and skew estimates
+_ANALYSIS_WIDTH = 800
+
+
+def to_grayscale(image: np.ndarray) -> np.ndarray:
+    """Convert an RGB(A) or grayscale array to 8-bit grayscale."""
+    if image.ndim == 2:
+        return image.astype(np.uint8, copy=False)
+    rgb = image[..., :3].astype(np.float32)
+    gray = rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+    return gray.astype(np.uint8)
+
+
+def _ink_mask(gray: np.ndarray) -> np.ndarray:
+    """Pixels noticeably darker than the page background."""
+    background = np.median(gray)
+    return gray < max(0, background - 50)
+
+
+def _estimate_text_height(ink: np.ndarray) -> Optional[float]:
+    """
+    Median height of runs of consecutive rows containing ink - roughly the
+    height of a line of text - in pixels of the given mask.
+    """
+    row_has_ink = ink.mean(axis=1) > 0.005
+    runs = []
+    run = 0
+    for has_ink in row_has_ink:
+        if has_ink:
+            run += 1
+        elif run:
+            runs.append(run)
+            run = 0
+    if run:
+        runs.append(run)
+    runs = [r for r in runs if r >= 2]
+    return float(np.median(runs)) if runs else None
+
+
+def _estimate_skew(ink: np.ndarray, max_degrees: float, step: float = 0.5) -> float:
+    """
+    Find the rotation that makes text rows sharpest: the angle maximizing the
+    variance of the horizontal projection profile.
+    """
+    mask_image = Image.fromarray((ink * 255).astype(np.uint8))
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-max_degrees, max_degrees + step / 2, step):
+        rotated = np.asarray(mask_image.rotate(float(angle), resample=Image.NEAREST, fillcolor=0))
+        score = float(np.var(rotated.sum(axis=1, dtype=np.float64)))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def normalize_for_ocr(image: np.ndarray) -> tuple[Optional[np.ndarray], dict]:
+    """
+    Prepare a page image for OCR:
+    - convert to grayscale
+    - detect blank / near-blank pages (returns None so recognition is skipped)
+    - deskew small rotations
+    - rescale so text lands near settings.ocr_target_text_height_px, capped
+      at settings.ocr_max_megapixels; pages are only enlarged up to
+      settings.ocr_max_upscale (by default never, since more pixels means
+      slower OCR)
+
+    Returns (normalized image or None if blank, info dict).
+    """
+    start = time.perf_counter()
+    height, width = image.shape[:2]
+    info = {
+        "pixels_original": int(height * width),
+        "pixels_processed": 0,
+        "blank": False,
+        "scale": 1.0,
+        "skew_degrees": 0.0,
+        "text_height_px": None,
+    }
+
+    gray = to_grayscale(image)
+
+    # Analyze a thumbnail - full-resolution analysis would cost more than it saves
+    analysis_scale = min(1.0, _ANALYSIS_WIDTH / width)
+    if analysis_scale < 1.0:
+        thumbnail = np.asarray(Image.fromarray(gray).resize(
+            (max(1, int(width * analysis_scale)), max(1, int(height * analysis_scale))), Image.BILINEAR
+        ))
+    else:
+        thumbnail = gray
+    ink = _ink_mask(thumbnail)
+
+    if ink.mean() < settings.ocr_blank_ink_ratio or float(thumbnail.std()) < 4.0:
+        info["blank"] = True
+        info["seconds"] = round(time.perf_counter() - start, 4)
+        return None, info
+
+    result = Image.fromarray(gray)
+
+    if settings.ocr_deskew_max_degrees > 0:
+        angle = _estimate_skew(ink, settings.ocr_deskew_max_degrees)
+        if abs(angle) >= 0.5:
+            result = result.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+            ink = np.asarray(Image.fromarray((ink * 255).astype(np.uint8)).rotate(
+                angle, resample=Image.NEAREST, expand=True, fillcolor=0)) > 127
+            info["skew_degrees"] = angle
+
+    scale = 1.0
+    text_height = _estimate_text_height(ink)
+    if text_height:
+        text_height /= analysis_scale  # back to full-resolution pixels
+        info["text_height_px"] = round(text_height, 1)
+        scale = settings.ocr_target_text_height_px / text_height
+        scale = min(scale, settings.ocr_max_upscale)
+
+    max_pixels = settings.ocr_max_megapixels * 1_000_000
+    if result.width * result.height * scale * scale > max_pixels:
+        scale = (max_pixels / (result.width * result.height)) ** 0.5
+
+    if abs(scale - 1.0) > 0.05:
+        result = result.resize(
+            (max(1, int(result.width * scale)), max(1, int(result.height * scale))),
+            Image.LANCZOS if scale < 1.0 else Image.BICUBIC,
+        )
+        info["scale"] = round(scale, 3)
+
+    normalized = np.asarray(result)
+    info["pixels_processed"] = int(normalized.shape[0] * normalized.shape[1])
+    info["seconds"] = round(time.perf_counter() - start, 4)
+    return normalized, info
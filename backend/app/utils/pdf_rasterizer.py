@@ -0,0 +1,46 @@
+from typing import Iterator
+from pdf2image import convert_from_path
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _page_windows(page_numbers: list[int], window: int) -> Iterator[list[int]]:
+    """Group sorted page numbers into runs of consecutive pages, at most `window` long."""
+    run: list[int] = []
+    for page_num in sorted(page_numbers):
+        if run and (page_num != run[-1] + 1 or len(run) >= window):
+            yield run
+            run = []
+        run.append(page_num)
+    if run:
+        yield run
+
+
+def iter_pdf_page_images(file_path: str, page_numbers: list[int], dpi: int = 200,
+                         window: int = 4) -> Iterator[tuple[int, np.ndarray]]:
+    """
+    Rasterize PDF pages lazily, `window` pages at a time, using pdf2image's
+    first_page/last_page. Yields (page_num, RGB numpy array) so callers can hand
+    pages straight to EasyOCR without encoding to a temp file.
+
+    At most `window` rasterized pages are held at once, however long the PDF is.
+    """
+    window = max(1, window)
+    for run in _page_windows(page_numbers, window):
+        images = convert_from_path(file_path, dpi=dpi, first_page=run[0], last_page=run[-1])
+        try:
+            for page_num, image in zip(run, images):
+                yield page_num, np.asarray(image.convert("RGB"))
+        finally:
+            for image in images:
+                image.close()
+            del images
+
+
+def rasterize_pdf_page(file_path: str, page_num: int, dpi: int = 200) -> np.ndarray:
+    """Rasterize a single PDF page to an RGB numpy array."""
+    for _, image in iter_pdf_page_images(file_path, [page_num], dpi=dpi, window=1):
+        return image
+    raise ValueError(f"Page {page_num} could not be rasterized from {file_path}")
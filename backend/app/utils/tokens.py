@@ -0,0 +1,78 @@
+import re
+from functools import lru_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")  # gpt-4o family
+    except Exception as e:
+        # The BPE file is downloaded on first use; estimate offline instead
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in text for gpt-4o models (about 4 characters per token without tiktoken)."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_to_budget(text: str, max_tokens: int) -> list[str]:
+    """
+    Split text into paragraphs, cutting any paragraph longer than max_tokens
+    into pieces that fit (on line breaks where possible).
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        if not paragraph.strip():
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        piece = ""
+        for line in paragraph.split("\n"):
+            candidate = f"{piece}\n{line}" if piece else line
+            if piece and count_tokens(candidate) > max_tokens:
+                pieces.append(piece)
+                candidate = line
+            # A single line over budget (OCR without line breaks) is cut by length
+            while count_tokens(candidate) > max_tokens:
+                cut = max(1, len(candidate) * max_tokens // count_tokens(candidate))
+                # Token density varies along a line: shrink until the piece fits
+                while cut > 1 and count_tokens(candidate[:cut]) > max_tokens:
+                    cut = max(1, cut * 9 // 10)
+                pieces.append(candidate[:cut])
+                candidate = candidate[cut:]
+            piece = candidate
+        if piece:
+            pieces.append(piece)
+    return pieces
+
+
+def pack_to_budget(pieces: list[str], max_tokens: int) -> list[str]:
+    """Join consecutive pieces into groups of at most max_tokens each."""
+    groups, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
@@ -0,0 +1,83 @@
+import os
+import zipfile
+import zlib
+import logging
+
+from app.config import settings
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+class BatchTooLarge(ValueError):
+    """The batch as a whole is over its file-count or byte budget."""
+
+
+def save_zip_members(storage: StorageService, fileobj, allowed_extensions: list[str],
+                     max_file_bytes: int, budget_bytes: int, max_files: int) -> tuple[list[dict], list[dict]]:
+    """
+    Stream the supported files of a ZIP archive into storage, one chunk at a time.
+    Blocking - run it in a thread from async code.
+
+    Safety limits: member names are never used as paths (stored files get
+    generated names), directories/hidden/__MACOSX entries and encrypted
+    members are skipped, members claiming a compression ratio above
+    settings.batch_zip_max_ratio are rejected as zip bombs, and sizes are
+    enforced on the bytes actually decompressed, not the header's claims.
+
+    Returns (saved, rejected): saved entries are {"filename", "file_path",
+    "file_size", "content_hash"}, rejected are {"filename", "reason"}.
+    Members that can't be decompressed (unsupported method, corrupt data)
+    are rejected. Raises BatchTooLarge if the archive exceeds max_files or
+    budget_bytes; on that and any other exception, files already saved are
+    attached as the exception's .saved for cleanup.
+    """
+    saved, rejected = [], []
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                    continue
+                extension = os.path.splitext(name)[1].lower()
+                if extension not in allowed_extensions:
+                    rejected.append({"filename": name, "reason": "File type not supported"})
+                    continue
+                if info.flag_bits & 0x1:
+                    rejected.append({"filename": name, "reason": "Encrypted ZIP member"})
+                    continue
+                if info.file_size > max_file_bytes:
+                    rejected.append({"filename": name, "reason": f"Exceeds {settings.max_file_size_mb}MB"})
+                    continue
+                if info.compress_size and info.file_size / info.compress_size > settings.batch_zip_max_ratio:
+                    rejected.append({"filename": name, "reason": "Suspicious compression ratio"})
+                    continue
+                if len(saved) >= max_files:
+                    raise BatchTooLarge(f"Batch exceeds maximum of {max_files} files")
+
+                limit = min(max_file_bytes, budget_bytes)
+                try:
+                    with archive.open(info) as member:
+                        file_path, file_size, content_hash = storage.save_fileobj(member, extension, limit)
+                except ValueError:
+                    if limit < max_file_bytes:
+                        raise BatchTooLarge(f"Batch exceeds maximum of {settings.batch_max_total_mb}MB")
+                    rejected.append({"filename": name, "reason": f"Exceeds {settings.max_file_size_mb}MB"})
+                    continue
+                except NotImplementedError:
+                    # e.g. deflate64 or another method zipfile can't decompress
+                    rejected.append({"filename": name, "reason": "Unsupported ZIP compression method"})
+                    continue
+                except (zlib.error, zipfile.BadZipFile, EOFError):
+                    rejected.append({"filename": name, "reason": "Corrupt ZIP member"})
+                    continue
+                budget_bytes -= file_size
+                saved.append({"filename": name, "file_path": file_path,
+                              "file_size": file_size, "content_hash": content_hash})
+    except zipfile.BadZipFile:
+        rejected.append({"filename": getattr(fileobj, "name", "archive"), "reason": "Not a valid ZIP archive"})
+    except BaseException as e:
+        # The caller only knows about files from earlier uploads; hand it these too
+        e.saved = saved
+        raise
+    return saved, rejected
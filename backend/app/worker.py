@@ -0,0 +1,183 @@
+"""
+Standalone document processing worker.
+
+Leases jobs from the Postgres job queue and runs them outside the API
+process, so OCR/LLM work can be scaled separately and survives API restarts.
+
+Usage:
+    python -m app.worker                    # one worker
+    python -m app.worker --id ocr-1         # explicit worker id (default: host:pid)
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+import logging
+
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.models import Document
+from app.services.job_queue import job_queue, PROCESS_DOCUMENT, PROCESS_BATCH
+from app.services.metrics import start_metrics_server
+from app.services.pdf_text_backends import get_text_backend
+from app.services.tracing import tracer
+from app.utils.document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def process_document_job(job) -> None:
+    """Run the processing pipeline for a job's document. Raises on failure so the job is retried."""
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == job.document_id).first()
+        if not document:
+            logger.warning(f"Document {job.document_id} for job {job.id} no longer exists, skipping")
+            return
+        DocumentProcessor().process_document(document, db, (job.payload or {}).get("stages"))
+    finally:
+        db.close()
+
+
+def process_batch_job(job) -> None:
+    """Process an upload batch's documents together. Raises if any failed; a retry skips finished ones."""
+    DocumentProcessor().process_batch(job.payload["batch_id"])
+
+
+# job_type -> handler(job)
+JOB_HANDLERS = {
+    PROCESS_DOCUMENT: process_document_job,
+    PROCESS_BATCH: process_batch_job,
+}
+
+
+class Worker:
+    """
+    Poll loop: lease a job, run its handler while a heartbeat thread keeps the
+    lease alive, then mark it completed or failed. Stops between jobs.
+    """
+
+    def __init__(self, worker_id: str = None, job_types: list[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.job_types = job_types or list(JOB_HANDLERS)
+        self._stop = threading.Event()
+        self._last_recovery = 0.0
+
+    def stop(self):
+        self._stop.set()
+
+    def run_forever(self):
+        logger.info(f"Worker {self.worker_id} started for jobs: {', '.join(self.job_types)}")
+        while not self._stop.is_set():
+            try:
+                self._recover_periodically()
+                if not self.run_once():
+                    self._stop.wait(settings.job_poll_interval_seconds)
+            except Exception as e:
+                # Database hiccup etc. - back off and keep the worker alive
+                logger.error(f"Worker {self.worker_id} loop error: {e}")
+                self._stop.wait(settings.job_poll_interval_seconds * 5)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def run_once(self) -> bool:
+        """Lease and run a single job. Returns False if the queue had nothing ready."""
+        db = SessionLocal()
+        try:
+            job = job_queue.lease(db, self.worker_id, self.job_types)
+            if not job:
+                return False
+            db.expunge(job)
+        finally:
+            db.close()
+
+        logger.info(f"Worker {self.worker_id} running {job.job_type} job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job.id, done), daemon=True, name=f"heartbeat-{job.id}")
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            # Continue the trace of the request that enqueued the job
+            with tracer.span(f"job.{job.job_type}", parent=(job.payload or {}).get("traceparent"),
+                             job_id=str(job.id), attempt=job.attempts, worker_id=self.worker_id):
+                JOB_HANDLERS[job.job_type](job)
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.debug(traceback.format_exc())
+        finally:
+            done.set()
+            heartbeat.join()
+
+        db = SessionLocal()
+        try:
+            if error is None:
+                job_queue.complete(db, job.id, self.worker_id)
+                logger.info(f"Job {job.id} completed in {time.perf_counter() - start:.1f}s")
+            else:
+                job_queue.fail(db, job.id, self.worker_id, error)
+        finally:
+            db.close()
+        return True
+
+    def _heartbeat(self, job_id, done: threading.Event):
+        while not done.wait(settings.job_heartbeat_seconds):
+            db = SessionLocal()
+            try:
+                if not job_queue.heartbeat(db, job_id, self.worker_id):
+                    logger.warning(f"Worker {self.worker_id} lost the lease on job {job_id}")
+                    return
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+            finally:
+                db.close()
+
+    def _recover_periodically(self):
+        if time.monotonic() - self._last_recovery < settings.job_lease_seconds:
+            return
+        self._last_recovery = time.monotonic()
+        db = SessionLocal()
+        try:
+            job_queue.recover_stuck(db)
+        finally:
+            db.close()
+
+
+def start_embedded_worker() -> Worker:
+    """Run a worker thread inside the current (API) process."""
+    worker = Worker(worker_id=f"{socket.gethostname()}:{os.getpid()}:embedded")
+    threading.Thread(target=worker.run_forever, name="job-worker", daemon=True).start()
+    return worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document processing worker")
+    parser.add_argument("--id", default=None, help="Worker id (default: host:pid)")
+    parser.add_argument("--job-types", nargs="+", default=None, help=f"Job types to run (default: {', '.join(JOB_HANDLERS)})")
+    parser.add_argument("--metrics-port", type=int, default=settings.worker_metrics_port,
+                        help="Port for this worker's /metrics (0 disables)")
+    args = parser.parse_args()
+
+    init_db()
+    get_text_backend()  # fail fast if the configured PDF text backend isn't installed
+    tracer.service_name = f"{settings.tracing_service_name}-worker"
+    if settings.metrics_enabled and args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    worker = Worker(worker_id=args.id, job_types=args.job_types)
+
+    # Finish the current job on SIGTERM (deploys) instead of abandoning it
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}, stopping after the current job")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    main()
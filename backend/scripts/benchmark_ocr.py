@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark scanned-PDF OCR throughput (pages/second) on CPU: in-process
+per-page OCR, batched OCR at several batch sizes, and the process pool at
+several worker counts.
+
+Every page is forced through the OCR path, even if the PDF has a text layer.
+
+Usage:
+    python scripts/benchmark_ocr.py                      # sample_data PDFs, all modes
+    python scripts/benchmark_ocr.py --workers 1 2 8 --batch-sizes 4 8 --repeat 3 path/to/a.pdf
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import glob
+import time
+import logging
+
+import PyPDF2
+from app.config import settings
+from app.services.ocr_registry import ocr_registry
+from app.services.ocr_pool import OCRProcessPool, prepare_page_image
+from app.services.ocr_batcher import OCRBatcher
+from app.utils.pdf_rasterizer import iter_pdf_page_images
+from app.services.ocr_service import OCRService
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_data")
+
+
+def count_pages(file_path: str) -> int:
+    with open(file_path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def run_serial(files: list[str], repeat: int) -> tuple[int, float]:
+    """Baseline: the in-process serial OCR path."""
+    ocr_service = OCRService()
+    ocr_registry.preload()  # Don't count model load time
+
+    pages = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_path in files:
+            page_numbers = list(range(1, count_pages(file_path) + 1))
+            pages += len(ocr_service._ocr_pages_serial(file_path, page_numbers))
+    return pages, time.perf_counter() - start
+
+
+def run_batched(files: list[str], batch_size: int, repeat: int) -> tuple[int, float]:
+    """Pages go through OCRBatcher; rasterization keeps one batch worth of pages in flight."""
+    batcher = OCRBatcher(batch_size=batch_size, max_wait_ms=50)
+    ocr_registry.preload()
+
+    pages = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_path in files:
+            page_numbers = list(range(1, count_pages(file_path) + 1))
+            futures = []
+            for _, image in iter_pdf_page_images(file_path, page_numbers, dpi=settings.ocr_dpi, window=batch_size):
+                # Same preprocessing as the per-page path so the comparison is fair
+                image, _ = prepare_page_image(image)
+                if image is None:
+                    pages += 1
+                    continue
+                futures.append(batcher.submit(image))
+                if len(futures) >= batch_size:
+                    pages += sum(1 for future in futures if future.result() is not None)
+                    futures = []
+            pages += sum(1 for future in futures if future.result() is not None)
+    return pages, time.perf_counter() - start
+
+
+def run_process_pool(files: list[str], workers: int, repeat: int) -> tuple[int, float]:
+    pool = OCRProcessPool(workers=workers)
+    try:
+        # Warm up every worker so model load time isn't counted
+        pool.ocr_pdf_pages(files[0], [1] * workers, settings.ocr_dpi)
+
+        pages = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for file_path in files:
+                page_numbers = list(range(1, count_pages(file_path) + 1))
+                pages += len(pool.ocr_pdf_pages(file_path, page_numbers, settings.ocr_dpi))
+        return pages, time.perf_counter() - start
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scanned-PDF OCR throughput")
+    parser.add_argument("files", nargs="*", help="PDF files (default: sample_data/*.pdf)")
+    parser.add_argument("--workers", nargs="+", type=int,
+                        default=[1, 2, 4, os.cpu_count() or 1],
+                        help="Process pool sizes to benchmark")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[4, 8],
+                        help="Batched OCR sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the file set per run")
+    parser.add_argument("--skip-serial", action="store_true", help="Skip the in-process per-page baseline")
+    parser.add_argument("--skip-batched", action="store_true", help="Skip batched OCR runs")
+    parser.add_argument("--skip-process", action="store_true", help="Skip process pool runs")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(SAMPLE_DATA_DIR, "*.pdf")))
+    if not files:
+        print("No PDF files found")
+        return 1
+    if not ocr_registry.available:
+        print("EasyOCR is not installed - nothing to benchmark")
+        return 1
+
+    total_pages = sum(count_pages(f) for f in files)
+    print(f"Benchmarking {len(files)} file(s), {total_pages} page(s) x {args.repeat} pass(es), dpi={settings.ocr_dpi}\n")
+    print(f"{'mode':<16}{'pages':>8}{'seconds':>10}{'pages/s':>10}")
+
+    if not args.skip_serial:
+        pages, seconds = run_serial(files, args.repeat)
+        print(f"{'per-page':<16}{pages:>8}{seconds:>10.2f}{pages / seconds:>10.2f}")
+
+    if not args.skip_batched:
+        for batch_size in sorted(set(args.batch_sizes)):
+            pages, seconds = run_batched(files, batch_size, args.repeat)
+            print(f"{f'batched x{batch_size}':<16}{pages:>8}{seconds:>10.2f}{pages / seconds:>10.2f}")
+
+    if not args.skip_process:
+        for workers in sorted(set(args.workers)):
+            pages, seconds = run_process_pool(files, workers, args.repeat)
+            print(f"{f'process x{workers}':<16}{pages:>8}{seconds:>10.2f}{pages / seconds:>10.2f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
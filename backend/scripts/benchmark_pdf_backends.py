@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark PDF text-layer backends over a corpus: pages/second and how closely
+each backend's text agrees with a reference backend.
+
+Agreement is the word-level overlap (Dice coefficient over word counts) with
+the reference, averaged over pages - 1.0 means the same words on every page.
+
+Usage:
+    python scripts/benchmark_pdf_backends.py                         # sample_data PDFs
+    python scripts/benchmark_pdf_backends.py /data/records --reference pdfminer --repeat 3
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import glob
+import re
+import time
+from collections import Counter
+import logging
+
+from app.services.pdf_text_backends import TEXT_BACKENDS, available_text_backends
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_data")
+WORD = re.compile(r"\w+")
+
+
+def find_pdfs(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths or [SAMPLE_DATA_DIR]:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "**", "*.pdf"), recursive=True))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def word_agreement(text: str, reference: str) -> float:
+    words, reference_words = Counter(WORD.findall(text.lower())), Counter(WORD.findall(reference.lower()))
+    total = sum(words.values()) + sum(reference_words.values())
+    if total == 0:
+        return 1.0
+    return 2 * sum((words & reference_words).values()) / total
+
+
+def run_backend(name: str, files: list[str], repeat: int) -> tuple[dict, int, float, int]:
+    """Returns ({file: [page texts]}, pages, seconds, failures)."""
+    backend = TEXT_BACKENDS[name]
+    texts = {}
+    pages = 0
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for file_path in files:
+            try:
+                texts[file_path] = list(backend.iter_pages(file_path))
+                pages += len(texts[file_path])
+            except Exception as e:
+                logger.warning(f"{name} failed on {file_path}: {e}")
+                failures += 1
+    return texts, pages, time.perf_counter() - start, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF text-layer backends")
+    parser.add_argument("paths", nargs="*", help="PDF files or directories (default: sample_data/)")
+    parser.add_argument("--backends", nargs="+", default=None, help="Backends to compare (default: all installed)")
+    parser.add_argument("--reference", default="pypdf2", help="Backend whose output agreement is measured against")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the corpus per backend")
+    args = parser.parse_args()
+
+    files = find_pdfs(args.paths)
+    if not files:
+        print("No PDF files found")
+        return 1
+
+    backends = args.backends or available_text_backends()
+    missing = [name for name in backends if name not in TEXT_BACKENDS or not TEXT_BACKENDS[name].available()]
+    if missing:
+        print(f"Not installed / unknown: {', '.join(missing)}")
+        backends = [name for name in backends if name not in missing]
+    if args.reference not in backends:
+        backends.append(args.reference)
+
+    print(f"Corpus: {len(files)} PDF(s), {args.repeat} pass(es), reference={args.reference}\n")
+
+    results = {name: run_backend(name, files, args.repeat) for name in backends}
+    reference_texts = results[args.reference][0]
+
+    print(f"{'backend':<12}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'agreement':>11}{'failures':>10}")
+    for name, (texts, pages, seconds, failures) in results.items():
+        scores = []
+        for file_path, page_texts in texts.items():
+            reference_pages = reference_texts.get(file_path)
+            if reference_pages is None:
+                continue
+            for page_text, reference_text in zip(page_texts, reference_pages):
+                scores.append(word_agreement(page_text, reference_text))
+        agreement = sum(scores) / len(scores) if scores else 0.0
+        rate = pages / seconds if seconds else 0.0
+        print(f"{name:<12}{pages:>8}{seconds:>10.2f}{rate:>10.1f}{agreement:>11.3f}{failures:>10}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
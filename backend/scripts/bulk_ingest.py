@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Bulk-ingest existing documents for migrations and backfills, without going
+through the HTTP upload route.
+
+Files come from directories (walked recursively) or a CSV manifest with
+`path` and optional `case` columns. Cases are found or created by name. Each
+file is copied into upload storage, registered as a Document and run through
+the DocumentProcessor on a pool of worker threads. Identical files that were
+already processed are deduplicated, as they are on upload.
+
+Progress is appended to a checkpoint file (JSONL, one line per state change),
+so rerunning the same command after an interruption skips finished files and
+reuses the documents already created for unfinished ones.
+
+At the end it prints docs/s, pages/s, each stage's share of the summed stage
+time, and the failures.
+
+Documents are processed in this process, not through the job queue. Stop
+queue workers during long runs: their stuck-document recovery would also
+pick up documents this script is still processing.
+
+Usage:
+    python scripts/bulk_ingest.py /data/records --case "Records backfill"
+    python scripts/bulk_ingest.py /data/records --case-per-dir --workers 8
+    python scripts/bulk_ingest.py --manifest files.csv --report report.json
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import csv
+import json
+import mimetypes
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+
+from app.config import settings
+from app.database import SessionLocal, init_db
+from app.models import Case, Document
+from app.services.storage_service import StorageService
+from app.services.dedup_service import dedup_service
+from app.services.extraction_cache import file_sha256
+from app.services.metrics import STAGE_SECONDS, PAGE_SECONDS, STAGE_FAILURES_TOTAL
+from app.utils.document_processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png')
+DEFAULT_CHECKPOINT = "bulk_ingest_checkpoint.jsonl"
+
+
+def discover(paths: list[str], manifest: str, case_name: str, case_per_dir: bool) -> list[dict]:
+    """Returns [{"path", "case"}] in a stable order."""
+    entries = []
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                path = os.path.join(base, row["path"]) if not os.path.isabs(row["path"]) else row["path"]
+                entries.append({"path": os.path.abspath(path), "case": row.get("case") or case_name})
+    for root_path in paths:
+        if os.path.isfile(root_path):
+            entries.append({"path": os.path.abspath(root_path), "case": case_name})
+            continue
+        for directory, _, filenames in os.walk(root_path):
+            for filename in sorted(filenames):
+                path = os.path.abspath(os.path.join(directory, filename))
+                case = os.path.basename(directory) if case_per_dir and directory != root_path else case_name
+                entries.append({"path": path, "case": case})
+    entries = [entry for entry in entries if os.path.splitext(entry["path"])[1].lower() in SUPPORTED_EXTENSIONS]
+    return sorted(entries, key=lambda entry: entry["path"])
+
+
+class Checkpoint:
+    """Append-only JSONL progress log; the last line for a path is its state."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.states = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        state = json.loads(line)
+                        self.states[state["path"]] = state
+
+    def get(self, path: str) -> dict:
+        return self.states.get(path, {})
+
+    def update(self, path: str, **fields):
+        with self._lock:
+            state = {**self.states.get(path, {}), "path": path, **fields}
+            self.states[path] = state
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(state) + "\n")
+
+
+class BulkIngest:
+    def __init__(self, checkpoint: Checkpoint, copy_files: bool, max_bytes: int, dedup: bool):
+        self.checkpoint = checkpoint
+        self.copy_files = copy_files
+        self.max_bytes = max_bytes
+        self.dedup = dedup
+        self.storage = StorageService(settings.upload_dir)
+        self.processor = DocumentProcessor()
+        self._case_ids = {}
+        self._case_lock = threading.Lock()
+
+    def case_id(self, db, name: str):
+        """Find or create a case by name - serialized so workers don't create duplicates."""
+        with self._case_lock:
+            if name not in self._case_ids:
+                case = db.query(Case).filter(Case.name == name).order_by(Case.created_at).first()
+                if not case:
+                    case = Case(name=name, description="Created by bulk ingest")
+                    db.add(case)
+                    db.commit()
+                self._case_ids[name] = case.id
+            return self._case_ids[name]
+
+    def register(self, db, entry: dict) -> Document:
+        """Copy the file into storage and create its Document row."""
+        extension = os.path.splitext(entry["path"])[1].lower()
+        if self.copy_files:
+            with open(entry["path"], "rb") as source:
+                file_path, file_size, content_hash = self.storage.save_fileobj(source, extension, self.max_bytes)
+        else:
+            file_path, file_size = entry["path"], os.path.getsize(entry["path"])
+            if file_size > self.max_bytes:
+                raise ValueError(f"File size exceeds maximum allowed size ({self.max_bytes / 1024 / 1024:.0f}MB)")
+            content_hash = file_sha256(file_path)
+
+        document = Document(
+            case_id=self.case_id(db, entry["case"]),
+            filename=os.path.basename(entry["path"]),
+            file_path=file_path,
+            file_type=mimetypes.guess_type(entry["path"])[0],
+            file_size=file_size,
+            content_hash=content_hash
+        )
+        db.add(document)
+        db.commit()
+        self.checkpoint.update(entry["path"], status="registered", document_id=str(document.id))
+        return document
+
+    def ingest(self, entry: dict) -> dict:
+        """Register (unless already done on a previous run) and process one file. Returns its outcome."""
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            document_id = self.checkpoint.get(entry["path"]).get("document_id")
+            document = db.query(Document).filter(Document.id == document_id).first() if document_id else None
+            if document is None:
+                document = self.register(db, entry)
+
+            outcome = "processed"
+            if document.processed:
+                outcome = "skipped"
+            elif self.dedup and (source := dedup_service.find_source(db, document.content_hash, exclude_id=document.id)):
+                outcome = "deduplicated"
+                if dedup_service.clone_results(db, source, document)["rerun_stages"]:
+                    # Copied stages are current and get skipped
+                    self.processor.process_document(document, db)
+            else:
+                self.processor.process_document(document, db)
+
+            result = {"status": "done", "outcome": outcome, "document_id": str(document.id),
+                      "pages": document.page_count or 0, "seconds": round(time.perf_counter() - start, 3)}
+        except Exception as e:
+            db.rollback()
+            result = {"status": "failed", "outcome": "failed", "error": f"{type(e).__name__}: {e}"[:500],
+                      "pages": 0, "seconds": round(time.perf_counter() - start, 3)}
+        finally:
+            db.close()
+
+        self.checkpoint.update(entry["path"], **result)
+        return result
+
+
+def stage_seconds() -> dict:
+    """Summed time per stage from this process's metrics (extraction comes from the per-page histogram)."""
+    seconds = {}
+    for state in PAGE_SECONDS.snapshot().values():
+        seconds["extraction"] = seconds.get("extraction", 0.0) + state["sum"]
+    for (stage,), state in STAGE_SECONDS.snapshot().items():
+        if stage != "text":  # Same time as the per-page extraction histogram
+            seconds[stage] = seconds.get(stage, 0.0) + state["sum"]
+    return seconds
+
+
+def print_report(report: dict):
+    totals = report["totals"]
+    print(f"\nIngested {totals['done']} of {totals['files']} files in {report['wall_seconds']:.1f}s "
+          f"({totals['processed']} processed, {totals['deduplicated']} deduplicated, "
+          f"{totals['skipped']} already done, {totals['failed']} failed)")
+    print(f"  {report['docs_per_second']:.2f} docs/s, {report['pages_per_second']:.2f} pages/s "
+          f"({totals['pages']} pages, {report['workers']} workers)")
+
+    if report["stages"]:
+        print("\nStage time share (summed across workers; AI stages overlap within a document):")
+        total = sum(stage["seconds"] for stage in report["stages"].values()) or 1.0
+        for name, stage in sorted(report["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            print(f"  {name:<18}{stage['seconds']:>10.1f}s{100 * stage['seconds'] / total:>8.1f}%"
+                  + (f"  ({stage['failures']} failed)" if stage["failures"] else ""))
+
+    if report["failures"]:
+        print(f"\nFailures ({len(report['failures'])}):")
+        for failure in report["failures"][:50]:
+            print(f"  {failure['path']}: {failure['error']}")
+        if len(report["failures"]) > 50:
+            print(f"  ... and {len(report['failures']) - 50} more (see the checkpoint file)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest documents through the processing pipeline")
+    parser.add_argument("paths", nargs="*", help="Files or directories to ingest (walked recursively)")
+    parser.add_argument("--manifest", default=None, help="CSV with a path column and optional case column")
+    parser.add_argument("--case", default="Bulk import", help="Case name for files without one (default: %(default)s)")
+    parser.add_argument("--case-per-dir", action="store_true", help="Use each file's parent directory name as its case")
+    parser.add_argument("--workers", type=int, default=4, help="Documents processed concurrently (default: %(default)s)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume (default: %(default)s)")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry files that failed on a previous run")
+    parser.add_argument("--no-copy", action="store_true", help="Process files in place instead of copying them to upload storage")
+    parser.add_argument("--no-dedup", action="store_true", help="Process identical files again instead of copying results")
+    parser.add_argument("--max-file-mb", type=int, default=settings.max_file_size_mb, help="Skip larger files (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=None, help="Only ingest the first N pending files (trial runs)")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if not args.paths and not args.manifest:
+        parser.error("give directories/files or --manifest")
+
+    entries = discover(args.paths, args.manifest, args.case, args.case_per_dir)
+    checkpoint = Checkpoint(args.checkpoint)
+    pending = [
+        entry for entry in entries
+        if checkpoint.get(entry["path"]).get("status") != "done"
+        and (args.retry_failed or checkpoint.get(entry["path"]).get("status") != "failed")
+    ]
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"{len(entries)} files found, {len(entries) - len(pending)} already done or failed earlier, "
+          f"{len(pending)} to ingest with {args.workers} workers")
+    if not pending:
+        return 0
+
+    init_db()
+    ingest = BulkIngest(checkpoint, copy_files=not args.no_copy,
+                        max_bytes=args.max_file_mb * 1024 * 1024, dedup=not args.no_dedup)
+
+    totals = {"files": len(pending), "done": 0, "processed": 0, "deduplicated": 0, "skipped": 0, "failed": 0, "pages": 0}
+    failures = []
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="ingest") as executor:
+            futures = {executor.submit(ingest.ingest, entry): entry for entry in pending}
+            for finished, future in enumerate(as_completed(futures), start=1):
+                entry, result = futures[future], future.result()
+                totals[result["outcome"]] += 1
+                totals["pages"] += result["pages"]
+                if result["status"] == "done":
+                    totals["done"] += 1
+                else:
+                    failures.append({"path": entry["path"], "error": result["error"]})
+                if finished % 10 == 0 or finished == len(pending):
+                    elapsed = time.perf_counter() - start
+                    print(f"  {finished}/{len(pending)} files, {totals['failed']} failed, "
+                          f"{finished / elapsed:.2f} docs/s", flush=True)
+    except KeyboardInterrupt:
+        print("\nInterrupted - rerun the same command to resume")
+        raise
+    wall_seconds = time.perf_counter() - start
+
+    stage_failures = {stage: count for (stage,), count in STAGE_FAILURES_TOTAL.snapshot().items()}
+    report = {
+        "workers": args.workers,
+        "wall_seconds": round(wall_seconds, 3),
+        "docs_per_second": round(totals["done"] / wall_seconds, 3) if wall_seconds else 0.0,
+        "pages_per_second": round(totals["pages"] / wall_seconds, 3) if wall_seconds else 0.0,
+        "totals": totals,
+        "stages": {
+            name: {"seconds": round(seconds, 3), "failures": stage_failures.get(name, 0)}
+            for name, seconds in stage_seconds().items()
+        },
+        "failures": failures,
+    }
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
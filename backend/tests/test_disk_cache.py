@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+from app.utils.disk_cache import DiskCache
+
+
+def key(n: int) -> str:
+    return f"{n:064x}"
+
+
+def directory_totals(directory) -> tuple[int, int]:
+    sizes = [os.path.getsize(os.path.join(root, name))
+             for root, _, files in os.walk(directory) for name in files if name.endswith(".json")]
+    return sum(sizes), len(sizes)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+
+
+def test_set_then_get_round_trips(cache):
+    cache.set(key(1), {"answer": 42})
+    assert cache.get(key(1)) == {"answer": 42}
+    assert cache.get(key(2)) is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["writes"]) == (1, 1, 1)
+
+
+def test_expired_entries_are_misses_and_removed(cache):
+    cache.set(key(1), {"v": 1}, ttl=0.01)
+    time.sleep(0.05)
+    assert cache.get(key(1)) is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_default_ttl_applies(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=1024 * 1024, default_ttl=0.01)
+    cache.set(key(1), {"v": 1})
+    time.sleep(0.05)
+    assert cache.get(key(1)) is None
+
+
+def test_running_totals_match_disk(cache):
+    for n in range(5):
+        cache.set(key(n), {"v": "x" * (n * 100)})
+    cache.set(key(2), {"v": "y"})  # overwrite shrinks
+    cache.delete(key(3))
+    cache.delete(key(99))  # missing key changes nothing
+
+    total_bytes, entries = directory_totals(cache.directory)
+    assert cache._total_bytes == total_bytes
+    assert cache.get_stats()["entries"] == entries == 4
+
+
+def test_totals_are_counted_from_existing_directory(tmp_path):
+    directory = str(tmp_path / "cache")
+    first = DiskCache(directory, max_bytes=1024 * 1024)
+    for n in range(3):
+        first.set(key(n), {"v": n})
+
+    reopened = DiskCache(directory, max_bytes=1024 * 1024)
+    assert reopened.get_stats()["entries"] == 3
+    assert reopened._total_bytes == directory_totals(directory)[0]
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    payload = {"v": "x" * 1000}
+    for n in range(4):
+        cache.set(key(n), payload)
+        past = time.time() - 100 + n
+        os.utime(cache._path(key(n)), (past, past))
+    cache.get(key(0))  # refreshes its mtime: now the most recently used
+
+    entry_size = os.path.getsize(cache._path(key(0)))
+    cache.max_bytes = int(entry_size * 2.5)
+    cache.evict(target_ratio=1.0)
+
+    assert cache.get(key(0)) == payload
+    assert cache.get(key(3)) == payload
+    assert cache.get(key(1)) is None and cache.get(key(2)) is None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 2 and stats["entries"] == 2
+    assert cache._total_bytes == directory_totals(cache.directory)[0]
+
+
+def test_set_over_limit_evicts_to_below_target(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache"), max_bytes=5000)
+    for n in range(20):
+        cache.set(key(n), {"v": "x" * 400})
+    total_bytes, entries = directory_totals(cache.directory)
+    assert total_bytes <= 5000
+    assert cache.get_stats()["entries"] == entries
+    assert cache.get(key(19)) is not None
+
+
+def test_clear_with_predicate(cache):
+    for n in range(4):
+        cache.set(key(n), {"v": n})
+    assert cache.clear(lambda k: k in (key(1), key(2))) == 2
+    assert cache.get_stats()["entries"] == 2
+    assert cache.clear() == 2
+    assert cache.get_stats()["entries"] == 0
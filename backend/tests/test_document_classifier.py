@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from app.services.document_classifier import DocumentClassifier, _build_trie, _trie_to_pattern
+
+
+@pytest.fixture
+def classifier():
+    return DocumentClassifier()
+
+
+def classify_in_pieces(classifier, text, cuts):
+    state = classifier.start()
+    for start, end in zip([0] + cuts, cuts + [len(text)]):
+        if not classifier.feed(state, text[start:end]):
+            break
+    return classifier.result(state)
+
+
+def test_trie_pattern_factors_shared_prefixes():
+    pattern = _trie_to_pattern(_build_trie(["test", "test result", "testing"]))
+    assert pattern == r"test(?:\s+result|ing)?"
+
+
+def test_weighted_scores_pick_best_label(classifier):
+    result = classifier.classify_with_scores(
+        "Laboratory report. Specimen collected; reference range shown for hemoglobin."
+    )
+    assert result["document_type"] == "lab_report"
+    assert result["scores"]["lab_report"] == 3 + 3 + 3 + 2
+    assert result["matches"] == 4
+
+
+def test_whole_words_only(classifier):
+    result = classifier.classify_with_scores("label collaborate prescriptions")
+    assert result["matches"] == 0
+    assert result["document_type"] == "general_document"
+
+
+def test_multi_word_keywords_span_whitespace(classifier):
+    result = classifier.classify_with_scores("CHIEF\n  COMPLAINT: cough")
+    assert result["scores"]["medical_record"] == 3
+
+
+def test_below_min_score_is_general_document(classifier):
+    assert classifier.classify("the patient") == "general_document"
+
+
+def test_ties_follow_label_priority():
+    classifier = DocumentClassifier({"b": {"beta": 2}, "medical_record": {"alpha": 2}})
+    assert classifier.classify("alpha beta") == "medical_record"
+
+
+def test_early_stop_when_outcome_is_certain(classifier):
+    text = "radiology impression mri ultrasound " * 10 + "prescription " * 50
+    result = classifier.classify_with_scores(text)
+    assert result["early_stop"]
+    assert result["document_type"] == "imaging_report"
+    assert result["chars_scanned"] < len(text)
+    assert result["scores"]["prescription"] == 0
+
+
+def test_result_does_not_expose_scanner_state(classifier):
+    result = classifier.classify_with_scores("laboratory")
+    assert set(result) == {"document_type", "scores", "matches", "chars_scanned", "early_stop"}
+
+
+def test_keyword_split_across_pieces_is_counted(classifier):
+    text = "history of present illness"
+    assert classify_in_pieces(classifier, text, [11]) == classifier.classify_with_scores(text)
+    assert classify_in_pieces(classifier, "physical exam" + "ination", [13])["matches"] == 1
+
+
+def test_pieces_do_not_join_words(classifier):
+    # "lab" at the end of one piece must not match when the next piece continues the word
+    assert classify_in_pieces(classifier, "collab" + "orate", [6])["matches"] == 0
+    assert classify_in_pieces(classifier, "lab" + "el", [3])["matches"] == 0
+
+
+@pytest.mark.parametrize("text", [
+    "Patient chief complaint: chest pain. Laboratory test results within normal limits. "
+    "Physical examination done. lab, label, collaborate, x-ray and mri.",
+    "Laboratory specimen reference range hemoglobin platelet complete blood count. " * 5 + "x-ray mri " * 20,
+])
+def test_any_split_scores_like_one_call(classifier, text):
+    expected = classifier.classify_with_scores(text)
+    rng = random.Random(0)
+    for _ in range(300):
+        cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, 12)))
+        assert classify_in_pieces(classifier, text, cuts) == expected
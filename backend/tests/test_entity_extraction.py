@@ -0,0 +1,139 @@
+import pytest
+
+from app.config import settings
+from app.services.extraction_service import (
+    DEFAULT_CONFIDENCE, ExtractionService, WindowedExtractor, merge_entities, normalize_entity_value,
+    parse_confidence,
+)
+
+
+def entity(entity_type, value, confidence=0.8, **location):
+    return {"entity_type": entity_type, "entity_value": value, "confidence": confidence,
+            "source_location": location}
+
+
+@pytest.mark.parametrize("value, expected", [
+    (0.95, 0.95), ("0.9", 0.9), (1, 1.0), (None, DEFAULT_CONFIDENCE), ("high", DEFAULT_CONFIDENCE),
+    ({"score": 1}, DEFAULT_CONFIDENCE),
+])
+def test_parse_confidence(value, expected):
+    assert parse_confidence(value) == expected
+
+
+def test_normalize_ignores_case_spacing_and_edge_punctuation():
+    assert normalize_entity_value("  Type 2  Diabetes. ") == normalize_entity_value("type 2 diabetes")
+    assert normalize_entity_value("Metformin 500mg") != normalize_entity_value("Metformin 850mg")
+
+
+def test_format_entities_handles_dicts_strings_and_bad_confidences():
+    entities = ExtractionService.__new__(ExtractionService).format_entities({
+        "diagnosis": [{"value": "Asthma", "confidence": "0.7", "context": "hx of asthma"}],
+        "medication": "Albuterol",
+        "procedure": [],
+        "provider": [{"value": "Dr. Lee", "confidence": "n/a"}],
+    })
+    assert entities == [
+        entity("diagnosis", "Asthma", 0.7, context="hx of asthma"),
+        {"entity_type": "medication", "entity_value": "Albuterol", "confidence": DEFAULT_CONFIDENCE,
+         "source_location": {}},
+        entity("provider", "Dr. Lee", DEFAULT_CONFIDENCE, context=""),
+    ]
+
+
+def test_merge_keeps_highest_confidence_and_all_occurrences():
+    merged = merge_entities([
+        entity("diagnosis", "asthma", 0.6, page=1, window=1),
+        entity("diagnosis", "Asthma.", "0.9", page=4, window=2),
+        entity("medication", "asthma", 0.5, page=2),
+    ])
+
+    assert len(merged) == 2
+    diagnosis = merged[0]
+    assert diagnosis["entity_value"] == "Asthma."
+    assert diagnosis["confidence"] == 0.9
+    assert diagnosis["source_location"]["page"] == 4
+    assert diagnosis["source_location"]["occurrences"] == [{"page": 1, "window": 1}, {"page": 4, "window": 2}]
+
+
+def test_merge_drops_empty_values_and_duplicate_locations():
+    merged = merge_entities([
+        entity("diagnosis", " . "),
+        entity("diagnosis", "flu", page=2),
+        entity("diagnosis", "FLU", page=2),
+    ])
+    assert len(merged) == 1
+    assert merged[0]["source_location"]["occurrences"] == [{"page": 2}]
+
+
+def test_merge_coerces_confidence_of_the_first_finding():
+    merged = merge_entities([entity("diagnosis", "flu", "0.4"), entity("diagnosis", "flu", 0.3)])
+    assert merged[0]["confidence"] == 0.4
+
+
+class FakeService:
+    """Finds every "finding-N" word in a window; a window containing "explode" fails."""
+
+    client = object()
+
+    def __init__(self):
+        self.windows = []
+
+    def get_extraction_schema(self, document_type):
+        return {"diagnosis": "Diagnoses"}
+
+    def _extract_window(self, text, schema):
+        self.windows.append(text)
+        if "explode" in text:
+            raise RuntimeError("bad window")
+        return [entity("diagnosis", word, 0.8, context=word) for word in text.split() if word.startswith("finding-")]
+
+
+@pytest.fixture
+def small_windows(monkeypatch):
+    monkeypatch.setattr(settings, "extraction_window_tokens", 40)
+    monkeypatch.setattr(settings, "extraction_max_concurrency", 4)
+
+
+def pages_text(pages: dict) -> list[str]:
+    return [f"--- Page {number} ---\n{text}" for number, text in pages.items()]
+
+
+def test_windows_cover_the_whole_document_and_locate_pages(small_windows):
+    service = FakeService()
+    extractor = WindowedExtractor(service)
+    filler = "words " * 20
+    for page in pages_text({1: f"{filler}finding-a", 2: filler, 3: f"finding-b {filler}", 4: f"{filler}finding-a"}):
+        extractor.add(page)
+    entities = extractor.finish("medical_record")
+
+    assert len(service.windows) > 1
+    by_value = {e["entity_value"]: e["source_location"] for e in entities}
+    assert set(by_value) == {"finding-a", "finding-b"}
+    assert by_value["finding-b"]["page"] == 3
+    assert [occurrence["page"] for occurrence in by_value["finding-a"]["occurrences"]] == [1, 4]
+
+
+def test_failed_window_keeps_the_others(small_windows):
+    service = FakeService()
+    extractor = WindowedExtractor(service)
+    for page in pages_text({1: "finding-a " + "words " * 30, 2: "explode " + "words " * 30, 3: "finding-c"}):
+        extractor.add(page)
+    values = {e["entity_value"] for e in extractor.finish("medical_record")}
+    assert values == {"finding-a", "finding-c"}
+
+
+def test_finish_releases_the_spool(small_windows):
+    extractor = WindowedExtractor(FakeService())
+    extractor.add("\n\n".join(pages_text({n: "words " * 30 for n in range(1, 6)})))
+    assert extractor._spool is not None
+    extractor.finish("medical_record")
+    assert extractor._spool is None
+
+
+def test_without_client_nothing_is_extracted(small_windows):
+    service = FakeService()
+    service.client = None
+    extractor = WindowedExtractor(service)
+    extractor.add("finding-a")
+    assert extractor.finish() == []
+    assert service.windows == []
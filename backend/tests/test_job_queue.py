@@ -0,0 +1,129 @@
+import uuid
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.models import ProcessingJob
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import JobQueue, PROCESS_DOCUMENT
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(settings, "job_retry_base_seconds", 30)
+    monkeypatch.setattr(settings, "job_retry_max_seconds", 900)
+    published = []
+    monkeypatch.setattr(job_queue_module.progress_bus, "publish", lambda *args, **kwargs: published.append(kwargs))
+    queue = JobQueue()
+    queue.published = published
+    return queue
+
+
+def leased_job(attempts: int, max_attempts: int = 3):
+    return SimpleNamespace(id=uuid.uuid4(), document_id=uuid.uuid4(), status="running", attempts=attempts,
+                           max_attempts=max_attempts, last_error=None, run_after=None,
+                           lease_expires_at=datetime.utcnow(), leased_by="worker-1")
+
+
+def session_returning(job):
+    db = MagicMock()
+    db.query.return_value.filter.return_value.with_for_update.return_value.first.return_value = job
+    db.query.return_value.filter.return_value.first.return_value = job
+    return db
+
+
+@pytest.mark.parametrize("attempts, base", [(1, 30), (2, 60), (3, 120), (4, 240)])
+def test_retry_delay_backs_off_exponentially_with_jitter(queue, attempts, base):
+    delays = [queue.retry_delay(attempts) for _ in range(200)]
+    assert all(base * 0.8 <= delay <= base * 1.2 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_delay_is_capped(queue):
+    assert queue.retry_delay(20) <= settings.job_retry_max_seconds * 1.2
+
+
+def test_failed_attempt_is_requeued_with_backoff(queue):
+    job = leased_job(attempts=1)
+    before = datetime.utcnow()
+    status = queue.fail(session_returning(job), job.id, "worker-1", "boom")
+
+    assert status == "queued"
+    assert job.last_error == "boom"
+    assert job.leased_by is None and job.lease_expires_at is None
+    assert before + timedelta(seconds=24) <= job.run_after <= datetime.utcnow() + timedelta(seconds=36)
+    assert queue.published[-1]["status"] == "pending"
+
+
+def test_final_failed_attempt_is_dead_lettered(queue):
+    job = leased_job(attempts=3)
+    status = queue.fail(session_returning(job), job.id, "worker-1", "boom")
+
+    assert status == "dead"
+    assert job.last_error == "boom"
+    assert job.lease_expires_at is None
+    assert queue.published[-1]["status"] == "failed"
+
+
+def test_failure_after_losing_the_lease_is_ignored(queue):
+    job = leased_job(attempts=1)
+    job.status = "queued"
+    db = session_returning(job)
+    assert queue.fail(db, job.id, "worker-1", "boom") is None
+    db.rollback.assert_called_once()
+    assert job.last_error is None
+
+
+def test_retry_dead_resets_attempts(queue, monkeypatch):
+    job = leased_job(attempts=3)
+    job.status = "dead"
+    job.job_type = PROCESS_DOCUMENT
+    monkeypatch.setattr(JobQueue, "_active_job", staticmethod(lambda db, job_type, document_id: None))
+    assert queue.retry_dead(session_returning(job), job.id) is job
+    assert job.status == "queued" and job.attempts == 0
+
+
+def test_retry_dead_returns_document_active_job(queue, monkeypatch):
+    job = leased_job(attempts=3)
+    job.status = "dead"
+    job.job_type = PROCESS_DOCUMENT
+    active = leased_job(attempts=0)
+    monkeypatch.setattr(JobQueue, "_active_job", staticmethod(lambda db, job_type, document_id: active))
+    assert queue.retry_dead(session_returning(job), job.id) is active
+    assert job.status == "dead"
+
+
+def test_enqueue_returns_existing_active_job(queue, monkeypatch):
+    existing = leased_job(attempts=0)
+    monkeypatch.setattr(JobQueue, "_active_job", staticmethod(lambda db, job_type, document_id: existing))
+    db = MagicMock()
+    assert queue.enqueue(db, PROCESS_DOCUMENT, existing.document_id) is existing
+    db.add.assert_not_called()
+
+
+def test_enqueue_race_returns_the_winning_job(queue, monkeypatch):
+    winner = leased_job(attempts=0)
+    lookups = iter([None, winner])
+    monkeypatch.setattr(JobQueue, "_active_job", staticmethod(lambda db, job_type, document_id: next(lookups)))
+    db = MagicMock()
+    db.begin_nested.return_value.__exit__.side_effect = IntegrityError("INSERT", {}, Exception("duplicate key"))
+
+    assert queue.enqueue(db, PROCESS_DOCUMENT, winner.document_id) is winner
+    db.commit.assert_called_once()
+
+
+def test_enqueue_adds_job_with_default_attempts(queue, monkeypatch):
+    monkeypatch.setattr(JobQueue, "_active_job", staticmethod(lambda db, job_type, document_id: None))
+    monkeypatch.setattr(settings, "job_max_attempts", 5)
+    db = MagicMock()
+    job = queue.enqueue(db, PROCESS_DOCUMENT, uuid.uuid4(), {"stages": ["summary"]})
+
+    assert isinstance(job, ProcessingJob)
+    assert job.max_attempts == 5
+    assert job.payload["stages"] == ["summary"]
+    db.add.assert_called_once_with(job)
+    db.commit.assert_called_once()
@@ -0,0 +1,46 @@
+from app.services.rag_service import rag_service, CHUNK_SIZE
+
+
+def page(words: int, tag: str) -> str:
+    return " ".join(f"{tag}{i}" for i in range(words))
+
+
+def test_short_pages_are_merged_into_one_chunk():
+    chunks = list(rag_service.iter_page_chunks([(1, "alpha"), (2, "beta")]))
+    assert chunks == [(1, "alpha\n\nbeta")]
+
+
+def test_chunk_page_is_the_page_it_starts_on():
+    pages = [(1, page(300, "a")), (2, page(300, "b")), (3, page(300, "c"))]
+    chunks = list(rag_service.iter_page_chunks(pages))
+    assert len(chunks) > 3
+    for page_num, chunk in chunks:
+        first_word = chunk.split()[0]
+        assert first_word[0] == "abc"[page_num - 1]
+    assert [page_num for page_num, _ in chunks] == sorted(page_num for page_num, _ in chunks)
+
+
+def test_chunks_respect_chunk_size_and_cover_all_text():
+    pages = [(n, page(250, f"p{n}w")) for n in range(1, 6)]
+    chunks = list(rag_service.iter_page_chunks(pages))
+    assert all(len(chunk) <= CHUNK_SIZE for _, chunk in chunks)
+    seen = set(" ".join(chunk for _, chunk in chunks).split())
+    assert seen == set(" ".join(text for _, text in pages).split())
+
+
+def test_empty_pages_are_skipped():
+    chunks = list(rag_service.iter_page_chunks([(1, ""), (2, "only text"), (3, "   ")]))
+    assert chunks == [(2, "only text")]
+
+
+def test_consumes_pages_lazily():
+    consumed = []
+
+    def pages():
+        for n in range(1, 100):
+            consumed.append(n)
+            yield n, page(300, f"p{n}w")
+
+    chunks = rag_service.iter_page_chunks(pages())
+    next(chunks)
+    assert len(consumed) <= 2
@@ -0,0 +1,54 @@
+from app.utils.tokens import count_tokens, split_to_budget, pack_to_budget
+
+
+def test_count_tokens_grows_with_text():
+    assert count_tokens("") == 0
+    assert 0 < count_tokens("hello world") < count_tokens("hello world " * 50)
+
+
+def test_short_paragraphs_are_kept_whole():
+    text = "First paragraph.\n\nSecond paragraph.\n  \n\nThird."
+    assert split_to_budget(text, 100) == ["First paragraph.", "Second paragraph.", "Third."]
+
+
+def test_long_paragraph_is_split_on_line_breaks():
+    lines = [f"line {i} with some words" for i in range(40)]
+    pieces = split_to_budget("\n".join(lines), 40)
+
+    assert len(pieces) > 1
+    assert all(count_tokens(piece) <= 40 for piece in pieces)
+    assert "\n".join(pieces).split("\n") == lines
+
+
+def test_single_overlong_line_is_cut_by_length():
+    line = "word " * 500
+    pieces = split_to_budget(line, 50)
+
+    assert len(pieces) > 1
+    assert all(count_tokens(piece) <= 50 for piece in pieces)
+    assert "".join(pieces) == line
+
+
+def test_pack_joins_consecutive_pieces_up_to_budget():
+    pieces = [f"piece {i} " + "x " * 20 for i in range(12)]
+    groups = pack_to_budget(pieces, 80)
+
+    assert all(sum(count_tokens(piece) for piece in group.split("\n\n")) <= 80 for group in groups)
+    assert "\n\n".join(groups).split("\n\n") == pieces
+    assert 1 < len(groups) < len(pieces)
+
+
+def test_pack_keeps_an_oversized_piece_on_its_own():
+    big = "y " * 400
+    assert pack_to_budget(["a", big, "b"], 50) == ["a", big, "b"]
+
+
+def test_overlong_line_pieces_fit_when_token_density_varies(monkeypatch):
+    import app.utils.tokens as tokens
+    # One token per "#", one per 8 other characters: a proportional cut overshoots
+    monkeypatch.setattr(tokens, "count_tokens", lambda text: -(-sum(8 if c == "#" else 1 for c in text) // 8))
+    line = "#" * 200 + "a" * 2000
+    pieces = tokens.split_to_budget(line, 100)
+
+    assert all(tokens.count_tokens(piece) <= 100 for piece in pieces)
+    assert "".join(pieces) == line
@@ -0,0 +1,115 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+from app.config import settings
+from app.services.storage_service import StorageService
+from app.utils.zip_upload import save_zip_members, BatchTooLarge
+
+ALLOWED = [".pdf", ".txt"]
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return StorageService(str(tmp_path / "uploads"))
+
+
+def build_zip(members: dict, compression=zipfile.ZIP_DEFLATED) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def save(storage, archive, max_file_bytes=10 * MB, budget_bytes=100 * MB, max_files=10):
+    return save_zip_members(storage, archive, ALLOWED, max_file_bytes, budget_bytes, max_files)
+
+
+def test_saves_supported_members_with_size_and_hash(storage):
+    saved, rejected = save(storage, build_zip({"a.txt": b"hello", "docs/b.pdf": b"%PDF-1.4 data"}))
+
+    assert rejected == []
+    assert [entry["filename"] for entry in saved] == ["a.txt", "b.pdf"]
+    first = saved[0]
+    assert first["file_size"] == 5
+    assert first["content_hash"] == hashlib.sha256(b"hello").hexdigest()
+    with open(first["file_path"], "rb") as f:
+        assert f.read() == b"hello"
+
+
+def test_member_names_are_never_used_as_paths(storage, tmp_path):
+    saved, _ = save(storage, build_zip({"../../escape.txt": b"x"}))
+
+    assert saved[0]["filename"] == "escape.txt"
+    assert os.path.dirname(saved[0]["file_path"]) == storage.base_path
+    assert not (tmp_path / "escape.txt").exists()
+
+
+def test_skips_directories_hidden_files_and_macos_metadata(storage):
+    saved, rejected = save(storage, build_zip({
+        "folder/": b"", ".hidden.txt": b"x", "__MACOSX/._a.txt": b"x", "a.txt": b"x",
+    }))
+    assert [entry["filename"] for entry in saved] == ["a.txt"]
+    assert rejected == []
+
+
+def test_rejects_unsupported_types(storage):
+    saved, rejected = save(storage, build_zip({"run.exe": b"MZ", "a.txt": b"x"}))
+    assert [entry["filename"] for entry in saved] == ["a.txt"]
+    assert rejected == [{"filename": "run.exe", "reason": "File type not supported"}]
+
+
+def test_rejects_members_above_compression_ratio(storage, monkeypatch):
+    monkeypatch.setattr(settings, "batch_zip_max_ratio", 100)
+    saved, rejected = save(storage, build_zip({"bomb.txt": b"0" * MB, "a.txt": b"fine"}))
+
+    assert [entry["filename"] for entry in saved] == ["a.txt"]
+    assert rejected == [{"filename": "bomb.txt", "reason": "Suspicious compression ratio"}]
+
+
+def test_rejects_members_over_the_file_size_limit(storage):
+    data = os.urandom(2048)
+    saved, rejected = save(storage, build_zip({"big.pdf": data, "a.txt": b"x"}), max_file_bytes=1024)
+
+    assert [entry["filename"] for entry in saved] == ["a.txt"]
+    assert rejected[0]["filename"] == "big.pdf"
+
+
+def test_too_many_files_raises_with_saved_files_attached(storage):
+    archive = build_zip({f"{i}.txt": b"x" for i in range(3)})
+    with pytest.raises(BatchTooLarge) as error:
+        save(storage, archive, max_files=2)
+    assert len(error.value.saved) == 2
+
+
+def test_total_budget_is_enforced_on_decompressed_bytes(storage):
+    archive = build_zip({"a.pdf": os.urandom(600), "b.pdf": os.urandom(600)}, zipfile.ZIP_STORED)
+    with pytest.raises(BatchTooLarge) as error:
+        save(storage, archive, budget_bytes=1000)
+    assert [entry["filename"] for entry in error.value.saved] == ["a.pdf"]
+
+
+def test_corrupt_member_is_rejected_and_the_rest_kept(storage):
+    archive = build_zip({"bad.txt": b"A" * 4096 + os.urandom(64), "good.txt": b"ok"})
+    data = bytearray(archive.getvalue())
+    with zipfile.ZipFile(io.BytesIO(bytes(data))) as reader:
+        info = reader.getinfo("bad.txt")
+    # Damage the deflate stream of the first member, after its local header
+    body = info.header_offset + 30 + len(info.filename)
+    data[body:body + 8] = b"\xff" * 8
+
+    saved, rejected = save(storage, io.BytesIO(bytes(data)))
+    assert [entry["filename"] for entry in saved] == ["good.txt"]
+    assert rejected == [{"filename": "bad.txt", "reason": "Corrupt ZIP member"}]
+
+
+def test_not_a_zip_is_rejected(storage):
+    saved, rejected = save(storage, io.BytesIO(b"not a zip"))
+    assert saved == []
+    assert rejected[0]["reason"] == "Not a valid ZIP archive"
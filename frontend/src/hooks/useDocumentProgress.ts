@@ -11,10 +11,15 @@ interface DocumentProgress {
   uploaded_at: string;
 }
 
+const isActive = (status?: DocumentProgress['processing_status']) =>
+  status === 'processing' || status === 'pending';
+
 export const useDocumentProgress = (documentId: string | null, pollInterval = 2000) => {
   const [progress, setProgress] = useState<DocumentProgress | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  // Server-sent events by default; polling if the stream can't be opened or keeps failing
+  const [streamFailed, setStreamFailed] = useState(typeof EventSource === 'undefined');
 
   const fetchProgress = useCallback(async () => {
     if (!documentId) return;
@@ -31,36 +36,58 @@ export const useDocumentProgress = (documentId: string | null, pollInterval = 20
     }
   }, [documentId]);
 
+  // Push updates over SSE
   useEffect(() => {
-    if (!documentId) return;
+    if (!documentId || streamFailed) return;
+
+    const source = new EventSource(documentsApi.eventsUrl(documentId));
+    let received = false;
+
+    source.addEventListener('progress', (event) => {
+      received = true;
+      const update = JSON.parse((event as MessageEvent).data);
+      setProgress((previous) => ({ ...previous, ...update }));
+      setError(null);
+      if (!isActive(update.processing_status)) {
+        source.close();
+      }
+    });
+
+    source.onerror = () => {
+      // The browser retries dropped streams on its own; give up only if it never connected
+      if (!received) {
+        source.close();
+        setStreamFailed(true);
+      }
+    };
+
+    return () => source.close();
+  }, [documentId, streamFailed]);
+
+  // Polling fallback
+  useEffect(() => {
+    if (!documentId || !streamFailed) return;
 
     // Initial fetch
     fetchProgress();
 
     // Set up polling only if document is still processing
     const interval = setInterval(() => {
-      if (progress?.processing_status === 'processing' || progress?.processing_status === 'pending') {
+      if (isActive(progress?.processing_status)) {
         fetchProgress();
       }
     }, pollInterval);
 
     return () => clearInterval(interval);
-  }, [documentId, fetchProgress, pollInterval, progress?.processing_status]);
-
-  // Stop polling when processing is complete
-  useEffect(() => {
-    if (progress?.processing_status === 'completed' || progress?.processing_status === 'failed') {
-      // Optional: trigger a callback when processing is done
-    }
-  }, [progress?.processing_status]);
+  }, [documentId, streamFailed, fetchProgress, pollInterval, progress?.processing_status]);
 
   return {
     progress,
     loading,
     error,
     refetch: fetchProgress,
-    isProcessing: progress?.processing_status === 'processing' || progress?.processing_status === 'pending',
+    isProcessing: isActive(progress?.processing_status),
     isCompleted: progress?.processing_status === 'completed',
     isFailed: progress?.processing_status === 'failed'
   };
-};
\ No newline at end of file
+};
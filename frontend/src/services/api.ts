@@ -23,9 +23,19 @@ export const documentsApi = {
       headers: { 'Content-Type': 'multipart/form-data' },
     })
   },
+  uploadBatch: (caseId: string, files: File[]) => {
+    const formData = new FormData()
+    files.forEach((file) => formData.append('files', file))
+    return api.post(`/api/documents/upload-batch/${caseId}`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+  },
+  getBatch: (batchId: string) => api.get(`/api/documents/batches/${batchId}`),
   get: (id: string) => api.get(`/api/documents/${id}`),
   getWithText: (id: string) => api.get(`/api/documents/${id}/text`),
   getStatus: (id: string) => api.get(`/api/documents/${id}/status`),
+  eventsUrl: (id: string) => `${API_URL}/api/documents/${id}/events`,
+  caseEventsUrl: (caseId: string) => `${API_URL}/api/documents/case/${caseId}/events`,
   listByCase: (caseId: string) => api.get(`/api/documents/case/${caseId}`),
   delete: (id: string) => api.delete(`/api/documents/${id}`),
 }